@@ -9,7 +9,9 @@ from RVXLiverSegmentationLib import RVXLiverSegmentationLogic, Settings, DataWid
   SegmentWidget, PortalVesselWidget, IVCVesselWidget, PortalVesselEditWidget, IVCVesselEditWidget, createButton
 from RVXLiverSegmentationEffect import PythonDependencyChecker
 from RVXLiverSegmentationTest import RVXLiverSegmentationTestCase, VesselBranchTreeTestCase, \
-  ExtractVesselStrategyTestCase, VesselBranchWizardTestCase, VesselSegmentEditWidgetTestCase
+  ExtractVesselStrategyTestCase, VesselBranchWizardTestCase, VesselSegmentEditWidgetTestCase, ResultCacheTestCase, \
+  TiledVolumeFilterTestCase, NumpyVesselnessTestCase, VolumeResamplingTestCase, VolumeMaskTestCase, \
+  VesselnessParameterSweepTestCase, BackgroundTaskTestCase, ArrayNormalizationTestCase, MemoryReportTestCase
 
 
 class RVXLiverSegmentation(ScriptedLoadableModule):
@@ -216,6 +218,10 @@ class RVXLiverSegmentationWidget(ScriptedLoadableModuleWidget):
     self._tumorTab = SegmentWidget(segmentWidgetName="Tumor Tab", segmentNodeName="Tumors",
                                    segmentNames=["Tumor", "Not Tumor"])
 
+    # Restrict vessels tabs vesselness to the liver segment if requested
+    for vesselsTab in [self._portalVesselsTab, self._ivcVesselsTab]:
+      vesselsTab.setLiverMaskProvider(lambda: self._liverTab.exportSegmentToLabelMap("Liver In"))
+
     # Connect vessels tab to vessels edit tab
     self._portalVesselsTab.vesselSegmentationChanged.connect(self._portalVesselsEditTab.onVesselSegmentationChanged)
     self._ivcVesselsTab.vesselSegmentationChanged.connect(self._ivcEditTab.onVesselSegmentationChanged)
@@ -416,7 +422,10 @@ class RVXLiverSegmentationTest(ScriptedLoadableModuleTest):
 
     # Gather tests for the plugin and run them in a test suite
     testCases = [RVXLiverSegmentationTestCase, VesselBranchTreeTestCase, VesselBranchWizardTestCase,
-                 ExtractVesselStrategyTestCase, VesselSegmentEditWidgetTestCase]
+                 ExtractVesselStrategyTestCase, VesselSegmentEditWidgetTestCase, ResultCacheTestCase,
+                 TiledVolumeFilterTestCase, NumpyVesselnessTestCase, VolumeResamplingTestCase, VolumeMaskTestCase,
+                 VesselnessParameterSweepTestCase, BackgroundTaskTestCase, ArrayNormalizationTestCase,
+                 MemoryReportTestCase]
 
     suite = unittest.TestSuite([unittest.TestLoader().loadTestsFromTestCase(case) for case in testCases])
     unittest.TextTestRunner(verbosity=3).run(suite)
@@ -0,0 +1,97 @@
+import numpy as np
+
+
+def _chunkSlices(shape, chunkVoxels):
+  """Yields slices along the first axis of arrays of the input shape containing about chunkVoxels voxels each"""
+  rowVoxels = int(np.prod(shape[1:])) if len(shape) > 1 else 1
+  rowCount = max(1, chunkVoxels // max(1, rowVoxels))
+  for start in range(0, shape[0], rowCount):
+    yield slice(start, start + rowCount)
+
+
+def arrayMinMax(array, chunkVoxels=2 ** 20):
+  """Computes the minimum and maximum of an array in a single pass over its memory.
+
+  The array is processed in chunks small enough to stay in the CPU cache between the minimum and maximum reductions.
+
+  Returns
+  -------
+  Tuple[scalar, scalar] - minimum and maximum values of the array
+
+  Raises
+  ------
+  ValueError if the array is empty
+  """
+  array = np.asarray(array)
+  if array.size == 0:
+    raise ValueError("Cannot compute the minimum and maximum of an empty array")
+  if array.ndim == 0:
+    return array[()], array[()]
+
+  minValue, maxValue = None, None
+  for chunk in _chunkSlices(array.shape, chunkVoxels):
+    chunkMin, chunkMax = np.min(array[chunk]), np.max(array[chunk])
+    minValue = chunkMin if minValue is None else min(minValue, chunkMin)
+    maxValue = chunkMax if maxValue is None else max(maxValue, chunkMax)
+  return minValue, maxValue
+
+
+def normalizedMaximumValue(dtype):
+  """
+  Returns
+  -------
+  float - Value representing 1 in normalized arrays of the input type. 1 for floating point types and the maximum
+  value of the type for integer types.
+  """
+  dtype = np.dtype(dtype)
+  return float(np.iinfo(dtype).max) if np.issubdtype(dtype, np.integer) else 1.
+
+
+def normalizeArray(array, out=None, chunkVoxels=2 ** 20):
+  """Normalizes an array between 0 and 1 into a float32 output without full size temporaries.
+
+  The output can be the input array itself for in place normalization or a view on an existing buffer (for instance a
+  volume node array) to avoid copying the normalized result afterwards.
+
+  Integer outputs are quantized : values are scaled between 0 and the maximum value of the output type and rounded.
+  Multiplying them by 1 / normalizedMaximumValue(out.dtype) gives back the normalized values.
+
+  Parameters
+  ----------
+  array: np.array
+    Array to normalize
+  out: np.array or None
+    float32 or unsigned integer array with the same shape as input. If None, a new float32 array is allocated.
+  chunkVoxels: int
+    Approximate number of voxels processed at once
+
+  Returns
+  -------
+  np.array - output array with values normalized between 0 and 1 (0 if the input array is constant)
+  """
+  array = np.asarray(array)
+  if out is None:
+    out = np.empty(array.shape, dtype=np.float32)
+
+  minValue, maxValue = arrayMinMax(array, chunkVoxels)
+  if not maxValue > minValue:
+    out[...] = 0
+    return out
+
+  maxNormalizedValue = normalizedMaximumValue(out.dtype)
+  if array.ndim == 0:
+    out[...] = np.rint((array - minValue) / (maxValue - minValue) * maxNormalizedValue)
+    return out
+
+  minValue, valueRange = np.float32(minValue), np.float32(maxValue - minValue)
+  for chunk in _chunkSlices(array.shape, chunkVoxels):
+    if maxNormalizedValue == 1.:
+      np.subtract(array[chunk], minValue, out=out[chunk], casting="unsafe")
+      np.divide(out[chunk], valueRange, out=out[chunk])
+    else:
+      # Quantize through a chunk sized float32 buffer
+      scaled = np.subtract(array[chunk], minValue, dtype=np.float32)
+      np.multiply(scaled, np.float32(maxNormalizedValue) / valueRange, out=scaled)
+      np.rint(scaled, out=scaled)
+      out[chunk] = scaled
+  return out
@@ -0,0 +1,170 @@
+import threading
+
+
+class TaskCancelledError(Exception):
+  """Raised inside a background task when its cancellation was requested."""
+
+
+class TaskProgress(object):
+  """Thread safe progress and cancellation state shared between a background task and the main thread.
+
+  The task reports its progress by calling the object with its number of done steps and its total number of steps.
+  Each call raises TaskCancelledError if the cancellation was requested, which stops the task at its next progress
+  report.
+  """
+
+  def __init__(self):
+    self._lock = threading.Lock()
+    self._cancelEvent = threading.Event()
+    self._done = 0
+    self._total = 0
+
+  def __call__(self, done, total):
+    with self._lock:
+      self._done, self._total = done, total
+    self.raiseIfCancelled()
+
+  def cancel(self):
+    self._cancelEvent.set()
+
+  @property
+  def isCancelled(self):
+    return self._cancelEvent.is_set()
+
+  def raiseIfCancelled(self):
+    if self.isCancelled:
+      raise TaskCancelledError()
+
+  @property
+  def fraction(self):
+    """Fraction of the task done between 0 and 1"""
+    with self._lock:
+      return float(self._done) / self._total if self._total > 0 else 0.
+
+
+class BackgroundTask(object):
+  """Runs a function in a worker thread and dispatches its outcome on the thread polling the task.
+
+  The function is called with a TaskProgress object and must only operate on data which is not accessed by the main
+  thread while the task is running (for instance NumPy arrays but not MRML nodes). The callbacks are called by poll,
+  which is called periodically by a QTimer on the main thread when the task is started with a poll interval.
+
+  Example :
+    task = BackgroundTask(lambda progress: computeArray(progressCallback=progress), onFinished=updateVolume)
+    task.start(pollIntervalMs=50)
+  """
+
+  def __init__(self, function, onFinished=None, onError=None, onCancelled=None, onProgress=None):
+    """
+    Parameters
+    ----------
+    function: Callable[[TaskProgress], object]
+      Function executed in the worker thread
+    onFinished: Callable[[object], None] or None
+      Called with the function result when the function returns
+    onError: Callable[[Exception], None] or None
+      Called with the exception raised by the function. If None, the exception is raised by poll.
+    onCancelled: Callable[[], None] or None
+      Called when the function stopped after a cancel request
+    onProgress: Callable[[float], None] or None
+      Called with the progress fraction when it changes
+    """
+    self._function = function
+    self._onFinished = onFinished
+    self._onError = onError
+    self._onCancelled = onCancelled
+    self._onProgress = onProgress
+    self.progress = TaskProgress()
+    self._thread = None
+    self._timer = None
+    self._result = None
+    self._exception = None
+    self._isDispatched = False
+    self._lastFraction = None
+
+  def start(self, pollIntervalMs=None):
+    """Starts the function in a worker thread. If pollIntervalMs is provided, poll is called by a QTimer at this
+    interval until the task outcome is dispatched.
+    """
+    if self._thread is not None:
+      raise RuntimeError("Background task was already started")
+
+    self._thread = threading.Thread(target=self._run)
+    self._thread.daemon = True
+    self._thread.start()
+
+    if pollIntervalMs is not None:
+      import qt
+      self._timer = qt.QTimer()
+      self._timer.setInterval(pollIntervalMs)
+      self._timer.connect("timeout()", self.poll)
+      self._timer.start()
+
+  def _run(self):
+    try:
+      self._result = self._function(self.progress)
+    except BaseException as e:
+      self._exception = e
+
+  def cancel(self):
+    """Requests the cancellation of the task. The task stops at its next progress report."""
+    self.progress.cancel()
+
+  @property
+  def isRunning(self):
+    return self._thread is not None and self._thread.is_alive()
+
+  def wait(self, timeout=None):
+    """Blocks until the worker thread ends or the timeout in seconds expires. Callbacks are not called."""
+    if self._thread is not None:
+      self._thread.join(timeout)
+
+  def poll(self):
+    """Reports the progress and dispatches the task outcome to the callbacks once the worker thread ended.
+
+    Returns
+    -------
+    bool - True if the task outcome was dispatched
+    """
+    if self._isDispatched:
+      return True
+
+    fraction = self.progress.fraction
+    if self._onProgress is not None and fraction != self._lastFraction:
+      self._lastFraction = fraction
+      self._onProgress(fraction)
+
+    if self._thread is None or self._thread.is_alive():
+      return False
+
+    self._isDispatched = True
+    if self._timer is not None:
+      self._timer.stop()
+
+    if isinstance(self._exception, TaskCancelledError):
+      if self._onCancelled is not None:
+        self._onCancelled()
+    elif self._exception is not None:
+      if self._onError is None:
+        raise self._exception
+      self._onError(self._exception)
+    elif self._onFinished is not None:
+      self._onFinished(self._result)
+    return True
+
+
+def stageProgressCallback(progressCallback, stageIndex, stageCount):
+  """Returns a progress callback reporting the progress of one of the equally weighted stages of a computation as the
+  number of done and total steps of the whole computation. Returns None if progressCallback is None.
+
+  Example :
+    hessian = computeHessian(progressCallback=stageProgressCallback(progress, 0, 2))
+    vesselness = computeMeasure(hessian, progressCallback=stageProgressCallback(progress, 1, 2))
+  """
+  if progressCallback is None:
+    return None
+
+  def onStageProgress(done, total):
+    progressCallback(stageIndex * total + done, stageCount * total)
+
+  return onStageProgress
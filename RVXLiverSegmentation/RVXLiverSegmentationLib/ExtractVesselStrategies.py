@@ -1,8 +1,13 @@
+import numpy as np
 import slicer
 
-from RVXLiverSegmentationLib import removeNodeFromMRMLScene
+from RVXLiverSegmentationLib import removeNodeFromMRMLScene, removeNodesFromMRMLScene
 from .RVXLiverSegmentationLogic import RVXLiverSegmentationLogic
-from .RVXLiverSegmentationUtils import getMarkupIdPositionDictionary, createLabelMapVolumeNodeBasedOnModel
+from .RVXLiverSegmentationUtils import getMarkupIdPositionDictionary, createLabelMapVolumeNodeBasedOnModel, \
+  allocateVolumeArray
+from .VolumeMask import maskBoundingBox
+
+LABELED_VESSEL_TREE_ATTRIBUTE = "RVXLiverSegmentation.LabeledVesselTree"
 
 
 class VesselSeedPoints(object):
@@ -177,18 +182,133 @@ def mergeVolumes(volumes, volName):
   -------
   Tuple[vtkMRMLVolumeNode, vtkMRMLModelNode]
   """
-  # Extract list of volumes as list of np arrays
-  npVolumes = [slicer.util.arrayFromVolume(volume).astype(int) for volume in volumes]
+  merger = LabelMapMerger(volName)
+  for volume in volumes:
+    merger.add(volume)
+  return merger.finish()
+
+
+class LabelMapMerger(object):
+  """Streaming merge of label map volumes sharing the same geometry.
+
+  Each added volume is merged into a single array owned by the output volume. Only the non zero bounding box of each
+  added volume is read and written, so that the added volumes can be removed from the scene as soon as they are merged.
+
+  By default, the label values of the added volumes are OR-ed in a uint8 array. If label names are given, the non zero
+  voxels of each added volume are written with the label id of the volume instead. Where volumes overlap, the lowest
+  label id is kept, which makes the output independent of the order in which the volumes are added. Labeled outputs are
+  marked with the labeled vessel tree attribute (see isLabeledVolume).
+
+  Example :
+    merger = LabelMapMerger("levelSetSegmentation")
+    for volume in volumes:
+      merger.add(volume)
+    outVolume, outModel = merger.finish()
+  """
+
+  def __init__(self, volName, labelNames=None):
+    """
+    Parameters
+    ----------
+    volName: str
+    labelNames: List[str] or None
+      Names of the label ids 1 to len(labelNames). If not None, each volume is added with its label id and the output
+      volume is displayed with a color table named after the labels. The output is stored as uint8 for up to 255 labels
+      and as uint16 otherwise.
+    """
+    self._volName = volName
+    self._labelNames = list(labelNames) if labelNames is not None else None
+    self._outVolume = None
+    self._mergedArray = None
+
+  @property
+  def isLabeled(self):
+    return self._labelNames is not None
+
+  @staticmethod
+  def isLabeledVolume(volume):
+    """
+    Returns
+    -------
+    bool - True if the input volume is a labeled output of a LabelMapMerger, with one label per merged volume
+    """
+    return volume is not None and volume.GetAttribute(LABELED_VESSEL_TREE_ATTRIBUTE) == "1"
 
-  # Merge all volumes in one
-  mergedVol = npVolumes[0]
-  for i in range(1, len(npVolumes)):
-    mergedVol |= npVolumes[i]
+  def add(self, volume, labelId=None):
+    """Merges the input volume into the output volume. The output volume is created with the geometry of the first
+    added volume.
 
-  # Create output volume in slicer
-  outVol = createLabelMapVolumeNodeBasedOnModel(volumes[0], volName)
-  slicer.util.updateVolumeFromArray(outVol, mergedVol)
-  return outVol, RVXLiverSegmentationLogic.createVolumeBoundaryModel(outVol, volName + "Model", threshold=1)
+    Parameters
+    ----------
+    volume: vtkMRMLVolumeNode
+    labelId: int or None
+      Label id of the volume non zero voxels, between 1 and the number of label names. Only used if the merger has
+      label names.
+    """
+    if self.isLabeled and (labelId is None or not 1 <= labelId <= len(self._labelNames)):
+      raise ValueError("Label id should be between 1 and %d. Got %s" % (len(self._labelNames), labelId))
+
+    array = slicer.util.arrayFromVolume(volume)
+    if self._outVolume is None:
+      self._outVolume = createLabelMapVolumeNodeBasedOnModel(volume, self._volName)
+      storageType = np.uint16 if self.isLabeled and len(self._labelNames) > np.iinfo(np.uint8).max else np.uint8
+      self._mergedArray = allocateVolumeArray(self._outVolume, array.shape, storageType)
+      self._mergedArray.fill(0)
+    elif array.shape != self._mergedArray.shape:
+      raise ValueError("Merged volumes are expected to have the same shape : %s != %s" % (array.shape,
+                                                                                         self._mergedArray.shape))
+
+    boundingBox = maskBoundingBox(array)
+    if boundingBox is None:
+      return
+
+    start, stop = boundingBox
+    slices = tuple(slice(s, e) for s, e in zip(start, stop))
+    merged = self._mergedArray[slices]
+    if self.isLabeled:
+      # Write the label where the volume is non zero and the voxel is either unlabeled or has a greater label
+      np.copyto(merged, labelId, where=(array[slices] != 0) & ((merged == 0) | (merged > labelId)))
+    else:
+      np.bitwise_or(merged, array[slices], out=merged, casting="unsafe")
+
+  def finish(self):
+    """
+    Returns
+    -------
+    Tuple[vtkMRMLLabelMapVolumeNode, vtkMRMLModelNode] - Merged volume and its surface mesh
+
+    Raises
+    ------
+    ValueError if no volume was added
+    """
+    if self._outVolume is None:
+      raise ValueError("No volume to merge")
+
+    slicer.util.arrayFromVolumeModified(self._outVolume)
+    outVol, self._outVolume, self._mergedArray = self._outVolume, None, None
+    if not self.isLabeled:
+      return outVol, RVXLiverSegmentationLogic.createVolumeBoundaryModel(outVol, self._volName + "Model", threshold=1)
+
+    outVol.SetAttribute(LABELED_VESSEL_TREE_ATTRIBUTE, "1")
+    outVol.CreateDefaultDisplayNodes()
+    outVol.GetDisplayNode().SetAndObserveColorNodeID(self._createColorTable().GetID())
+    return outVol, RVXLiverSegmentationLogic.createVolumeBoundaryModel(outVol, self._volName + "Model", threshold=0.5)
+
+  def _createColorTable(self):
+    """Creates a color table naming each label id after its label name. Segmentations imported from the merged volume
+    then contain one segment per label named after the label.
+    """
+    import colorsys
+
+    colorTable = slicer.mrmlScene.AddNewNodeByClass("vtkMRMLColorTableNode", self._volName + "Colors")
+    colorTable.SetTypeToUser()
+    colorTable.SetNumberOfColors(len(self._labelNames) + 1)
+    colorTable.SetColor(0, "Background", 0., 0., 0., 0.)
+    for labelId, labelName in enumerate(self._labelNames, start=1):
+      # Spread the hues with the golden ratio so that consecutive branches have distinct colors
+      r, g, b = colorsys.hsv_to_rgb((labelId * 0.618033988749895) % 1., 0.7, 0.9)
+      colorTable.SetColor(labelId, labelName, r, g, b, 1.)
+    return colorTable
 
 
 class ExtractAllVesselsInOneGoStrategy(IExtractVesselStrategy):
@@ -239,8 +359,14 @@ class ExtractVesselFromVesselSeedPointsStrategy(IExtractVesselStrategy):
   """Base class for strategies using VMTK on multiple start + end points and aggregating results as one volume.
   deriving classes must implement a function returning a list of node pairs constructed from vessel tree and node id
   position dictionary
+
+  If labelBranches is True, the results are not merged as a binary volume but each vessel is written with its own label
+  id (its index in the vessel seed list plus one), named after the vessel terminal node id.
   """
 
+  def __init__(self, labelBranches=False):
+    self.labelBranches = labelBranches
+
   def constructVesselSeedList(self, vesselBranchTree, idPositionDict):
     """
     Parameters
@@ -280,22 +406,17 @@ class ExtractVesselFromVesselSeedPointsStrategy(IExtractVesselStrategy):
     # Loop over all ids
     vesselSeedList = self.constructVesselSeedList(vesselBranchTree, idPositionDict)
 
-    volumes = []
-    elementsToRemoveFromScene = []
-    for vesselSeeds in vesselSeedList:
-      seedsNodes, stoppersNodes, outVolume, outModel = logic.extractVesselVolumeFromPosition(
-        vesselSeeds.getSeedPositions(), vesselSeeds.getStopperPositions())
-      elementsToRemoveFromScene.append(seedsNodes)
-      elementsToRemoveFromScene.append(stoppersNodes)
-      elementsToRemoveFromScene.append(outModel)
-      elementsToRemoveFromScene.append(outVolume)
-      volumes.append(outVolume)
-
-    outVolume, outModel = mergeVolumes(volumes, "levelSetSegmentation")
-    for volume in elementsToRemoveFromScene:
-      removeNodeFromMRMLScene(volume)
-
-    return outVolume, outModel
+    # Run the level set of each vessel (in parallel if the level set worker count is greater than one). Merge each run
+    # output as soon as it completes and remove its nodes.
+    positionsList = [(vesselSeeds.getSeedPositions(), vesselSeeds.getStopperPositions()) for vesselSeeds in
+                     vesselSeedList]
+    labelNames = [str(vesselSeeds.lastPointId()) for vesselSeeds in vesselSeedList] if self.labelBranches else None
+    merger = LabelMapMerger("levelSetSegmentation", labelNames)
+    for i, (seedsNodes, stoppersNodes, outVolume, outModel) in logic.extractVesselVolumesFromPositions(positionsList):
+      merger.add(outVolume, labelId=i + 1)
+      removeNodesFromMRMLScene([seedsNodes, stoppersNodes, outVolume, outModel])
+
+    return merger.finish()
 
 
 class ExtractOneVesselPerParentChildNode(ExtractVesselFromVesselSeedPointsStrategy):
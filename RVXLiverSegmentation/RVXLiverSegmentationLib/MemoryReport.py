@@ -0,0 +1,60 @@
+from collections import OrderedDict
+
+
+def vtkDataObjectBytes(dataObject):
+  """Returns the memory size of the input VTK data object in bytes (0 if None)"""
+  return dataObject.GetActualMemorySize() * 1024 if dataObject is not None else 0
+
+
+class MemoryReport(object):
+  """Accumulates the bytes allocated by each stage of a pipeline run over several runs.
+
+  The pipeline calls startRun at the beginning of each run and reports the buffers allocated by each of its stages with
+  add. The buffers of a run are expected to stay alive until the end of the run, the peak of a run being the sum of its
+  stage bytes.
+
+  Example :
+    report = MemoryReport()
+    logic.levelSetMemoryReport = report
+    logic.extractVesselVolumeFromPosition(seedsPositions, endPositions)
+    print(report.rows())
+  """
+
+  def __init__(self):
+    self._stageBytes = OrderedDict()
+    self._stageCounts = OrderedDict()
+    self._runBytes = 0
+    self.runCount = 0
+    self.peakRunBytes = 0
+
+  def startRun(self):
+    self._runBytes = 0
+    self.runCount += 1
+
+  def add(self, stageName, nbytes):
+    """Records nbytes allocated by the input stage in the current run"""
+    self._stageBytes[stageName] = self._stageBytes.get(stageName, 0) + nbytes
+    self._stageCounts[stageName] = self._stageCounts.get(stageName, 0) + 1
+    self._runBytes += nbytes
+    self.peakRunBytes = max(self.peakRunBytes, self._runBytes)
+
+  def stageBytes(self, stageName):
+    """Returns the total bytes allocated by the input stage over all the runs"""
+    return self._stageBytes.get(stageName, 0)
+
+  @property
+  def totalBytes(self):
+    return sum(self._stageBytes.values())
+
+  def rows(self):
+    """
+    Returns
+    -------
+    List[OrderedDict] - One row per stage containing the stage name, its number of calls, its total and mean bytes
+    """
+    return [OrderedDict([("stage", name), ("count", self._stageCounts[name]), ("totalBytes", nbytes),
+                         ("meanBytes", nbytes // self._stageCounts[name])]) for name, nbytes in self._stageBytes.items()]
+
+  def __repr__(self):
+    return "MemoryReport(runCount={}, peakRunBytes={}, stageBytes={})".format(self.runCount, self.peakRunBytes,
+                                                                             dict(self._stageBytes))
@@ -0,0 +1,130 @@
+import numpy as np
+
+
+def hessianFromArray(array, sigma, normalizeAcrossScale=False, progressCallback=None):
+  """Computes the hessian of the input array using gaussian derivatives of given sigma (in voxels).
+
+  Parameters
+  ----------
+  array: np.array
+    3D input array
+  sigma: float
+    Standard deviation of the gaussian derivatives in voxels
+  normalizeAcrossScale: bool
+    If True, the derivatives are multiplied by sigma ** 2 to make responses of different sigmas comparable
+  progressCallback: Callable[[int, int], None] or None
+    Called with the number of computed and total hessian components. Exceptions raised by the callback stop the
+    computation.
+
+  Returns
+  -------
+  np.array
+    float32 array of shape (6,) + array.shape containing the H00, H01, H02, H11, H12 and H22 hessian components
+  """
+  from scipy import ndimage
+
+  array = np.asarray(array, dtype=np.float32)
+  hessian = np.empty((6,) + array.shape, dtype=np.float32)
+  derivativeOrders = [(2, 0, 0), (1, 1, 0), (1, 0, 1), (0, 2, 0), (0, 1, 1), (0, 0, 2)]
+  for i_component, (component, order) in enumerate(zip(hessian, derivativeOrders)):
+    ndimage.gaussian_filter(array, sigma, order=order, output=component, mode="nearest")
+    if progressCallback is not None:
+      progressCallback(i_component + 1, len(derivativeOrders))
+
+  if normalizeAcrossScale:
+    hessian *= np.float32(sigma ** 2)
+  return hessian
+
+
+def symmetricEigenvalues3x3(h00, h01, h02, h11, h12, h22):
+  """Closed form eigenvalues of 3x3 symmetric matrices given their 6 unique components as arrays of same shape.
+
+  Uses the trigonometric solution of the characteristic polynomial. All operations are vectorized over the input
+  arrays and done in the input precision.
+
+  Returns
+  -------
+  Tuple[np.array, np.array, np.array] - eigenvalues sorted by ascending value
+  """
+  dtype = np.result_type(h00, np.float32)
+  q = (h00 + h11 + h22) / 3
+  p1 = h01 * h01 + h02 * h02 + h12 * h12
+  d00, d11, d22 = h00 - q, h11 - q, h22 - q
+  p = np.sqrt((d00 * d00 + d11 * d11 + d22 * d22 + 2 * p1) / 6)
+
+  # Determinant of (H - q * I) / p, halved and clipped to avoid arccos domain errors from rounding
+  safeP = np.where(p > 0, p, 1).astype(dtype, copy=False)
+  det = d00 * (d11 * d22 - h12 * h12) - h01 * (h01 * d22 - h12 * h02) + h02 * (h01 * h12 - d11 * h02)
+  r = np.clip(det / (2 * safeP ** 3), -1, 1)
+  phi = np.arccos(r) / 3
+
+  largest = q + 2 * p * np.cos(phi)
+  smallest = q + 2 * p * np.cos(phi + np.float32(2 * np.pi / 3))
+  middle = 3 * q - largest - smallest
+  return smallest.astype(dtype, copy=False), middle.astype(dtype, copy=False), largest.astype(dtype, copy=False)
+
+
+def satoFromEigenvalues(lambda0, lambda1, lambda2, alpha1, alpha2):
+  """Sato line measure for bright tubular structures given the hessian eigenvalues sorted by ascending value.
+  Reproduces the ITK Hessian3DToVesselnessMeasureImageFilter measure.
+
+  Returns
+  -------
+  np.array - float32 line measure
+  """
+  normalizeValue = np.minimum(-lambda1, -lambda0)
+  isTubular = normalizeValue > 0
+  alpha = np.where(lambda2 <= 0, np.float32(alpha1), np.float32(alpha2))
+  ratio = np.divide(lambda2, alpha * normalizeValue, out=np.zeros_like(normalizeValue), where=isTubular)
+  measure = normalizeValue * np.exp(-0.5 * ratio * ratio)
+  return np.where(isTubular, measure, 0).astype(np.float32, copy=False)
+
+
+def satoVesselnessFromHessian(hessian, alpha1, alpha2, chunkSize=2 ** 20, mask=None, progressCallback=None):
+  """Computes the Sato vesselness from the hessian components by chunks of voxels to limit the temporaries memory.
+
+  Parameters
+  ----------
+  hessian: np.array
+    Hessian components as returned by hessianFromArray
+  alpha1: float
+  alpha2: float
+  chunkSize: int
+    Number of voxels processed at once
+  mask: np.array or None
+    Boolean array with the same shape as the hessian components. If provided, the eigenvalues are only computed for the
+    voxels inside the mask and the vesselness is 0 outside the mask.
+  progressCallback: Callable[[int, int], None] or None
+    Called with the number of processed and total chunks. Exceptions raised by the callback stop the computation.
+
+  Returns
+  -------
+  np.array - float32 vesselness with the same shape as the hessian components
+  """
+  volumeShape = hessian.shape[1:]
+  flatHessian = hessian.reshape(6, -1)
+  if mask is None:
+    output = np.empty(flatHessian.shape[1], dtype=np.float32)
+    chunks = [slice(start, start + chunkSize) for start in range(0, output.size, chunkSize)]
+  else:
+    output = np.zeros(flatHessian.shape[1], dtype=np.float32)
+    maskIndices = np.flatnonzero(mask)
+    chunks = [maskIndices[start:start + chunkSize] for start in range(0, maskIndices.size, chunkSize)]
+
+  for i_chunk, chunk in enumerate(chunks):
+    eigenvalues = symmetricEigenvalues3x3(*flatHessian[:, chunk])
+    output[chunk] = satoFromEigenvalues(*eigenvalues, alpha1=alpha1, alpha2=alpha2)
+    if progressCallback is not None:
+      progressCallback(i_chunk + 1, len(chunks))
+  return output.reshape(volumeShape)
+
+
+def satoVesselness(array, sigma, alpha1, alpha2, normalizeAcrossScale=False, chunkSize=2 ** 20, mask=None):
+  """Computes the Sato vesselness of the input array using only NumPy and SciPy.
+
+  Returns
+  -------
+  np.array - float32 vesselness with the same shape as the input array
+  """
+  hessian = hessianFromArray(array, sigma, normalizeAcrossScale)
+  return satoVesselnessFromHessian(hessian, alpha1, alpha2, chunkSize, mask)
@@ -4,8 +4,19 @@ from slicer.ScriptedLoadableModule import ScriptedLoadableModuleLogic
 import vtk
 
 from .RVXLiverSegmentationUtils import raiseValueErrorIfInvalidType, createLabelMapVolumeNodeBasedOnModel, \
-  createFiducialNode, createModelNode, createVolumeNodeBasedOnModel, removeNodeFromMRMLScene, cropSourceVolume, \
-  cloneSourceVolume, getVolumeIJKToRASDirectionMatrixAsNumpyArray
+  createFiducialNode, createModelNode, createVolumeNodeBasedOnModel, removeNodeFromMRMLScene, \
+  removeNodesFromMRMLScene, getVolumeIJKToRASDirectionMatrixAsNumpyArray, getVolumeIndexBoundsInSource, \
+  getAlignedVolumeIndexBoundsInSource, getRoiIndexBoundsInVolume, createDownsampledVolume, \
+  ensureVolumeImageDataIsReady, allocateVolumeArray, updateItkFilter, VolumeCrop
+from .BackgroundTask import stageProgressCallback
+from .ArrayNormalization import normalizeArray, normalizedMaximumValue
+from .MemoryReport import vtkDataObjectBytes
+from .NumpyVesselness import hessianFromArray, satoVesselnessFromHessian
+from .ResultCache import LRUCache
+from .TiledVolumeFilter import TiledVolumeFilter, haloFromSigma, tilesOutsideRegion
+from .VesselnessParameterSweep import VesselnessSweepResults, groupParametersBySharedInput
+from .VolumeMask import dilateMask, maskBoundingBox, SparseBlockMask
+from .VolumeResampling import downsampleArray, resampleArray
 
 try:
   from LevelSetSegmentation import LevelSetSegmentationWidget, LevelSetSegmentationLogic
@@ -35,11 +46,17 @@ class VMTKModule(object):
     return ExtractCenterlineLogic()
 
 
+VESSELNESS_SCALE_FACTOR_ATTRIBUTE = "RVXLiverSegmentation.VesselnessScaleFactor"
+
+
 class VesselnessFilterParameters(object):
   """Object holding the parameters for the vesselness filter algorithm. Init constructs vesselness filter with default
   parameters
   """
 
+  # Parameters which only change how the vesselness is computed and not its values
+  EXECUTION_ONLY_NAMES = ("workerCount", "useTiling", "tileMaxPeakMemoryBytes")
+
   def __init__(self):
     self.useROI = True
     self.roiGrowthFactor = 1.2
@@ -53,6 +70,88 @@ class VesselnessFilterParameters(object):
     self.satoAlpha1 = 0.5
     self.satoAlpha2 = 2
     self.useVmtkFilter = False
+    self.satoSigmas = []
+    self.workerCount = 0
+    self.satoBackend = "itk"  # "itk" or "numpy"
+    self.useTiling = False
+    self.tileMaxPeakMemoryBytes = 512 * 1024 ** 2
+    self.useLiverMask = False
+    self.liverMaskMargin = 10  # mm
+    self.vesselnessStorageType = "float32"  # "float32", "uint16" or "uint8". Only applies to the Sato vesselness.
+    self.useIsotropicResampling = False  # If True, Sato sigmas are expressed in mm
+    self.isotropicSpacing = 1.  # mm
+
+  def getSatoSigmas(self):
+    """
+    Returns
+    -------
+    List[float] - Multi scale Sato sigmas if defined, otherwise list containing only the single scale Sato sigma
+    """
+    return list(self.satoSigmas) if self.satoSigmas else [self.satoSigma]
+
+  def getWorkerCount(self, taskCount):
+    """
+    Returns
+    -------
+    int - Number of workers to use for the input task count. If workerCount is 0, the CPU count is used.
+    """
+    import os
+    workerCount = self.workerCount if self.workerCount > 0 else (os.cpu_count() or 1)
+    return max(1, min(workerCount, taskCount))
+
+  def getHessianBytesPerVoxel(self):
+    """
+    Returns
+    -------
+    int - Bytes used by the hessian of a voxel with the current Sato backend. The ITK hessian is a double precision
+    symmetric tensor image (6 float64 components per voxel) and the numpy hessian has 6 float32 components per voxel.
+    """
+    componentType = np.float32 if self.satoBackend == "numpy" else np.float64
+    return 6 * np.dtype(componentType).itemsize
+
+  def getSatoTileBytesPerVoxel(self):
+    """
+    Returns
+    -------
+    int - Estimated peak working memory of the tiled Sato vesselness per tile voxel with the current backend
+    """
+    floatBytes = np.dtype(np.float32).itemsize
+
+    # float32 tile input, boolean tile mask, hessian, scale measure and maximum of the scales
+    bytesPerVoxel = floatBytes + np.dtype(bool).itemsize + self.getHessianBytesPerVoxel() + 2 * floatBytes
+    if self.satoBackend == "numpy":
+      # Mask voxel indices, gathered hessian components and closed form eigenvalues temporaries (measured with
+      # tracemalloc on masked tiles smaller than the eigenvalues chunks)
+      return bytesPerVoxel + np.dtype(np.int64).itemsize + 6 * floatBytes + 14 * floatBytes
+
+    # Masked copy of the ITK measure output
+    return bytesPerVoxel + floatBytes
+
+  @staticmethod
+  def satoSigmaRange(minSigma, maxSigma, sigmaCount):
+    """
+    Returns
+    -------
+    List[float] - sigmaCount sigmas logarithmically spaced between minSigma and maxSigma
+    """
+    if sigmaCount <= 1:
+      return [float(minSigma)]
+    return [float(sigma) for sigma in np.geomspace(minSigma, maxSigma, sigmaCount)]
+
+  def cacheKey(self, excludedNames=EXECUTION_ONLY_NAMES):
+    """
+    Parameters
+    ----------
+    excludedNames: Iterable[str]
+      Names of the parameters which are not part of the key. The execution only parameters are excluded by default as
+      they don't change the vesselness results.
+
+    Returns
+    -------
+    Tuple - Hashable tuple containing all the parameter names and values
+    """
+    return tuple(sorted((name, tuple(value) if isinstance(value, list) else value)  #
+                        for name, value in vars(self).items() if name not in excludedNames))
 
 
 class LevelSetParameters(object):
@@ -67,6 +166,174 @@ class LevelSetParameters(object):
     self.iterationNumber = 10
     self.initializationMethod = "collidingfronts"
     self.levelSetMethod = "geodesic"
+    self.useBranchROI = False  # If True, each level set run is restricted to the ROI of its seeds and stoppers
+    self.branchROIMarginFactor = 2.  # Branch ROI margin in multiples of the vesselness filter maximum diameter
+    self.useCroppedEvolution = False  # If True, the evolution only runs on the source voxels of the vesselness extent
+    self.workerCount = 1  # Number of level set runs computed in parallel
+
+  def getWorkerCount(self, runCount):
+    """
+    Returns
+    -------
+    int - Number of workers to use for the input run count
+    """
+    return max(1, min(self.workerCount, runCount))
+
+  def cacheKey(self, excludedNames=("workerCount",)):
+    """
+    Parameters
+    ----------
+    excludedNames: Iterable[str]
+      Names of the parameters which are not part of the key. The worker count is excluded by default as it doesn't
+      change the level set results.
+
+    Returns
+    -------
+    Tuple - Hashable tuple containing all the parameter names and values
+    """
+    return tuple(sorted((name, tuple(value) if isinstance(value, list) else value)  #
+                        for name, value in vars(self).items() if name not in excludedNames))
+
+
+class LevelSetRun(object):
+  """Inputs and outputs of one VMTK level set segmentation.
+
+  The run is created on the main thread as it creates the seeds and stoppers nodes and reads the vesselness scalar
+  range. Its VTK inputs are shallow copies of the volume images sharing the volume voxels, so that concurrent runs
+  don't copy the input and vesselness volumes. VTK data arrays are not thread safe (for instance their range cache is
+  updated without lock) : the range caches of the shared arrays are filled on the main thread so that the runs only
+  read the shared arrays.
+  """
+
+  def __init__(self, sourceVolume, croppedSourceVolume, vesselnessVolume, seedsPositions, endPositions,
+               levelSetParameters):
+    """
+    Parameters
+    ----------
+    sourceVolume : vtkMRMLScalarVolumeNode
+      Original volume (before vesselness filter or cropping)
+    croppedSourceVolume : vtkMRMLScalarVolumeNode
+      Volume defining the cropped grid of the segmentation (cropped original volume or vesselness volume). This
+      volume is expected to have the same geometry as the vesselness volume and to be aligned with the source volume
+      grid.
+    vesselnessVolume : vtkMRMLScalarVolumeNode
+      Volume after filtering by vesselness filter
+    seedsPositions : List[List[float]]
+      Seed positions for the vessel
+    endPositions : List[List[float]]
+      End positions for the vessel
+    levelSetParameters : LevelSetParameters
+    """
+    # Type checking
+    raiseValueErrorIfInvalidType(sourceVolume=(sourceVolume, "vtkMRMLScalarVolumeNode"),
+                                 croppedSourceVolume=(croppedSourceVolume, "vtkMRMLScalarVolumeNode"),
+                                 vesselnessVolume=(vesselnessVolume, "vtkMRMLScalarVolumeNode"))
+
+    self.sourceVolume = sourceVolume
+    self.croppedSourceVolume = croppedSourceVolume
+    self.levelSetParameters = levelSetParameters
+    self.croppedStart = None
+    self.temporaryNodes = []
+
+    # Get module logic from VMTK LevelSetSegmentation
+    self._segmentationLogic = VMTKModule.getLevelSetSegmentationLogic()
+
+    # Source voxels used by the evolution. In cropped mode, only the source voxels of the cropped grid are used.
+    evolutionSourceVolume = sourceVolume
+    if levelSetParameters.useCroppedEvolution:
+      self.croppedStart, croppedStop = getVolumeIndexBoundsInSource(sourceVolume, croppedSourceVolume)
+      evolutionSourceVolume = VolumeCrop(sourceVolume, self.croppedStart, croppedStop).createVolumeNode(
+        "LevelSetEvolutionSource", copyVoxels=True)
+      self.temporaryNodes.append(evolutionSourceVolume)
+
+    # Copy paste code from LevelSetSegmentation start method
+    # https://github.com/vmtk/SlicerExtension-VMTK/blob/master/LevelSetSegmentation/LevelSetSegmentation.py
+
+    # Aggregate start point and end point as seeds for vessel extraction
+    allSeedsPositions = list(seedsPositions) + list(endPositions)
+
+    # now we need to convert the fiducials to vtkIdLists
+    self.seedsNodes = createFiducialNode("LevelSetSegmentationSeeds", *allSeedsPositions)
+    self.stoppersNodes = createFiducialNode("LevelSetSegmentationStoppers", *endPositions)
+    self.seeds = LevelSetSegmentationWidget.convertFiducialHierarchyToVtkIdList(self.seedsNodes, vesselnessVolume)
+    self.stoppers = LevelSetSegmentationWidget.convertFiducialHierarchyToVtkIdList(
+      self.stoppersNodes, vesselnessVolume) if self.stoppersNodes else vtk.vtkIdList()
+
+    # The scalar ranges are read on the main thread as they update the range caches of the shared arrays
+    scalarRange = self._fillRangeCaches(vesselnessVolume.GetImageData())
+    self._fillRangeCaches(evolutionSourceVolume.GetImageData())
+    self.minimumScalarValue = round(scalarRange[0], 0)
+    self.maximumScalarValue = round(scalarRange[1], 0)
+
+    # the input images of the initialization and of the evolution. The VMTK filters don't modify their input.
+    self.inputImage = self._copyImage(vesselnessVolume.GetImageData())
+    self.evolutionSourceImage = self._copyImage(evolutionSourceVolume.GetImageData())
+
+    self.initializationKey = None
+    self.isInitializationCached = False
+    self.initImageData = None
+    self.evolImageData = None
+    self.labelMap = None
+
+  def setCachedInitialization(self, initImageData):
+    """Sets the initialization image computed by a previous run with the same vesselness, seeds, stoppers and
+    initialization method. The initialization step is then skipped by compute.
+    """
+    # The cached image is shared between runs. Each run uses its own image object.
+    self._fillRangeCaches(initImageData)
+    self.initImageData = self._copyImage(initImageData)
+    self.isInitializationCached = True
+
+  @staticmethod
+  def _copyImage(imageData):
+    """Returns a shallow copy of the input image sharing its voxels"""
+    imageCopy = vtk.vtkImageData()
+    imageCopy.ShallowCopy(imageData)
+    return imageCopy
+
+  @staticmethod
+  def _fillRangeCaches(imageData):
+    """Computes the scalar range and the component ranges of the input image scalars to fill their range caches.
+
+    Returns
+    -------
+    Tuple[float] - Scalar range of the image
+    """
+    scalars = imageData.GetPointData().GetScalars()
+    for component in range(-1, scalars.GetNumberOfComponents()):
+      scalars.GetRange(component)
+    return imageData.GetScalarRange()
+
+  def compute(self):
+    """Computes the initialization (unless it was cached), the evolution and the label map of the run. Doesn't
+    access any MRML node.
+
+    Raises
+    ------
+    ValueError if the initialization is empty
+    """
+    if not self.isInitializationCached:
+      # perform the initialization. The VMTK logic returns new images owned by the caller which are used directly
+      self.initImageData = self._segmentationLogic.performInitialization(
+        self.inputImage, self.minimumScalarValue, self.maximumScalarValue, self.seeds, self.stoppers,
+        self.levelSetParameters.initializationMethod)
+
+    if not self.initImageData.GetPointData().GetScalars():
+      # something went wrong, the image is empty
+      raise ValueError("Segmentation failed - the output was empty...")
+
+    # no preview, run the whole thing! we never use the vesselness node here, just the original one
+    p = self.levelSetParameters
+    self.evolImageData = self._segmentationLogic.performEvolution(self.evolutionSourceImage, self.initImageData,
+                                                                  p.iterationNumber, p.inflation, p.curvature,
+                                                                  p.attraction, p.levelSetMethod)
+
+    # create segmentation labelMap
+    self.labelMap = self._segmentationLogic.buildSimpleLabelMap(self.evolImageData, 5, 0)
+
+  def removeNodes(self):
+    """Removes the seeds, stoppers and temporary nodes of the run from the scene"""
+    removeNodesFromMRMLScene([self.seedsNodes, self.stoppersNodes] + self.temporaryNodes)
 
 
 class IRVXLiverSegmentationLogic(object):
@@ -94,17 +361,56 @@ class IRVXLiverSegmentationLogic(object):
 class RVXLiverSegmentationLogic(ScriptedLoadableModuleLogic, IRVXLiverSegmentationLogic):
   """Class regrouping the logic methods for the plugin. Uses the VMTK algorithm for most of its functionality.
   Holds a map of previously calculated vesselness volumes to avoid reprocessing it when extracting liver vessels.
+
+  The vesselness map is a LRU cache bounded by a memory budget and keyed by input volume, ROI extent and vesselness
+  filter parameters. Its budget and hit / miss statistics are accessible through the vesselnessCache attribute.
+
+  Sato hessian images are cached separately in the hessianCache attribute for each input volume, ROI and sigma. Changing
+  only the Sato alpha parameters will then only recompute the vesselness measure step.
+
+  When the ROI grows and contains the previous ROI, the Sato vesselness is only computed on the newly exposed slabs
+  (plus a halo sized from the largest sigma) and stitched with the previous unnormalized vesselness.
+
+  A preview vesselness can be computed on a downsampled pyramid level of the cropped input volume for interactive
+  parameter tuning. The preview is kept separate from the full resolution vesselness used for vessel extraction.
+
+  When a liver mask is set and the useLiverMask filter parameter is enabled, the input volume is cropped to the
+  bounding box of the liver mask dilated by the liver mask margin and the vesselness is 0 outside the dilated mask.
+
+  Level set results are cached in the levelSetCache attribute for each vesselness volume, level set parameters and seeds
+  and end positions. When the vessels are extracted again after moving some markups, only the runs whose positions
+  changed are computed. Each entry stores the label map as bit packed sparse block masks and the model poly data.
+
+  The level set initialization images are cached separately in the levelSetInitializationCache attribute for each
+  vesselness volume, seeds and end positions and initialization method. Changing only the evolution parameters will
+  then skip the initialization front propagation.
   """
 
-  def __init__(self, parent=None):
+  def __init__(self, parent=None, vesselnessCacheMaxBytes=2 * 1024 ** 3, hessianCacheMaxBytes=2 * 1024 ** 3,
+               levelSetCacheMaxBytes=512 * 1024 ** 2, levelSetInitializationCacheMaxBytes=512 * 1024 ** 2):
     ScriptedLoadableModuleLogic.__init__(self, parent)
     IRVXLiverSegmentationLogic.__init__(self)
 
     self._inputVolume = None
+    self._inputCrop = None
     self._croppedInputVolume = None
+    self._croppedInputKey = None
     self._vesselnessVolume = None
-    self._inputRoi = None
+    self._vesselnessKey = None
+    self._previousSatoVesselness = None
+    self._pendingVesselnessKey = None
+    self._previewInputVolume = None
+    self._previewInputKey = None
+    self._previewVesselnessVolume = None
+    self._liverMask = None
+    self._liverMaskKey = None
+    self._dilatedLiverMask = None
     self.levelSetParameters = LevelSetParameters()
+    self.levelSetMemoryReport = None
+    self.vesselnessCache = LRUCache(vesselnessCacheMaxBytes)
+    self.hessianCache = LRUCache(hessianCacheMaxBytes)
+    self.levelSetCache = LRUCache(levelSetCacheMaxBytes)
+    self.levelSetInitializationCache = LRUCache(levelSetInitializationCacheMaxBytes)
 
   @staticmethod
   def isVmtkFound():
@@ -120,14 +426,52 @@ class RVXLiverSegmentationLogic(ScriptedLoadableModuleLogic, IRVXLiverSegmentati
 
     if self._inputVolume != inputVolume:
       self._inputVolume = inputVolume
+      self.setLiverMask(None)
+
+  def setLiverMask(self, liverMaskVolume):
+    """Sets the liver mask used to restrict the vesselness computation when the useLiverMask filter parameter is enabled.
+
+    Parameters
+    ----------
+    liverMaskVolume: vtkMRMLLabelMapVolumeNode or None
+      Label map aligned with the input volume grid whose non zero voxels are inside the liver. If None or empty, the
+      liver mask is removed and the vesselness is not restricted.
+    """
+    import hashlib
 
-  def _applyVmtkVesselnessFilter(self, sourceVolume):
+    self._liverMask = None
+    self._liverMaskKey = None
+    self._dilatedLiverMask = None
+    if liverMaskVolume is None:
+      return
+
+    raiseValueErrorIfInvalidType(liverMaskVolume=(liverMaskVolume, "vtkMRMLLabelMapVolumeNode"))
+    if self._isInvalidVolumeInput():
+      raise ValueError("Please set the input volume before setting the liver mask")
+
+    mask = slicer.util.arrayFromVolume(liverMaskVolume) > 0
+    boundingBox = maskBoundingBox(mask)
+    if boundingBox is None:
+      return
+
+    # Store the mask cropped to its bounding box with its start index in the input volume array
+    maskStart, _ = getVolumeIndexBoundsInSource(self._inputVolume, liverMaskVolume)
+    start, stop = boundingBox
+    mask = np.ascontiguousarray(mask[tuple(slice(s, e) for s, e in zip(start, stop))])
+    start = tuple(s + offset for s, offset in zip(start, maskStart))
+    self._liverMask = (start, mask)
+    self._liverMaskKey = (start, mask.shape, hashlib.md5(np.packbits(mask)).hexdigest())
+
+  def _applyVmtkVesselnessFilter(self, sourceVolume, diameterVoxelSize=None):
     """Apply VMTK VesselnessFilter to source volume given start point. Returns ouput volume with vesselness information
 
     Parameters
     ----------
     sourceVolume: vtkMRMLScalarVolumeNode
       Volume which will be labeled with vesselness information
+    diameterVoxelSize: float or None
+      Size in mm of the voxels in which the vessel diameters are expressed. If None, the source volume minimum spacing
+      is used.
 
     Returns
     -------
@@ -151,8 +495,10 @@ class RVXLiverSegmentationLogic(ScriptedLoadableModuleLogic, IRVXLiverSegmentati
     beta = vesselnessLogic.betaFromSuppressBlobsPercentage(self._vesselnessFilterParam.suppressBlobsPercent)
 
     # Scale minimum and maximum diameters with volume spacing
-    minimumDiameter = self._vesselnessFilterParam.minimumDiameter * min(sourceVolume.GetSpacing())
-    maximumDiameter = maximumVesselDiameter * min(sourceVolume.GetSpacing())
+    if diameterVoxelSize is None:
+      diameterVoxelSize = min(sourceVolume.GetSpacing())
+    minimumDiameter = self._vesselnessFilterParam.minimumDiameter * diameterVoxelSize
+    maximumDiameter = maximumVesselDiameter * diameterVoxelSize
 
     # Compute vesselness volume
     vesselnessLogic.computeVesselnessVolume(sourceVolume, vesselnessFiltered, maximumDiameterMm=maximumDiameter,
@@ -161,7 +507,7 @@ class RVXLiverSegmentationLogic(ScriptedLoadableModuleLogic, IRVXLiverSegmentati
 
     return vesselnessFiltered
 
-  def _applySatoVesselnessFilter(self, sourceVolume):
+  def _applySatoVesselnessFilter(self, sourceVolume, hessianCacheKey=None, output_array=None):
     """Apply SATO VesselnessFilter to source volume. Returns output volume with vesselness information.
 
     Implementation is based on the following documentation :
@@ -169,150 +515,386 @@ class RVXLiverSegmentationLogic(ScriptedLoadableModuleLogic, IRVXLiverSegmentati
 
     Parameters
     ----------
-    sourceVolume: vtkMRMLScalarVolumeNode
-      Volume which will be labeled with vesselness information
+    sourceVolume: vtkMRMLScalarVolumeNode or VolumeCrop
+      Volume (or volume region) which will be labeled with vesselness information
+    hessianCacheKey: hashable or None
+      Key identifying the source volume content in the hessian cache. If None, the hessian image is not cached.
+    output_array: np.array or None
+      Already computed unnormalized vesselness of the source volume. If None, the vesselness is computed.
 
     Returns
     -------
     outputVolume : vtkMRMLLabelMapVolumeNode
       Volume with vesselness information
     """
-    import itk
-
     # Type checking
-    raiseValueErrorIfInvalidType(sourceVolume=(sourceVolume, "vtkMRMLScalarVolumeNode"))
+    if not isinstance(sourceVolume, VolumeCrop):
+      raiseValueErrorIfInvalidType(sourceVolume=(sourceVolume, "vtkMRMLScalarVolumeNode"))
+      sourceVolume = VolumeCrop(sourceVolume)
 
-    # Convert input volume to ITK
-    np_array = slicer.util.arrayFromVolume(sourceVolume)
-    itk_image = itk.image_view_from_array(np_array)
-    hessian_image = itk.hessian_recursive_gaussian_image_filter(itk_image.astype(itk.F),
-                                                                sigma=self._vesselnessFilterParam.satoSigma)
+    if output_array is None:
+      output_array = self._satoVesselnessRawArray(sourceVolume.array, hessianCacheKey)
 
-    vesselness_filter = itk.Hessian3DToVesselnessMeasureImageFilter[itk.F].New()
-    vesselness_filter.SetInput(hessian_image)
-    vesselness_filter.SetAlpha1(self._vesselnessFilterParam.satoAlpha1)
-    vesselness_filter.SetAlpha2(self._vesselnessFilterParam.satoAlpha2)
+    # Initialize output volume from input volume geometry
+    vesselnessFiltered = sourceVolume.createVolumeNode("VesselnessFiltered")
 
-    # Convert output back to Slicer format
-    vesselness_filter.Update()
-    filtered_image = vesselness_filter.GetOutput()
+    # Normalize output between 0 and 1 directly in the output volume buffer. The input array is left untouched as it
+    # may be reused by the incremental vesselness computation.
+    storageType = np.dtype(self._vesselnessFilterParam.vesselnessStorageType)
+    normalizeArray(output_array, out=allocateVolumeArray(vesselnessFiltered, output_array.shape, storageType))
+    self._setVesselnessScaleFactor(vesselnessFiltered, storageType)
+    slicer.util.arrayFromVolumeModified(vesselnessFiltered)
 
-    # Normalize output between 0 and 1
-    output_array = itk.array_view_from_image(filtered_image)
-    output_array = (output_array - np.min(output_array)) / (np.max(output_array) - np.min(output_array))
+    return vesselnessFiltered
 
-    # Initialize output volume from input volume
-    vesselnessFiltered = createVolumeNodeBasedOnModel(sourceVolume, "VesselnessFiltered", "vtkMRMLScalarVolumeNode")
-    slicer.util.updateVolumeFromArray(vesselnessFiltered, output_array)
+  def _satoVesselnessRawArray(self, np_array, hessianCacheKey, sigmas=None, mask=None, progressCallback=None):
+    """Computes the unnormalized Sato vesselness of the input array using the current filter parameters.
+    If sigmas is None, the filter parameters Sato sigmas are used. If mask is provided, the vesselness is 0 outside of
+    the mask.
 
-    return vesselnessFiltered
+    If progressCallback is provided, it is called with the number of done and total steps (tiles in tiled mode, sigmas
+    in multi scale mode, hessian and vesselness measure steps otherwise). Exceptions raised by the callback stop the
+    computation.
 
-  @classmethod
-  def _applyLevelSetSegmentationFromNodePositions(cls, sourceVolume, croppedSourceVolume, vesselnessVolume,
-                                                  seedsPositions, endPositions, levelSetParameters):
-    """ Apply VMTK LevelSetSegmentation to vesselnessVolume given input seed positions and end positions
+    Returns
+    -------
+    np.array - float32 vesselness array
+    """
+    sigmas = sigmas or self._vesselnessFilterParam.getSatoSigmas()
+    if self._vesselnessFilterParam.useTiling:
+      return self._tiledSatoVesselnessArray(np_array, sigmas, mask, progressCallback)
+    elif len(sigmas) == 1:
+      return self._satoVesselnessArray(np_array, sigmas[0], hessianCacheKey, normalizeAcrossScale=False, mask=mask,
+                                       progressCallback=progressCallback)
+    else:
+      return self._multiScaleSatoVesselnessArray(np_array, sigmas, hessianCacheKey, mask, progressCallback)
+
+  def _isotropicSatoVesselnessRawArray(self, np_array, spacing, hessianCacheKey, mask=None, progressCallback=None,
+                                       workingSpacing=None):
+    """Computes the unnormalized Sato vesselness on an isotropic working grid and resamples it back to the input grid.
 
-    Returns label Map Volume with segmentation information and model containing marching cubes iso surface extraction
+    The input array is linearly resampled to the working spacing and the Sato sigmas, expressed in mm, are converted
+    to working voxels. The computation cost depends on the physical size of the input rather than its resolution.
 
     Parameters
     ----------
-    sourceVolume : vtkMRMLScalarVolumeNode
-      Original volume (before vesselness filter or cropping)
-    croppedSourceVolume : vtkMRMLScalarVolumeNode
-      Cropped original volume. This volume is expected to have the same size as the vesselness volume)
-    vesselnessVolume : vtkMRMLScalarVolumeNode
-      Volume after filtering by vesselness filter
-    seedsPositions : List[List[float]]
-      Seed positions for the vessel
-    endPositions : List[List[float]]
-      End positions for the vessel
-    levelSetParameters : LevelSetParameters
+    np_array: np.array
+      Input array
+    spacing: Tuple[float]
+      Input voxel size along each array axis
+    hessianCacheKey: hashable or None
+      Key identifying the input array content in the hessian cache
+    mask: np.array or None
+      If provided, the vesselness is 0 outside of the mask
+    progressCallback: Callable[[int, int], None] or None
+      Called with the number of done and total steps of the working grid vesselness computation
+    workingSpacing: float or None
+      Working grid spacing in mm. If None, the filter parameters isotropic spacing is used.
 
     Returns
     -------
-    LevelSetSeeds : vtkMRMLMarkupsFiducialNode
-      Nodes used as seeds during level set segmentation (aggregate of seedsPositions and endPositions)
-    LevelSetStoppers : vtkMRMLMarkupsFiducialNode
-      Nodes used as stoppers during level set segmentation (aggregate of start point and end point)
-    LevelSetSegmentation : vtkMRMLLabelMapVolumeNode
-      segmentation volume output
-    LevelSetModel : vtkMRMLModelNode
-      Model after marching cubes on the segmentation data
+    np.array - float32 vesselness array with the input array shape
     """
-    # Type checking
-    raiseValueErrorIfInvalidType(sourceVolume=(sourceVolume, "vtkMRMLScalarVolumeNode"),
-                                 croppedSourceVolume=(croppedSourceVolume, "vtkMRMLScalarVolumeNode"),
-                                 vesselnessVolume=(vesselnessVolume, "vtkMRMLScalarVolumeNode"))
+    workingSpacing = workingSpacing or self._vesselnessFilterParam.isotropicSpacing
+    workingGridSpacing = (workingSpacing,) * np_array.ndim
+    working_array = resampleArray(np_array, spacing, workingGridSpacing)
+    working_mask = resampleArray(mask, spacing, workingGridSpacing, order=0) > 0 if mask is not None else None
 
-    # Get module logic from VMTK LevelSetSegmentation
-    segmentationLogic = VMTKModule.getLevelSetSegmentationLogic()
+    sigmas = [sigma / workingSpacing for sigma in self._vesselnessFilterParam.getSatoSigmas()]
+    workingCacheKey = (hessianCacheKey, "isotropic", workingSpacing) if hessianCacheKey is not None else None
+    working_vesselness = self._satoVesselnessRawArray(working_array, workingCacheKey, sigmas, working_mask,
+                                                      progressCallback)
 
-    # Create output volume node
-    tmpVolume = createLabelMapVolumeNodeBasedOnModel(croppedSourceVolume, "LevelSetSegmentation")
+    output_array = resampleArray(working_vesselness, workingGridSpacing, spacing, outputShape=np_array.shape)
+    if mask is not None:
+      output_array[~mask] = 0
+    return output_array
 
-    # Copy paste code from LevelSetSegmentation start method
-    # https://github.com/vmtk/SlicerExtension-VMTK/blob/master/LevelSetSegmentation/LevelSetSegmentation.py
+  def _multiScaleSatoVesselnessArray(self, np_array, sigmas, hessianCacheKey, mask=None, progressCallback=None):
+    """Computes the Sato vesselness for each input sigma in a thread pool and reduces the results with a voxel wise
+    maximum. Hessians are normalized across scales to make the responses of the different sigmas comparable.
 
-    # Aggregate start point and end point as seeds for vessel extraction
-    allSeedsPositions = seedsPositions + endPositions
+    Returns
+    -------
+    np.array - float32 array with the maximum vesselness response of all the scales
+    """
+    from concurrent.futures import ThreadPoolExecutor, as_completed
+
+    def scaleVesselness(sigma):
+      return self._satoVesselnessArray(np_array, sigma, hessianCacheKey, normalizeAcrossScale=True, mask=mask)
+
+    output_array = None
+    with ThreadPoolExecutor(max_workers=self._vesselnessFilterParam.getWorkerCount(len(sigmas))) as executor:
+      futures = [executor.submit(scaleVesselness, sigma) for sigma in sigmas]
+      try:
+        for i_scale, future in enumerate(as_completed(futures)):
+          scale_array = future.result()
+          if output_array is None:
+            output_array = np.array(scale_array, dtype=np.float32)
+          else:
+            np.maximum(output_array, scale_array, out=output_array)
+
+          if progressCallback is not None:
+            progressCallback(i_scale + 1, len(sigmas))
+      except BaseException:
+        # Don't start the remaining scales if the computation failed or was cancelled
+        for future in futures:
+          future.cancel()
+        raise
+
+    return output_array
+
+  def _tiledSatoVesselnessArray(self, np_array, sigmas, mask=None, progressCallback=None):
+    """Computes the Sato vesselness in overlapping tiles with a halo sized from the largest sigma.
+    Tiles are processed concurrently within the tile peak memory cap and compute their sigmas serially.
+    Hessians are not cached in tiled mode. Tiles without any voxel in the mask are skipped.
 
-    # now we need to convert the fiducials to vtkIdLists
-    seedsNodes = createFiducialNode("LevelSetSegmentationSeeds", *allSeedsPositions)
-    stoppersNodes = createFiducialNode("LevelSetSegmentationStoppers", *endPositions)
-    seeds = LevelSetSegmentationWidget.convertFiducialHierarchyToVtkIdList(seedsNodes, vesselnessVolume)
-    stoppers = LevelSetSegmentationWidget.convertFiducialHierarchyToVtkIdList(stoppersNodes,
-                                                                              vesselnessVolume) if stoppersNodes else vtk.vtkIdList()
+    Returns
+    -------
+    np.array - float32 array with the maximum vesselness response of all the scales
+    """
+    def tileVesselness(tile_array, tile_mask=None):
+      return self._satoTileVesselnessArray(tile_array, sigmas, tile_mask)
 
-    # the input image for the initialization
-    inputImage = vtk.vtkImageData()
-    inputImage.DeepCopy(vesselnessVolume.GetImageData())
+    tiledFilter = TiledVolumeFilter(tileVesselness, halo=haloFromSigma(max(sigmas)),
+                                    maxPeakMemoryBytes=self._vesselnessFilterParam.tileMaxPeakMemoryBytes,
+                                    bytesPerVoxel=self._vesselnessFilterParam.getSatoTileBytesPerVoxel(),
+                                    workerCount=self._vesselnessFilterParam.getWorkerCount(np_array.size))
+    return tiledFilter.run(np_array, maskArray=mask, progressCallback=progressCallback)
 
-    # initialization
-    initImageData = vtk.vtkImageData()
+  def _satoTileVesselnessArray(self, tile_array, sigmas, tile_mask=None):
+    """Computes the Sato vesselness of a tile by processing the sigmas serially without hessian caching.
+    Normalization across scales is consistent with the full volume computation.
 
-    # evolution
-    evolImageData = vtk.vtkImageData()
+    Returns
+    -------
+    np.array - float32 array with the maximum vesselness response of all the scales
+    """
+    normalizeAcrossScale = len(sigmas) > 1
+    tile_output = None
+    for sigma in sigmas:
+      scale_array = self._satoVesselnessArray(tile_array, sigma, None, normalizeAcrossScale, tile_mask)
+      if tile_output is None:
+        tile_output = np.array(scale_array, dtype=np.float32)
+      else:
+        np.maximum(tile_output, scale_array, out=tile_output)
+    return tile_output
+
+  def _incrementalSatoVesselnessArray(self, np_array, bounds, previousBounds, previous_array, mask=None,
+                                      progressCallback=None):
+    """Computes the Sato vesselness of an enlarged ROI by reusing the vesselness computed for a previous ROI contained in
+    the new one.
+
+    Previous values closer than the halo to a grown side of the previous ROI are recomputed as they were influenced by
+    the previous ROI boundary. The rest of the new ROI is split in slabs processed with a halo sized from the largest
+    sigma.
 
-    # perform the initialization
-    currentScalarRange = inputImage.GetScalarRange()
-    minimumScalarValue = round(currentScalarRange[0], 0)
-    maximumScalarValue = round(currentScalarRange[1], 0)
+    Parameters
+    ----------
+    np_array: np.array
+      Input array of the new ROI
+    bounds: Tuple[Tuple[int], Tuple[int]]
+      Start and stop indices of the new ROI in the source volume array
+    previousBounds: Tuple[Tuple[int], Tuple[int]]
+      Start and stop indices of the previous ROI in the source volume array
+    previous_array: np.array
+      Unnormalized vesselness of the previous ROI
+    mask: np.array or None
+      Vesselness mask of the new ROI. Must match the mask used for the previous ROI on their common region.
+    progressCallback: Callable[[int, int], None] or None
+      Called with the number of computed slabs and the total number of slabs after each slab
 
-    initImageData.DeepCopy(
-      segmentationLogic.performInitialization(inputImage, minimumScalarValue, maximumScalarValue, seeds, stoppers,
-                                              levelSetParameters.initializationMethod))
+    Returns
+    -------
+    np.array or None - float32 unnormalized vesselness array. None if the previous ROI is not contained in the new ROI or
+    if no previous value can be reused.
+    """
+    from concurrent.futures import ThreadPoolExecutor, as_completed
 
-    if not initImageData.GetPointData().GetScalars():
-      # something went wrong, the image is empty
-      raise ValueError("Segmentation failed - the output was empty...")
+    (start, stop), (previousStart, previousStop) = bounds, previousBounds
+    if any(s > prevS or e < prevE for s, e, prevS, prevE in zip(start, stop, previousStart, previousStop)):
+      return None
 
-    # no preview, run the whole thing! we never use the vesselness node here, just the original one
-    evolImageData.DeepCopy(
-      segmentationLogic.performEvolution(sourceVolume.GetImageData(), initImageData, levelSetParameters.iterationNumber,
-                                         levelSetParameters.inflation, levelSetParameters.curvature,
-                                         levelSetParameters.attraction, levelSetParameters.levelSetMethod))
+    sigmas = self._vesselnessFilterParam.getSatoSigmas()
+    halo = haloFromSigma(max(sigmas))
+    reusedStart = tuple(prevS - s + (halo if prevS > s else 0) for s, prevS in zip(start, previousStart))
+    reusedStop = tuple(prevE - s - (halo if prevE < e else 0) for s, e, prevE in zip(start, stop, previousStop))
+    if any(reStart >= reStop for reStart, reStop in zip(reusedStart, reusedStop)):
+      return None
 
-    # create segmentation labelMap
-    labelMap = vtk.vtkImageData()
-    labelMap.DeepCopy(segmentationLogic.buildSimpleLabelMap(evolImageData, 5, 0))
+    output_array = np.empty(np_array.shape, dtype=np.float32)
+    reusedSlices = tuple(slice(reStart, reStop) for reStart, reStop in zip(reusedStart, reusedStop))
+    previousSlices = tuple(slice(reStart + s - prevS, reStop + s - prevS)
+                           for reStart, reStop, s, prevS in zip(reusedStart, reusedStop, start, previousStart))
+    output_array[reusedSlices] = previous_array[previousSlices]
+
+    def processTile(tile):
+      tile_array = np.ascontiguousarray(np_array[tile.haloSlices], dtype=np.float32)
+      tile_mask = mask[tile.haloSlices] if mask is not None else None
+      output_array[tile.coreSlices] = self._satoTileVesselnessArray(tile_array, sigmas, tile_mask)[
+        tile.coreInHaloSlices]
+
+    tiles = tilesOutsideRegion(np_array.shape, reusedStart, reusedStop, halo)
+    if tiles:
+      with ThreadPoolExecutor(max_workers=self._vesselnessFilterParam.getWorkerCount(len(tiles))) as executor:
+        futures = [executor.submit(processTile, tile) for tile in tiles]
+        try:
+          for i_tile, future in enumerate(as_completed(futures)):
+            future.result()
+            if progressCallback is not None:
+              progressCallback(i_tile + 1, len(tiles))
+        except BaseException:
+          for future in futures:
+            future.cancel()
+          raise
+
+    return output_array
+
+  def _satoVesselnessArray(self, np_array, sigma, hessianCacheKey, normalizeAcrossScale, mask=None,
+                           progressCallback=None):
+    """Computes the Sato vesselness measure of the input array for the given sigma and current alpha parameters using
+    the current Sato backend.
+
+    If mask is provided, the vesselness is 0 outside of the mask. The numpy backend only computes the hessian
+    eigenvalues of the voxels inside the mask.
+
+    If progressCallback is provided, it is called with the number of done and total steps of the hessian and vesselness
+    measure computations. Exceptions raised by the callback stop the computation.
 
-    # propagate the label map to the node
-    tmpVolume.SetAndObserveImageData(labelMap)
+    Returns
+    -------
+    np.array - float32 vesselness array (view on the ITK vesselness measure output image for the ITK backend)
+    """
+    hessian = self._satoHessian(np_array, sigma, hessianCacheKey, normalizeAcrossScale,
+                                stageProgressCallback(progressCallback, 0, 2))
+    alpha1 = self._vesselnessFilterParam.satoAlpha1
+    alpha2 = self._vesselnessFilterParam.satoAlpha2
+    measureProgressCallback = stageProgressCallback(progressCallback, 1, 2)
 
-    # Resample output volume to be the same size and orientation as non cropped volume
-    outVolume = cls.resampleLabelMap(newVolumeTemplate=sourceVolume, labelMapToResample=tmpVolume,
-                                     labelMapName="LevelSetSegmentation")
+    if self._vesselnessFilterParam.satoBackend == "numpy":
+      return satoVesselnessFromHessian(hessian, alpha1, alpha2, mask=mask, progressCallback=measureProgressCallback)
 
-    # Remove tmp volume
-    slicer.mrmlScene.RemoveNode(tmpVolume)
+    import itk
+    vesselness_filter = itk.Hessian3DToVesselnessMeasureImageFilter[itk.F].New()
+    vesselness_filter.SetInput(hessian)
+    vesselness_filter.SetAlpha1(alpha1)
+    vesselness_filter.SetAlpha2(alpha2)
+
+    # Convert output back to numpy format
+    updateItkFilter(vesselness_filter, measureProgressCallback)
+    output_array = itk.array_view_from_image(vesselness_filter.GetOutput())
+    return output_array if mask is None else np.where(mask, output_array, np.float32(0))
+
+  def _satoHessian(self, np_array, sigma, hessianCacheKey, normalizeAcrossScale, progressCallback=None):
+    """Returns the hessian of the input array for the input sigma computed with the current Sato backend.
+    The ITK backend returns an ITK hessian image and the numpy backend returns a float32 array of hessian components.
+    The hessian is read from the hessian cache if it was already computed for the same key, backend and sigma.
+    """
+    backend = self._vesselnessFilterParam.satoBackend
+    cacheKey = (hessianCacheKey, backend, sigma, normalizeAcrossScale) if hessianCacheKey is not None else None
+    hessian = self.hessianCache.get(cacheKey) if cacheKey is not None else None
+    if hessian is not None:
+      if progressCallback is not None:
+        progressCallback(1, 1)
+      return hessian
+
+    if backend == "numpy":
+      hessian = hessianFromArray(np_array, sigma, normalizeAcrossScale, progressCallback)
+    else:
+      import itk
 
-    # Construct model boundary mesh
-    outModel = RVXLiverSegmentationLogic.createVolumeBoundaryModel(outVolume, "LevelSetSegmentationModel", evolImageData)
+      # Convert input volume to ITK. Cropped inputs are non contiguous views on the input volume and are copied.
+      itk_image = itk.image_view_from_array(np.ascontiguousarray(np_array, dtype=np.float32))
+      hessian_filter = itk.HessianRecursiveGaussianImageFilter[type(itk_image)].New(
+        itk_image, Sigma=sigma, NormalizeAcrossScale=normalizeAcrossScale)
+      updateItkFilter(hessian_filter, progressCallback)
+      hessian = hessian_filter.GetOutput()
 
-    return seedsNodes, stoppersNodes, outVolume, outModel
+      # Detach hessian from the input image view to avoid keeping a reference to the source volume buffer
+      if cacheKey is not None:
+        hessian.DisconnectPipeline()
+
+    if cacheKey is not None:
+      hessianBytes = np_array.size * self._vesselnessFilterParam.getHessianBytesPerVoxel()
+      self.hessianCache.put(cacheKey, hessian, hessianBytes)
+
+    return hessian
+
+  @classmethod
+  def _finishLevelSetSegmentation(cls, levelSetRun, memoryReport=None):
+    """Creates the output label map and model of a computed level set run in the source volume grid and removes the
+    run temporary nodes. Must be called on the main thread.
+
+    Returns
+    -------
+    Tuple[vtkMRMLMarkupsFiducialNode, vtkMRMLMarkupsFiducialNode, vtkMRMLLabelMapVolumeNode, vtkMRMLModelNode]
+      Seeds nodes, stoppers nodes, segmentation volume and segmentation model
+    """
+    def reportStage(stageName, dataObject):
+      if memoryReport is not None:
+        memoryReport.add(stageName, vtkDataObjectBytes(dataObject))
+
+    if memoryReport is not None:
+      memoryReport.startRun()
+      if levelSetRun.levelSetParameters.useCroppedEvolution:
+        reportStage("evolutionSource", levelSetRun.evolutionSourceImage)
+      if not levelSetRun.isInitializationCached:
+        reportStage("initialization", levelSetRun.initImageData)
+      reportStage("evolution", levelSetRun.evolImageData)
+      reportStage("labelMap", levelSetRun.labelMap)
+
+    # propagate the label map to a node with the cropped grid geometry
+    tmpVolume = createLabelMapVolumeNodeBasedOnModel(levelSetRun.croppedSourceVolume, "LevelSetSegmentation")
+    tmpVolume.SetAndObserveImageData(levelSetRun.labelMap)
+
+    if levelSetRun.levelSetParameters.useCroppedEvolution:
+      # The cropped grid is aligned with the source grid : paste the label map at its index offset
+      outVolume = cls.pasteLabelMap(newVolumeTemplate=levelSetRun.sourceVolume, labelMapToPaste=tmpVolume,
+                                    start=levelSetRun.croppedStart, labelMapName="LevelSetSegmentation")
+
+      # Construct model boundary mesh from the evolution output in the cropped grid
+      outModel = RVXLiverSegmentationLogic.createVolumeBoundaryModel(tmpVolume, "LevelSetSegmentationModel",
+                                                                     levelSetRun.evolImageData)
+    else:
+      # Resample output volume to be the same size and orientation as non cropped volume
+      outVolume = cls.resampleLabelMap(newVolumeTemplate=levelSetRun.sourceVolume, labelMapToResample=tmpVolume,
+                                       labelMapName="LevelSetSegmentation")
+
+      # Construct model boundary mesh
+      outModel = RVXLiverSegmentationLogic.createVolumeBoundaryModel(outVolume, "LevelSetSegmentationModel",
+                                                                     levelSetRun.evolImageData)
+
+    reportStage("outputLabelMap", outVolume.GetImageData())
+    reportStage("outputModel", outModel.GetPolyData())
+
+    # Remove tmp volume and run temporary nodes
+    slicer.mrmlScene.RemoveNode(tmpVolume)
+    removeNodesFromMRMLScene(levelSetRun.temporaryNodes)
+
+    return levelSetRun.seedsNodes, levelSetRun.stoppersNodes, outVolume, outModel
 
   @classmethod
   def resampleLabelMap(cls, newVolumeTemplate, labelMapToResample, labelMapName):
+    """Creates a label map with the template geometry containing the input label map resampled with a nearest
+    neighbor interpolation.
+
+    When the label map grid is a sub grid of the template grid (same orientation and spacing and integer index offset),
+    as for label maps computed on cropped volumes, the label map voxels are pasted at their index offset. Otherwise, the
+    label map is resampled with SimpleITK.
+
+    Returns
+    -------
+    vtkMRMLLabelMapVolumeNode - New label map added to the scene
+    """
+    bounds = getAlignedVolumeIndexBoundsInSource(newVolumeTemplate, labelMapToResample)
+    if bounds is not None:
+      start, _ = bounds
+      return cls.pasteLabelMap(newVolumeTemplate, labelMapToResample, start, labelMapName)
+    return cls.resampleLabelMapWithSimpleITK(newVolumeTemplate, labelMapToResample, labelMapName)
+
+  @classmethod
+  def resampleLabelMapWithSimpleITK(cls, newVolumeTemplate, labelMapToResample, labelMapName):
+    """Resamples the input label map on the template grid using a SimpleITK nearest neighbor resampling"""
     import SimpleITK as sitk
 
     def volume_itk_direction(v):
@@ -336,12 +918,48 @@ class RVXLiverSegmentationLogic(ScriptedLoadableModuleLogic, IRVXLiverSegmentati
     resample_filter.SetTransform(sitk.Transform())
     resample_filter.SetDefaultPixelValue(0)
     resampled_itk_im = resample_filter.Execute(to_resample_itk_im)
-    resampled_array = sitk.GetArrayFromImage(resampled_itk_im)
 
+    # Copy the resampled image directly into the label map buffer
+    resampled_array = sitk.GetArrayViewFromImage(resampled_itk_im)
     resampled_label_map = createLabelMapVolumeNodeBasedOnModel(newVolumeTemplate, labelMapName)
-    slicer.util.updateVolumeFromArray(resampled_label_map, resampled_array)
+    np.copyto(allocateVolumeArray(resampled_label_map, resampled_array.shape, resampled_array.dtype), resampled_array)
+    slicer.util.arrayFromVolumeModified(resampled_label_map)
     return resampled_label_map
 
+  @classmethod
+  def pasteLabelMap(cls, newVolumeTemplate, labelMapToPaste, start, labelMapName):
+    """Creates a label map with the template geometry containing the input label map pasted at the input index offset.
+    The label map to paste is expected to be aligned with the template grid (same orientation and spacing) and inside
+    the template extent, in which case pasting is equivalent to a nearest neighbor resampling.
+
+    Parameters
+    ----------
+    newVolumeTemplate: vtkMRMLScalarVolumeNode
+      Volume from which the output geometry is deduced
+    labelMapToPaste: vtkMRMLLabelMapVolumeNode
+    start: Tuple[int]
+      Index of the label map to paste first voxel in the template array (KJI order)
+    labelMapName: str
+
+    Returns
+    -------
+    vtkMRMLLabelMapVolumeNode - New label map added to the scene
+    """
+    return cls.pasteLabelMapArray(newVolumeTemplate, slicer.util.arrayFromVolume(labelMapToPaste), start, labelMapName)
+
+  @classmethod
+  def pasteLabelMapArray(cls, newVolumeTemplate, to_paste_array, start, labelMapName):
+    """Creates a label map with the template geometry containing the input label array pasted at the input index
+    offset. See pasteLabelMap.
+    """
+    pasted_label_map = createLabelMapVolumeNodeBasedOnModel(newVolumeTemplate, labelMapName)
+    shape = tuple(reversed(newVolumeTemplate.GetImageData().GetDimensions()))
+    pasted_array = allocateVolumeArray(pasted_label_map, shape, to_paste_array.dtype)
+    pasted_array.fill(0)
+    pasted_array[tuple(slice(s, s + size) for s, size in zip(start, to_paste_array.shape))] = to_paste_array
+    slicer.util.arrayFromVolumeModified(pasted_label_map)
+    return pasted_label_map
+
   @staticmethod
   def createVolumeBoundaryModel(sourceVolume, modelName, imageData=None, threshold=0.0):
     raiseValueErrorIfInvalidType(sourceVolume=(sourceVolume, "vtkMRMLScalarVolumeNode"))
@@ -355,10 +973,8 @@ class RVXLiverSegmentationLogic(ScriptedLoadableModuleLogic, IRVXLiverSegmentati
     ijkToRasMatrix = vtk.vtkMatrix4x4()
     sourceVolume.GetIJKToRASMatrix(ijkToRasMatrix)
 
-    # generate 3D model and call marching cubes
-    modelPolyData = vtk.vtkPolyData()
-    modelPolyData.DeepCopy(
-      VMTKModule.getLevelSetSegmentationLogic().marchingCubes(imageData, ijkToRasMatrix, threshold))
+    # generate 3D model and call marching cubes. The VMTK logic returns a new poly data which is used directly.
+    modelPolyData = VMTKModule.getLevelSetSegmentationLogic().marchingCubes(imageData, ijkToRasMatrix, threshold)
 
     # Create model node and associate model poly data
     modelNode = createModelNode(modelName)
@@ -481,43 +1097,492 @@ class RVXLiverSegmentationLogic(ScriptedLoadableModuleLogic, IRVXLiverSegmentati
   def _areExtremitiesValid(startPoint, endPoint):
     return RVXLiverSegmentationLogic._isPointValid(startPoint) and RVXLiverSegmentationLogic._isPointValid(endPoint)
 
-  def updateVesselnessVolume(self, nodePositions):
+  def updateVesselnessVolume(self, nodePositions, progressCallback=None):
     """Update vesselness volume node for current input volume and current filter parameters.
 
     If input node is not defined, no processing will be done. The method will return whether update was processed or
     not. Update can be cancelled either because of improper input node or if update for given input node + parameters
     has already been ran before.
 
+    If the vesselness for the input volume, ROI and filter parameters is present in the vesselness cache, the cached
+    result is used and the vesselness filter is not run.
+
+    The update is done synchronously. To compute the vesselness in a background thread, see prepareVesselnessUpdate.
+
+    Parameters
+    ----------
+    nodePositions: List[List[float]]
+      Positions used to compute the ROI if the ROI is used
+    progressCallback: Callable[[int, int], None] or None
+      Called with the number of done and total steps of the Sato vesselness computation
+
     Returns
     -------
     bool
-      True if update was done, False otherwise.
+      True if update was done, False otherwise. When True is returned, the vesselness volume image data is ready.
     """
-    import time
-
     # Early return in case the inputs is not properly defined or processing already done for input
     if self._isInvalidVolumeInput():
       return False
 
+    computeVesselness = self.prepareVesselnessUpdate(nodePositions)
+    if computeVesselness is not None:
+      self.finishVesselnessUpdate(computeVesselness(progressCallback))
+    return True
+
+  def prepareVesselnessUpdate(self, nodePositions):
+    """Prepares the update of the vesselness volume on the main thread.
+
+    The input volume is cropped and the vesselness cache is read. If the vesselness has to be computed with the Sato
+    filter, the returned function only operates on NumPy arrays and can be called from a background thread. Its result
+    has to be passed to finishVesselnessUpdate on the main thread. The logic must not be modified while the function
+    runs. The VMTK filter operates on MRML nodes and is applied directly.
+
+    Example :
+      computeVesselness = logic.prepareVesselnessUpdate(nodePositions)
+      if computeVesselness is not None:
+        task = BackgroundTask(computeVesselness, onFinished=logic.finishVesselnessUpdate)
+        task.start(pollIntervalMs=50)
+
+    Returns
+    -------
+    Callable[[Callable[[int, int], None] or None], np.array] or None
+      Function computing the unnormalized vesselness array given an optional progress callback. Exceptions raised by
+      the progress callback stop the computation. None if the vesselness volume was already updated.
+
+    Raises
+    ------
+    ValueError if the input volume is not set
+    """
+    if self._isInvalidVolumeInput():
+      raise ValueError("Please set the input volume before updating the vesselness volume")
+
+    roiExtent = self._roiExtent(nodePositions)
+    inputKey = self._inputVolumeKey(roiExtent)
+    self._updateInputCrop(inputKey, roiExtent)
+
     removeNodeFromMRMLScene(self._vesselnessVolume)
-    removeNodeFromMRMLScene(self._croppedInputVolume)
-    removeNodeFromMRMLScene(self._inputRoi)
-    if self._vesselnessFilterParam.useROI:
-      self._inputRoi = self._createROIFromNodePositions(nodePositions)
-      self._croppedInputVolume = cropSourceVolume(self._inputVolume, self._inputRoi)
-    else:
-      self._croppedInputVolume = cloneSourceVolume(self._inputVolume)
+    self._vesselnessVolume = None
+    self._vesselnessKey = None
+    vesselnessKey = (inputKey, self._vesselnessFilterParam.cacheKey(), self._activeLiverMaskKey())
+    vesselnessArray = self.vesselnessCache.get(vesselnessKey)
+    if vesselnessArray is not None:
+      self._vesselnessKey = vesselnessKey
+      self._vesselnessVolume = self._inputCrop.createVolumeNode("VesselnessFiltered")
+      np.copyto(allocateVolumeArray(self._vesselnessVolume, vesselnessArray.shape, vesselnessArray.dtype),
+                vesselnessArray)
+      if not self._vesselnessFilterParam.useVmtkFilter:
+        self._setVesselnessScaleFactor(self._vesselnessVolume, vesselnessArray.dtype)
+      slicer.util.arrayFromVolumeModified(self._vesselnessVolume)
+      ensureVolumeImageDataIsReady(self._vesselnessVolume)
+      return None
+
+    if self._vesselnessFilterParam.useVmtkFilter:
+      self._vesselnessVolume = self._applyVmtkVesselnessFilter(self._getCroppedInputVolume())
+      self._applyLiverMaskToVesselnessVolume(self._vesselnessVolume, self._croppedLiverMask(self._inputCrop))
+      self._storeVesselnessVolume(vesselnessKey)
+      return None
+
+    # Read the MRML inputs of the Sato computation on the main thread. The input array is a view on the input volume.
+    np_array = self._inputCrop.array
+    bounds = (self._inputCrop.start, self._inputCrop.stop)
+    spacing = self._inputCrop.spacing
+    mask = self._croppedLiverMask(self._inputCrop)
+    self._pendingVesselnessKey = vesselnessKey
+
+    def computeVesselness(progressCallback=None):
+      return self._updateSatoVesselnessArray(np_array, inputKey, bounds, spacing, mask, progressCallback)
+
+    return computeVesselness
 
-    self._croppedInputVolume.GetDisplayNode().SetVisibility(False)
+  def finishVesselnessUpdate(self, output_array):
+    """Creates the vesselness volume from the unnormalized vesselness array computed by the function returned by
+    prepareVesselnessUpdate. Must be called on the main thread.
+    """
+    self._vesselnessVolume = self._applySatoVesselnessFilter(self._inputCrop, output_array=output_array)
+    self._storeVesselnessVolume(self._pendingVesselnessKey)
+    self._pendingVesselnessKey = None
+
+  def _storeVesselnessVolume(self, vesselnessKey):
+    self._vesselnessKey = vesselnessKey
+    self.vesselnessCache.put(vesselnessKey, slicer.util.arrayFromVolume(self._vesselnessVolume).copy())
+    ensureVolumeImageDataIsReady(self._vesselnessVolume)
+
+  def updatePreviewVesselnessVolume(self, nodePositions, downsamplingFactor=2):
+    """Update preview vesselness volume computed on the cropped input volume downsampled by the input factor.
+
+    Sato sigmas and VMTK diameters are expressed in full resolution voxels and are scaled to the downsampled volume.
+    With isotropic resampling, the working spacing is multiplied by the downsampling factor.
+    The downsampled input and its hessians are kept between calls so that moving the filter parameters only recomputes
+    the vesselness of the downsampled volume.
+
+    Returns
+    -------
+    bool
+      True if update was done, False otherwise.
+    """
+    if self._isInvalidVolumeInput():
+      return False
+
+    roiExtent = self._roiExtent(nodePositions)
+    inputKey = self._inputVolumeKey(roiExtent)
+    self._updateInputCrop(inputKey, roiExtent)
 
+    previewKey = (inputKey, downsamplingFactor)
+    isPreviewInputPresent = self._previewInputVolume is not None and slicer.mrmlScene.IsNodePresent(
+      self._previewInputVolume)
+    if not isPreviewInputPresent or previewKey != self._previewInputKey:
+      removeNodeFromMRMLScene(self._previewInputVolume)
+      self._previewInputVolume = createDownsampledVolume(self._inputCrop, downsamplingFactor, "VesselnessPreviewInput")
+      self._previewInputKey = previewKey
+
+    mask = self._croppedLiverMask(self._inputCrop)
+    if mask is not None:
+      mask = downsampleArray(mask, downsamplingFactor) > 0
+
+    removeNodeFromMRMLScene(self._previewVesselnessVolume)
     if self._vesselnessFilterParam.useVmtkFilter:
-      self._vesselnessVolume = self._applyVmtkVesselnessFilter(self._croppedInputVolume)
+      self._previewVesselnessVolume = self._applyVmtkVesselnessFilter(
+        self._previewInputVolume, diameterVoxelSize=min(self._inputCrop.spacing))
+      self._applyLiverMaskToVesselnessVolume(self._previewVesselnessVolume, mask)
+    elif self._vesselnessFilterParam.useIsotropicResampling:
+      output_array = self._isotropicSatoVesselnessRawArray(
+        slicer.util.arrayFromVolume(self._previewInputVolume), tuple(reversed(self._previewInputVolume.GetSpacing())),
+        previewKey, mask, workingSpacing=self._vesselnessFilterParam.isotropicSpacing * downsamplingFactor)
+      self._previewVesselnessVolume = self._applySatoVesselnessFilter(self._previewInputVolume,
+                                                                      output_array=output_array)
     else:
-      self._vesselnessVolume = self._applySatoVesselnessFilter(self._croppedInputVolume)
+      sigmas = [sigma / downsamplingFactor for sigma in self._vesselnessFilterParam.getSatoSigmas()]
+      output_array = self._satoVesselnessRawArray(slicer.util.arrayFromVolume(self._previewInputVolume), previewKey,
+                                                  sigmas, mask)
+      self._previewVesselnessVolume = self._applySatoVesselnessFilter(self._previewInputVolume,
+                                                                      output_array=output_array)
 
-    time.sleep(1)  # Short sleep for this thread to enable volume to be updated
+    self._previewVesselnessVolume.SetName(slicer.mrmlScene.GetUniqueNameByString("VesselnessPreview"))
     return True
 
+  def getCurrentPreviewVesselnessVolume(self):
+    return self._previewVesselnessVolume
+
+  def removePreviewVesselnessVolume(self):
+    """Removes the preview vesselness volume and its downsampled input from the scene.
+    """
+    removeNodeFromMRMLScene(self._previewVesselnessVolume)
+    removeNodeFromMRMLScene(self._previewInputVolume)
+    self._previewVesselnessVolume = None
+    self._previewInputVolume = None
+    self._previewInputKey = None
+
+  def runVesselnessParameterSweep(self, nodePositions, parametersList, storeVolumes=True, statisticsFunctions=None,
+                                  progressCallback=None):
+    """Computes the vesselness of the current input volume for each of the input filter parameters.
+
+    Parameters only differing by their Sato sigma and alpha values share the same cropped input volume. The hessians of
+    all the sigmas of such a group are computed in parallel and shared by all the alpha values. The vesselness volume of
+    the logic and the logic filter parameters are not modified. The sweep can be run from the Python console :
+
+      logic = RVXLiverSegmentationLogic()
+      logic.setInputVolume(volume)
+      grid = parameterGrid(VesselnessFilterParameters(), satoSigma=[1, 2, 3], satoAlpha1=[0.3, 0.5], useROI=[False])
+      results = logic.runVesselnessParameterSweep([], grid, storeVolumes=False)
+      print(results.rows())
+
+    Parameters
+    ----------
+    nodePositions: List[List[float]]
+      Positions used to compute the ROI of the parameters using a ROI
+    parametersList: List[VesselnessFilterParameters]
+      Parameters to evaluate. See parameterGrid to create the cartesian product of parameter values.
+    storeVolumes: bool
+      If True, the normalized vesselness volumes are stored as float16 arrays in the results
+    statisticsFunctions: Dict[str, Callable[[np.array], float]] or None
+      Additional statistics computed on each normalized vesselness
+    progressCallback: Callable[[int, int], None] or None
+      Called with the number of evaluated parameters and the total number of parameters after each evaluation
+
+    Returns
+    -------
+    VesselnessSweepResults
+      Results ordered by parameter group and Sato sigmas
+    """
+    import time
+
+    if self._isInvalidVolumeInput():
+      raise ValueError("Please set the input volume before running a vesselness parameter sweep")
+
+    results = VesselnessSweepResults(storeVolumes, statisticsFunctions)
+    initialParameters = self._vesselnessFilterParam
+    try:
+      for group in groupParametersBySharedInput(parametersList):
+        self._vesselnessFilterParam = group[0]
+        roiExtent = self._roiExtent(nodePositions)
+        inputKey = self._inputVolumeKey(roiExtent)
+        self._updateInputCrop(inputKey, roiExtent)
+        np_array = self._inputCrop.array
+        mask = self._croppedLiverMask(self._inputCrop)
+        spacing = self._inputCrop.spacing
+        if not group[0].useVmtkFilter and not group[0].useTiling and not group[0].useIsotropicResampling:
+          self._precomputeSatoHessians(np_array, inputKey, group)
+
+        for parameters in group:
+          self._vesselnessFilterParam = parameters
+          start = time.perf_counter()
+          if parameters.useVmtkFilter:
+            vesselnessVolume = self._applyVmtkVesselnessFilter(self._getCroppedInputVolume())
+            self._applyLiverMaskToVesselnessVolume(vesselnessVolume, mask)
+            vesselness_array = slicer.util.arrayFromVolume(vesselnessVolume).copy()
+            removeNodeFromMRMLScene(vesselnessVolume)
+          elif parameters.useIsotropicResampling:
+            vesselness_array = self._isotropicSatoVesselnessRawArray(np_array, spacing, inputKey, mask)
+          else:
+            vesselness_array = self._satoVesselnessRawArray(np_array, inputKey, mask=mask)
+
+          results.append(parameters, vesselness_array, time.perf_counter() - start)
+          if progressCallback is not None:
+            progressCallback(len(results), len(parametersList))
+    finally:
+      self._vesselnessFilterParam = initialParameters
+
+    return results
+
+  def _precomputeSatoHessians(self, np_array, hessianCacheKey, parametersList):
+    """Computes the hessians of all the Sato sigmas of the input parameters in parallel and stores them in the hessian
+    cache. Nothing is computed if the hessians don't fit in the hessian cache.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    hessianArgs = set()
+    for parameters in parametersList:
+      sigmas = parameters.getSatoSigmas()
+      hessianArgs.update((sigma, len(sigmas) > 1) for sigma in sigmas)
+
+    hessianBytes = np_array.size * self._vesselnessFilterParam.getHessianBytesPerVoxel()
+    if not hessianArgs or len(hessianArgs) * hessianBytes > self.hessianCache.maxBytes:
+      return
+
+    def computeHessian(args):
+      self._satoHessian(np_array, args[0], hessianCacheKey, normalizeAcrossScale=args[1])
+
+    with ThreadPoolExecutor(max_workers=self._vesselnessFilterParam.getWorkerCount(len(hessianArgs))) as executor:
+      list(executor.map(computeHessian, sorted(hessianArgs)))
+
+  def _updateSatoVesselnessArray(self, np_array, inputKey, bounds, spacing, mask, progressCallback=None):
+    """Computes the unnormalized Sato vesselness of the cropped input volume array. If the previous vesselness was
+    computed for the same source volume and parameters on a ROI contained in the current ROI, only the newly exposed
+    region is computed (except with isotropic resampling). Doesn't access the MRML scene.
+
+    Parameters
+    ----------
+    np_array: np.array
+      Cropped input volume array
+    inputKey: Tuple
+      Key of the cropped input volume
+    bounds: Tuple[Tuple[int], Tuple[int]]
+      Start and stop indices of the cropped input volume in the input volume array
+    spacing: Tuple[float]
+      Voxel size of the cropped input volume along each array axis
+    mask: np.array or None
+      Vesselness mask of the cropped input volume
+    progressCallback: Callable[[int, int], None] or None
+      Called with the number of done and total steps of the computation
+
+    Returns
+    -------
+    np.array - float32 unnormalized vesselness array
+    """
+    if progressCallback is not None:
+      progressCallback(0, 1)
+
+    sourceKey = (inputKey[:-1], self._activeLiverMaskKey())
+    paramsKey = self._vesselnessFilterParam.cacheKey(
+      excludedNames=VesselnessFilterParameters.EXECUTION_ONLY_NAMES + ("useROI", "roiGrowthFactor", "minROIExtent",
+                                                                      "vesselnessStorageType"))
+
+    if self._vesselnessFilterParam.useIsotropicResampling:
+      # The working grid depends on the ROI bounds and previous values can't be reused
+      self._previousSatoVesselness = None
+      return self._isotropicSatoVesselnessRawArray(np_array, spacing, inputKey, mask, progressCallback)
+
+    output_array = None
+    previous = self._previousSatoVesselness
+    if previous is not None and previous[:2] == (sourceKey, paramsKey):
+      output_array = self._incrementalSatoVesselnessArray(np_array, bounds, previous[2], previous[3], mask,
+                                                          progressCallback)
+
+    if output_array is None:
+      output_array = np.array(self._satoVesselnessRawArray(np_array, inputKey, mask=mask,
+                                                           progressCallback=progressCallback), dtype=np.float32)
+
+    self._previousSatoVesselness = (sourceKey, paramsKey, bounds, output_array)
+    return output_array
+
+  def _updateInputCrop(self, inputKey, roiExtent):
+    """Crops the input volume to the voxels whose centers are inside the input ROI extent. The crop is a view on the
+    input volume array and doesn't add any node to the scene. The crop is kept if it was computed for the same input
+    volume and ROI.
+    """
+    if self._inputCrop is not None and inputKey == self._croppedInputKey:
+      return
+
+    removeNodeFromMRMLScene(self._croppedInputVolume)
+    self._croppedInputVolume = None
+    start, stop = getRoiIndexBoundsInVolume(self._inputVolume, *roiExtent) if roiExtent is not None else (None, None)
+    self._inputCrop = VolumeCrop(self._inputVolume, start, stop)
+    self._croppedInputKey = inputKey
+
+  def _getCroppedInputVolume(self):
+    """Returns a hidden scene volume containing a copy of the cropped input voxels, for the filters operating on MRML
+    nodes. The volume is created on first request and kept until the crop changes.
+    """
+    isCroppedVolumePresent = self._croppedInputVolume is not None and slicer.mrmlScene.IsNodePresent(
+      self._croppedInputVolume)
+    if not isCroppedVolumePresent:
+      self._croppedInputVolume = self._inputCrop.createVolumeNode(self._inputVolume.GetName() + "Cropped",
+                                                                  copyVoxels=True)
+    return self._croppedInputVolume
+
+  def _inputVolumeKey(self, roiExtent):
+    """
+    Returns
+    -------
+    Tuple - Hashable key identifying the input volume content and geometry as well as the input ROI extent
+    """
+    ijkToRas = vtk.vtkMatrix4x4()
+    self._inputVolume.GetIJKToRASMatrix(ijkToRas)
+    imageData = self._inputVolume.GetImageData()
+    imageDataMTime = imageData.GetMTime() if imageData is not None else None
+    ijkToRasElements = tuple(ijkToRas.GetElement(i, j) for i in range(4) for j in range(4))
+    return self._inputVolume.GetID(), imageDataMTime, ijkToRasElements, roiExtent
+
+  def _roiExtent(self, nodePositions):
+    """Returns the extent used to crop the input volume. The extent is the node positions ROI if the ROI is used,
+    intersected with the bounding box of the dilated liver mask if the vesselness is restricted to the liver.
+
+    Returns
+    -------
+    Tuple[Tuple[float], Tuple[float]] or None - ROI center and radius. None if the input volume is not cropped.
+
+    Raises
+    ------
+    ValueError if the node positions ROI doesn't intersect the dilated liver mask
+    """
+    roiExtent = self._roiExtentFromNodePositions(nodePositions) if self._vesselnessFilterParam.useROI else None
+    if self._activeLiverMaskKey() is None:
+      return roiExtent
+
+    maskExtent = self._liverMaskRoiExtent()
+    if roiExtent is None:
+      return maskExtent
+
+    roiMin, roiMax = np.subtract(*roiExtent), np.add(*roiExtent)
+    maskMin, maskMax = np.subtract(*maskExtent), np.add(*maskExtent)
+    intersectionMin, intersectionMax = np.maximum(roiMin, maskMin), np.minimum(roiMax, maskMax)
+    if np.any(intersectionMin >= intersectionMax):
+      raise ValueError("The vessel nodes bounding box doesn't intersect the liver mask")
+
+    center = (intersectionMin + intersectionMax) / 2.
+    radius = (intersectionMax - intersectionMin) / 2.
+    return tuple(np.round(center, 2)), tuple(np.round(radius, 2))
+
+  def _activeLiverMaskKey(self):
+    """
+    Returns
+    -------
+    Hashable key identifying the liver mask restricting the vesselness. None if the vesselness is not restricted.
+    """
+    if not self._vesselnessFilterParam.useLiverMask or self._liverMaskKey is None:
+      return None
+    return self._liverMaskKey, self._vesselnessFilterParam.liverMaskMargin
+
+  def _getDilatedLiverMask(self):
+    """
+    Returns
+    -------
+    Tuple[Tuple[int], np.array] - start index in the input volume array and liver mask dilated by the liver mask margin
+    """
+    maskKey = self._activeLiverMaskKey()
+    if self._dilatedLiverMask is None or self._dilatedLiverMask[0] != maskKey:
+      start, mask = self._liverMask
+      spacing = tuple(reversed(self._inputVolume.GetSpacing()))
+      dilatedMask, offset = dilateMask(mask, self._vesselnessFilterParam.liverMaskMargin, spacing)
+      self._dilatedLiverMask = (maskKey, (tuple(s + o for s, o in zip(start, offset)), dilatedMask))
+    return self._dilatedLiverMask[1]
+
+  def _liverMaskRoiExtent(self):
+    """
+    Returns
+    -------
+    Tuple[Tuple[float], Tuple[float]] - Center and radius of the RAS bounding box of the dilated liver mask voxels
+    """
+    start, mask = self._getDilatedLiverMask()
+    ijkToRas = vtk.vtkMatrix4x4()
+    self._inputVolume.GetIJKToRASMatrix(ijkToRas)
+
+    # Array indices are in KJI order and the voxel corners are half a voxel away from the voxel centers
+    ijkMin = [s - 0.5 for s in reversed(start)]
+    ijkMax = [s + size - 0.5 for s, size in zip(reversed(start), reversed(mask.shape))]
+    corners = [ijkToRas.MultiplyPoint([i, j, k, 1])[:3] for i in (ijkMin[0], ijkMax[0]) for j in (ijkMin[1], ijkMax[1])
+               for k in (ijkMin[2], ijkMax[2])]
+    rasMin, rasMax = np.min(corners, axis=0), np.max(corners, axis=0)
+    return tuple(np.round((rasMin + rasMax) / 2., 2)), tuple(np.round((rasMax - rasMin) / 2., 2))
+
+  def _croppedLiverMask(self, inputCrop):
+    """
+    Returns
+    -------
+    np.array or None - Dilated liver mask in the input crop grid. None if the vesselness is not restricted.
+    """
+    if self._activeLiverMaskKey() is None:
+      return None
+
+    maskStart, mask = self._getDilatedLiverMask()
+    start, stop = inputCrop.start, inputCrop.stop
+    croppedMask = np.zeros(tuple(e - s for s, e in zip(start, stop)), dtype=bool)
+    lower = [max(s, ms) for s, ms in zip(start, maskStart)]
+    upper = [min(e, ms + size) for e, ms, size in zip(stop, maskStart, mask.shape)]
+    if any(lo >= up for lo, up in zip(lower, upper)):
+      return croppedMask
+
+    croppedMask[tuple(slice(lo - s, up - s) for lo, up, s in zip(lower, upper, start))] = \
+      mask[tuple(slice(lo - ms, up - ms) for lo, up, ms in zip(lower, upper, maskStart))]
+    return croppedMask
+
+  @staticmethod
+  def _setVesselnessScaleFactor(vesselnessVolume, storageType):
+    vesselnessVolume.SetAttribute(VESSELNESS_SCALE_FACTOR_ATTRIBUTE, repr(1. / normalizedMaximumValue(storageType)))
+
+  @staticmethod
+  def getVesselnessScaleFactor(vesselnessVolume):
+    """
+    Returns
+    -------
+    float - Factor converting the values of the input vesselness volume to normalized vesselness. Quantized vesselness
+    volumes store the normalized vesselness multiplied by the maximum value of their type.
+    """
+    scaleFactor = vesselnessVolume.GetAttribute(VESSELNESS_SCALE_FACTOR_ATTRIBUTE)
+    return float(scaleFactor) if scaleFactor else 1.
+
+  @staticmethod
+  def _applyLiverMaskToVesselnessVolume(vesselnessVolume, mask):
+    """Sets the vesselness volume to 0 outside of the input mask. Does nothing if mask is None.
+    """
+    if mask is None:
+      return
+
+    vesselnessArray = slicer.util.arrayFromVolume(vesselnessVolume)
+    vesselnessArray[~mask] = 0
+    slicer.util.arrayFromVolumeModified(vesselnessVolume)
+
+  def _roiExtentFromNodePositions(self, nodePositions):
+    """
+    Returns
+    -------
+    Tuple[Tuple[float], Tuple[float]] - ROI center and radius rounded to 1/100 mm
+    """
+    center, radius = self.calculateRoiExtent(nodePositions, self._vesselnessFilterParam.minROIExtent,
+                                             self._vesselnessFilterParam.roiGrowthFactor)
+    return tuple(np.round(center, 2)), tuple(np.round(radius, 2))
+
   @staticmethod
   def calculateRoiExtent(nodePositions, minExtent, growthFactor):
     nodePositions = list(nodePositions)
@@ -537,13 +1602,15 @@ class RVXLiverSegmentationLogic(ScriptedLoadableModuleLogic, IRVXLiverSegmentati
     return center, radius
 
   def _createROIFromNodePositions(self, nodePositions):
-    roi = slicer.vtkMRMLAnnotationROINode()
-    roi.Initialize(slicer.mrmlScene)
-    roi.SetName(slicer.mrmlScene.GetUniqueNameByString("VolumeCropROI"))
-
     center, radius = self.calculateRoiExtent(nodePositions, self._vesselnessFilterParam.minROIExtent,
                                              self._vesselnessFilterParam.roiGrowthFactor)
+    return self._createROIFromExtent(center, radius)
 
+  @staticmethod
+  def _createROIFromExtent(center, radius):
+    roi = slicer.vtkMRMLAnnotationROINode()
+    roi.Initialize(slicer.mrmlScene)
+    roi.SetName(slicer.mrmlScene.GetUniqueNameByString("VolumeCropROI"))
     roi.SetXYZ(center)
     roi.SetRadiusXYZ(radius)
     roi.RemoveAllDisplayNodeIDs()
@@ -579,10 +1646,233 @@ class RVXLiverSegmentationLogic(ScriptedLoadableModuleLogic, IRVXLiverSegmentati
     LevelSetModel : vtkMRMLModelNode
       Model after marching cubes on the segmentation data
     """
+    cacheKey = self._levelSetCacheKey(seedsPositions, endPositions)
+    result = self._levelSetResultFromCache(cacheKey, seedsPositions, endPositions)
+    if result is None:
+      result = self._computeLevelSetResult(seedsPositions, endPositions, cacheKey)
+    return result
+
+  def extractVesselVolumesFromPositions(self, positionsList):
+    """Extracts the vessel volume and model of each (seeds positions, end positions) pair of the input list.
+
+    The results of the runs found in the level set cache are yielded first and only the other runs are computed.
+
+    If the level set worker count is greater than one, the runs are computed in worker threads. The runs are prepared
+    and finished on the calling thread and at most one run per worker is prepared at a time. The runs share the input
+    and vesselness voxels and don't copy them. Whether the runs actually overlap depends on the VTK Python wrapping
+    releasing the GIL during the VMTK filters execution, which is measured by benchmarkParallelLevelSet. The default
+    worker count is 1.
+
+    The results are yielded as soon as their run completes, in completion order, so that the caller can merge them and
+    remove their nodes while the other runs are computed.
+
+    Parameters
+    ----------
+    positionsList: List[Tuple[List[List[float]], List[List[float]]]]
+      Seeds positions and end positions of each run
+
+    Yields
+    ------
+    Tuple[int, Tuple] - Index of the run in the input list and extractVesselVolumeFromPosition outputs for the run
+    """
+    from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+    positionsList = list(positionsList)
+    cacheKeys = [self._levelSetCacheKey(seedsPositions, endPositions) for seedsPositions, endPositions in positionsList]
+    computedIndices = []
+    for i, (seedsPositions, endPositions) in enumerate(positionsList):
+      result = self._levelSetResultFromCache(cacheKeys[i], seedsPositions, endPositions)
+      if result is None:
+        computedIndices.append(i)
+      else:
+        yield i, result
+
+    workerCount = self.levelSetParameters.getWorkerCount(len(computedIndices))
+    if workerCount <= 1:
+      for i in computedIndices:
+        seedsPositions, endPositions = positionsList[i]
+        yield i, self._computeLevelSetResult(seedsPositions, endPositions, cacheKeys[i])
+      return
+
+    levelSetRuns = {}
+    pendingIndices = iter(computedIndices)
+    try:
+      with ThreadPoolExecutor(max_workers=workerCount) as executor:
+        futures = {}
+
+        def submitNextRun():
+          i = next(pendingIndices, None)
+          if i is not None:
+            seedsPositions, endPositions = positionsList[i]
+            levelSetRuns[i] = self._createLevelSetRun(seedsPositions, endPositions)
+            futures[executor.submit(levelSetRuns[i].compute)] = i
+
+        try:
+          for _ in range(workerCount):
+            submitNextRun()
+
+          while futures:
+            doneFutures, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in doneFutures:
+              i = futures.pop(future)
+              future.result()
+              result = self._finishLevelSetRun(levelSetRuns.pop(i), cacheKeys[i])
+              submitNextRun()
+              yield i, result
+        finally:
+          for future in futures:
+            future.cancel()
+    finally:
+      for levelSetRun in levelSetRuns.values():
+        levelSetRun.removeNodes()
+
+  def _computeLevelSetResult(self, seedsPositions, endPositions, cacheKey):
+    """Computes the level set run of the input positions on the calling thread and stores its result in the level set
+    cache.
+    """
+    levelSetRun = self._createLevelSetRun(seedsPositions, endPositions)
+    try:
+      levelSetRun.compute()
+    except Exception:
+      levelSetRun.removeNodes()
+      raise
+    return self._finishLevelSetRun(levelSetRun, cacheKey)
+
+  def _finishLevelSetRun(self, levelSetRun, cacheKey):
+    if levelSetRun.initializationKey is not None and not levelSetRun.isInitializationCached:
+      self.levelSetInitializationCache.put(levelSetRun.initializationKey, levelSetRun.initImageData,
+                                           vtkDataObjectBytes(levelSetRun.initImageData))
+    result = self._finishLevelSetSegmentation(levelSetRun, self.levelSetMemoryReport)
+    self._storeLevelSetResult(cacheKey, result)
+    return result
+
+  def _levelSetCacheKey(self, seedsPositions, endPositions):
+    """
+    Returns
+    -------
+    Tuple or None - Hashable key identifying the level set result of the input positions on the current vesselness
+    volume and input volume with the current level set parameters. None if the current vesselness volume is unknown.
+    """
+    if self._vesselnessVolume is None or self._vesselnessKey is None:
+      return None
+
+    return (self._vesselnessKey, self._inputVolumeKey(None), self.levelSetParameters.cacheKey(),
+            self._positionsKey(seedsPositions), self._positionsKey(endPositions))
+
+  def _levelSetInitializationKey(self, seedsPositions, endPositions):
+    """
+    Returns
+    -------
+    Tuple or None - Hashable key identifying the level set initialization of the input positions on the current
+    vesselness volume (or on its branch region if the branch ROI is used). None if the current vesselness volume is
+    unknown.
+    """
+    if self._vesselnessVolume is None or self._vesselnessKey is None:
+      return None
+
+    p = self.levelSetParameters
+    branchROIKey = p.branchROIMarginFactor if p.useBranchROI else None
+    return (self._vesselnessKey, branchROIKey, p.initializationMethod, self._positionsKey(seedsPositions),
+            self._positionsKey(endPositions))
+
+  @staticmethod
+  def _positionsKey(positions):
+    return tuple(tuple(float(x) for x in position) for position in positions)
+
+  def _storeLevelSetResult(self, cacheKey, result):
+    """Stores the label map, as one sparse block mask per label value, and a copy of the model poly data of the input
+    extractVesselVolumeFromPosition outputs in the level set cache.
+    """
+    _, _, outVolume, outModel = result
+    if cacheKey is None or outModel is None:
+      return
+
+    label_array = slicer.util.arrayFromVolume(outVolume)
+    labelMasks = []
+    boundingBox = maskBoundingBox(label_array)
+    if boundingBox is not None:
+      start, stop = boundingBox
+      block = label_array[tuple(slice(s, e) for s, e in zip(start, stop))]
+      for value in np.unique(block[block != 0]):
+        labelMasks.append((value, SparseBlockMask(label_array.shape, start, block == value)))
+
+    polyData = vtk.vtkPolyData()
+    polyData.DeepCopy(outModel.GetPolyData())
+    nBytes = sum(mask.nbytes for _, mask in labelMasks) + vtkDataObjectBytes(polyData)
+    self.levelSetCache.put(cacheKey, (label_array.dtype, labelMasks, polyData), nBytes)
+
+  def _levelSetResultFromCache(self, cacheKey, seedsPositions, endPositions):
+    """Creates the extractVesselVolumeFromPosition outputs of the input positions from the level set cache.
+
+    Returns
+    -------
+    Tuple or None - extractVesselVolumeFromPosition outputs. None if the result is not cached.
+    """
+    cachedResult = self.levelSetCache.get(cacheKey) if cacheKey is not None else None
+    if cachedResult is None:
+      return None
+
+    dtype, labelMasks, polyData = cachedResult
+    seedsNodes = createFiducialNode("LevelSetSegmentationSeeds", *(list(seedsPositions) + list(endPositions)))
+    stoppersNodes = createFiducialNode("LevelSetSegmentationStoppers", *endPositions)
+    outVolume = createLabelMapVolumeNodeBasedOnModel(self._inputVolume, "LevelSetSegmentation")
+    shape = tuple(reversed(self._inputVolume.GetImageData().GetDimensions()))
+    out_array = allocateVolumeArray(outVolume, shape, dtype)
+    out_array.fill(0)
+    for value, mask in labelMasks:
+      mask.pasteInto(out_array, value)
+    slicer.util.arrayFromVolumeModified(outVolume)
+
+    # The cached poly data is copied so that modifying the output model doesn't modify the cache
+    modelPolyData = vtk.vtkPolyData()
+    modelPolyData.DeepCopy(polyData)
+    outModel = createModelNode("LevelSetSegmentationModel")
+    outModel.SetAndObservePolyData(modelPolyData)
+    outModel.CreateDefaultDisplayNodes()
+    return seedsNodes, stoppersNodes, outVolume, outModel
+
+  def _createLevelSetRun(self, seedsPositions, endPositions):
+    """Creates the level set run of the input positions on the current vesselness volume (or on its branch region if
+    the branch ROI is used).
+    """
     if self._vesselnessVolume is None:
       raise ValueError("Please extract vesselness volume before extracting vessels")
-    return self._applyLevelSetSegmentationFromNodePositions(sourceVolume=self._inputVolume,
-                                                            croppedSourceVolume=self._croppedInputVolume,
-                                                            vesselnessVolume=self.getCurrentVesselnessVolume(),
-                                                            seedsPositions=seedsPositions, endPositions=endPositions,
-                                                            levelSetParameters=self.levelSetParameters)
+
+    vesselnessVolume = self.getCurrentVesselnessVolume()
+    if self.levelSetParameters.useBranchROI:
+      vesselnessVolume = self._branchVesselnessCrop(list(seedsPositions) + list(endPositions)).createVolumeNode(
+        "BranchVesselness", copyVoxels=True)
+
+    try:
+      levelSetRun = LevelSetRun(self._inputVolume, vesselnessVolume, vesselnessVolume, seedsPositions, endPositions,
+                                self.levelSetParameters)
+    except Exception:
+      if vesselnessVolume is not self._vesselnessVolume:
+        removeNodeFromMRMLScene(vesselnessVolume)
+      raise
+
+    if vesselnessVolume is not self._vesselnessVolume:
+      levelSetRun.temporaryNodes.append(vesselnessVolume)
+
+    levelSetRun.initializationKey = self._levelSetInitializationKey(seedsPositions, endPositions)
+    if levelSetRun.initializationKey is not None:
+      initImageData = self.levelSetInitializationCache.get(levelSetRun.initializationKey)
+      if initImageData is not None:
+        levelSetRun.setCachedInitialization(initImageData)
+    return levelSetRun
+
+  def _branchVesselnessCrop(self, nodePositions):
+    """Returns the region of the vesselness volume containing the bounding box of the input node positions grown by the
+    branch ROI margin. The margin is the level set branch ROI margin factor times the vesselness filter maximum
+    diameter, so that the vessel wall around the nodes stays in the region. As for the VMTK vesselness filter, the
+    maximum diameter is expressed in voxels of the smallest vesselness volume spacing.
+
+    Returns
+    -------
+    VolumeCrop - Region of the current vesselness volume
+    """
+    center, radius = self.calculateRoiExtent(nodePositions, minExtent=0, growthFactor=1)
+    maximumDiameter = self._vesselnessFilterParam.maximumDiameter * min(self._vesselnessVolume.GetSpacing())
+    margin = self.levelSetParameters.branchROIMarginFactor * maximumDiameter
+    start, stop = getRoiIndexBoundsInVolume(self._vesselnessVolume, center, radius + margin)
+    return VolumeCrop(self._vesselnessVolume, start, stop)
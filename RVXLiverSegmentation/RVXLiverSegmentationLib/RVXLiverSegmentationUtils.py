@@ -1,4 +1,4 @@
-from itertools import count
+from itertools import count, product
 import logging
 import os
 
@@ -8,6 +8,8 @@ import qt
 import slicer
 import vtk
 
+from .VolumeResampling import downsampleArray
+
 
 class Icons(object):
   """ Object responsible for the different icons in the module. The module doesn't have any icons internally but pulls
@@ -509,13 +511,16 @@ def raiseValueErrorIfInvalidType(**kwargs):
       raise ValueError("%s Type error.\nExpected : %s but got %s." % (valueName, expType, type(value)))
 
 
-def createDisplayNodeIfNecessary(volumeNode, presetName=None):
+def createDisplayNodeIfNecessary(volumeNode, presetName=None, presetScalarScale=1.):
   """
   Create new rendering display node for input volume
 
   :type volumeNode: vtkMRMLVolumeNode
   :param presetName: Name of the preset to load for volume display node
   :type presetName: str
+  :param presetScalarScale: Factor applied to the scalar values of the preset transfer functions. Used when the volume
+    values are the preset values multiplied by a factor (for instance for quantized vesselness volumes).
+  :type presetScalarScale: float
   """
   volRenLogic = slicer.modules.volumerendering.logic()
   volumeDisplayNode = volRenLogic.GetFirstVolumeRenderingDisplayNode(volumeNode)
@@ -530,9 +535,41 @@ def createDisplayNodeIfNecessary(volumeNode, presetName=None):
   # https://www.slicer.org/wiki/Documentation/Nightly/ScriptRepository#Show_volume_rendering_automatically_when_a_volume_is_loaded
   if presetName is not None:
     volumeDisplayNode.GetVolumePropertyNode().Copy(volRenLogic.GetPresetByName(presetName))
+    if presetScalarScale != 1.:
+      scaleVolumePropertyScalars(volumeDisplayNode.GetVolumePropertyNode().GetVolumeProperty(), presetScalarScale)
   return volumeDisplayNode
 
 
+def scaleVolumePropertyScalars(volumeProperty, scale):
+  """Multiplies the scalar values of the scalar opacity, gradient opacity and color transfer function points of the
+  input volume property by the input scale. The opacity and color values of the points are left unchanged.
+
+  :type volumeProperty: vtkVolumeProperty
+  :type scale: float
+  """
+  for opacityFunction in [volumeProperty.GetScalarOpacity(), volumeProperty.GetGradientOpacity()]:
+    points = []
+    for i in range(opacityFunction.GetSize()):
+      point = [0.] * 4  # x, opacity, midpoint, sharpness
+      opacityFunction.GetNodeValue(i, point)
+      points.append(point)
+
+    opacityFunction.RemoveAllPoints()
+    for x, opacity, midpoint, sharpness in points:
+      opacityFunction.AddPoint(x * scale, opacity, midpoint, sharpness)
+
+  colorFunction = volumeProperty.GetRGBTransferFunction()
+  points = []
+  for i in range(colorFunction.GetSize()):
+    point = [0.] * 6  # x, r, g, b, midpoint, sharpness
+    colorFunction.GetNodeValue(i, point)
+    points.append(point)
+
+  colorFunction.RemoveAllPoints()
+  for x, r, g, b, midpoint, sharpness in points:
+    colorFunction.AddRGBPoint(x * scale, r, g, b, midpoint, sharpness)
+
+
 class Signal(object):
   """ Qt like signal slot connections. Enables using the same semantics with Slicer as qt.Signal lead to application
   crash.
@@ -588,6 +625,45 @@ def removeNodesFromMRMLScene(nodesToRemove):
     removeNodeFromMRMLScene(node)
 
 
+def allocateVolumeArray(volumeNode, shape, dtype=np.float32):
+  """Allocates a new image data of the input array shape and type for the input volume.
+
+  Filling the returned array and calling slicer.util.arrayFromVolumeModified avoids the extra copy done by
+  slicer.util.updateVolumeFromArray.
+
+  Returns
+  -------
+  np.array - Array view on the allocated volume image data buffer (KJI order)
+  """
+  from vtk.util.numpy_support import get_vtk_array_type
+
+  imageData = vtk.vtkImageData()
+  imageData.SetDimensions(*reversed(shape))
+  imageData.AllocateScalars(get_vtk_array_type(np.dtype(dtype)), 1)
+  volumeNode.SetAndObserveImageData(imageData)
+  return slicer.util.arrayFromVolume(volumeNode)
+
+
+def ensureVolumeImageDataIsReady(volumeNode):
+  """Makes sure the image data of the input volume is computed and can be read without waiting.
+
+  If the image data is produced by a VTK pipeline, the pipeline is updated synchronously. Observers of the volume are
+  notified through the image data modified events emitted by the update.
+
+  Raises
+  ------
+  ValueError if the volume doesn't have any image data
+  """
+  imageDataConnection = volumeNode.GetImageDataConnection()
+  if imageDataConnection is not None and imageDataConnection.GetProducer() is not None:
+    imageDataConnection.GetProducer().Update()
+
+  imageData = volumeNode.GetImageData()
+  if imageData is None or imageData.GetPointData().GetScalars() is None:
+    raise ValueError("Volume %s doesn't contain any image data" % volumeNode.GetName())
+  return imageData
+
+
 def cropSourceVolume(sourceVolume, roi):
   cropVolumeNode = slicer.vtkMRMLCropVolumeParametersNode()
   cropVolumeNode.SetScene(slicer.mrmlScene)
@@ -603,6 +679,240 @@ def cropSourceVolume(sourceVolume, roi):
   return cropVolumeNode.GetOutputVolumeNode()
 
 
+def getVolumeIndexBoundsInSource(sourceVolume, croppedVolume):
+  """Returns the bounds of a cropped volume grid in the source volume array, in array (KJI) order.
+  The cropped volume is expected to be aligned with the source volume grid (as the volumes created by VolumeCrop).
+
+  Returns
+  -------
+  Tuple[Tuple[int], Tuple[int]] - start (included) and stop (excluded) indices of the cropped array in the source array
+  """
+  croppedIjkToRas = vtk.vtkMatrix4x4()
+  croppedVolume.GetIJKToRASMatrix(croppedIjkToRas)
+  sourceRasToIjk = vtk.vtkMatrix4x4()
+  sourceVolume.GetRASToIJKMatrix(sourceRasToIjk)
+
+  croppedOriginIjk = sourceRasToIjk.MultiplyPoint(croppedIjkToRas.MultiplyPoint([0, 0, 0, 1]))
+  start = tuple(int(round(croppedOriginIjk[i])) for i in reversed(range(3)))
+  shape = tuple(reversed(croppedVolume.GetImageData().GetDimensions()))
+  return start, tuple(s + size for s, size in zip(start, shape))
+
+
+def getAlignedVolumeIndexBoundsInSource(sourceVolume, volume, tolerance=1e-3):
+  """Returns the bounds of the input volume grid in the source volume array if the volume grid is a sub grid of the
+  source volume grid : same orientation and spacing, integer index offset and extent inside the source volume extent.
+
+  Parameters
+  ----------
+  sourceVolume: vtkMRMLScalarVolumeNode
+  volume: vtkMRMLScalarVolumeNode
+  tolerance: float
+    Tolerance on the IJK to RAS direction and spacing components and on the index offset in voxels
+
+  Returns
+  -------
+  Tuple[Tuple[int], Tuple[int]] or None - start (included) and stop (excluded) indices of the volume array in the
+  source array, in array (KJI) order. None if the volume grid is not a sub grid of the source grid.
+  """
+  sourceIjkToRas = vtk.vtkMatrix4x4()
+  sourceVolume.GetIJKToRASMatrix(sourceIjkToRas)
+  ijkToRas = vtk.vtkMatrix4x4()
+  volume.GetIJKToRASMatrix(ijkToRas)
+  if any(abs(sourceIjkToRas.GetElement(i, j) - ijkToRas.GetElement(i, j)) > tolerance
+         for i in range(3) for j in range(3)):
+    return None
+
+  sourceRasToIjk = vtk.vtkMatrix4x4()
+  sourceVolume.GetRASToIJKMatrix(sourceRasToIjk)
+  originIjk = sourceRasToIjk.MultiplyPoint(ijkToRas.MultiplyPoint([0, 0, 0, 1]))
+  if any(abs(originIjk[i] - round(originIjk[i])) > tolerance for i in range(3)):
+    return None
+
+  start, stop = getVolumeIndexBoundsInSource(sourceVolume, volume)
+  sourceShape = tuple(reversed(sourceVolume.GetImageData().GetDimensions()))
+  if any(s < 0 for s in start) or any(e > size for e, size in zip(stop, sourceShape)):
+    return None
+  return start, stop
+
+
+def getRoiIndexBoundsInVolume(volumeNode, center, radius):
+  """Returns the bounds of the volume voxels whose centers are inside the input RAS box, in array (KJI) order.
+  The bounds are clipped to the volume extent.
+
+  Parameters
+  ----------
+  volumeNode: vtkMRMLScalarVolumeNode
+  center: List[float]
+    RAS center of the box
+  radius: List[float]
+    RAS half size of the box along each axis
+
+  Returns
+  -------
+  Tuple[Tuple[int], Tuple[int]] - start (included) and stop (excluded) indices of the box voxels in the volume array
+
+  Raises
+  ------
+  ValueError if the box doesn't contain any voxel of the volume
+  """
+  rasToIjk = vtk.vtkMatrix4x4()
+  volumeNode.GetRASToIJKMatrix(rasToIjk)
+  corners = []
+  for signs in product((-1, 1), repeat=3):
+    corner = [c + sign * r for c, r, sign in zip(center, radius, signs)]
+    corners.append(rasToIjk.MultiplyPoint(corner + [1])[:3])
+  corners = np.array(corners)
+
+  # Small tolerance on the box boundaries to be robust to the rounding of the RAS extent
+  tolerance = 1e-3
+  shape = np.array(list(reversed(volumeNode.GetImageData().GetDimensions())))
+  start = np.clip(np.ceil(corners.min(axis=0) - tolerance).astype(int)[::-1], 0, shape)
+  stop = np.clip(np.floor(corners.max(axis=0) + tolerance).astype(int)[::-1] + 1, 0, shape)
+  if np.any(stop <= start):
+    raise ValueError("Region of interest doesn't intersect volume %s" % volumeNode.GetName())
+  return tuple(int(i) for i in start), tuple(int(i) for i in stop)
+
+
+class VolumeCrop(object):
+  """Box region of a volume node aligned with the volume grid.
+
+  The region voxels are accessed as a NumPy view on the source volume array, without copying the voxels nor adding
+  nodes to the scene. A volume node with the region geometry is only created on demand.
+  """
+
+  def __init__(self, sourceVolume, start=None, stop=None):
+    """
+    Parameters
+    ----------
+    sourceVolume: vtkMRMLScalarVolumeNode
+    start: Tuple[int] or None
+      First index of the region in the source array (KJI order). Defaults to the source array start.
+    stop: Tuple[int] or None
+      Stop index (excluded) of the region in the source array (KJI order). Defaults to the source array shape.
+    """
+    sourceShape = tuple(reversed(sourceVolume.GetImageData().GetDimensions()))
+    self.sourceVolume = sourceVolume
+    self.start = tuple(start) if start is not None else (0, 0, 0)
+    self.stop = tuple(stop) if stop is not None else sourceShape
+
+  @property
+  def slices(self):
+    return tuple(slice(start, stop) for start, stop in zip(self.start, self.stop))
+
+  @property
+  def shape(self):
+    return tuple(stop - start for start, stop in zip(self.start, self.stop))
+
+  @property
+  def spacing(self):
+    """Voxel spacing in array (KJI) order"""
+    return tuple(reversed(self.sourceVolume.GetSpacing()))
+
+  @property
+  def array(self):
+    """np.array - View on the region voxels in the source volume array (KJI order)"""
+    return slicer.util.arrayFromVolume(self.sourceVolume)[self.slices]
+
+  def GetIJKToRASMatrix(self, ijkToRas):
+    """Fills the input vtkMatrix4x4 with the IJK to RAS matrix of the region grid"""
+    self.sourceVolume.GetIJKToRASMatrix(ijkToRas)
+    origin = ijkToRas.MultiplyPoint(list(reversed(self.start)) + [1])
+    for i in range(3):
+      ijkToRas.SetElement(i, 3, origin[i])
+
+  def createVolumeNode(self, volumeName, volumeClass="vtkMRMLScalarVolumeNode", copyVoxels=False):
+    """Creates a volume node with the region geometry.
+
+    Parameters
+    ----------
+    volumeName: str
+      Base name of the volume node
+    volumeClass: str
+      Class of the volume node to create
+    copyVoxels: bool
+      If True, the region voxels are copied into the volume node. Otherwise the volume node doesn't have image data.
+
+    Returns
+    -------
+    volumeClass - New volume added to the scene
+    """
+    ijkToRas = vtk.vtkMatrix4x4()
+    self.GetIJKToRASMatrix(ijkToRas)
+    volumeNode = createVolumeNodeBasedOnModel(self.sourceVolume, volumeName, volumeClass)
+    volumeNode.SetIJKToRASMatrix(ijkToRas)
+    if copyVoxels:
+      array = self.array
+      np.copyto(allocateVolumeArray(volumeNode, array.shape, array.dtype), array)
+      slicer.util.arrayFromVolumeModified(volumeNode)
+    return volumeNode
+
+
+def createDownsampledVolume(sourceVolume, factor, volumeName):
+  """Creates a scalar volume containing the source volume downsampled by averaging blocks of factor ** 3 voxels.
+  The downsampled volume covers the same physical region as the source volume with a spacing multiplied by factor.
+
+  Parameters
+  ----------
+  sourceVolume: vtkMRMLScalarVolumeNode or VolumeCrop
+  factor: int
+  volumeName: str
+
+  Returns
+  -------
+  vtkMRMLScalarVolumeNode - New volume added to the scene
+  """
+  crop = sourceVolume if isinstance(sourceVolume, VolumeCrop) else VolumeCrop(sourceVolume)
+  ijkToRas = vtk.vtkMatrix4x4()
+  crop.GetIJKToRASMatrix(ijkToRas)
+  blockCenterOffset = (factor - 1) / 2.
+  origin = ijkToRas.MultiplyPoint([blockCenterOffset, blockCenterOffset, blockCenterOffset, 1])
+  for i in range(3):
+    for j in range(3):
+      ijkToRas.SetElement(i, j, ijkToRas.GetElement(i, j) * factor)
+    ijkToRas.SetElement(i, 3, origin[i])
+
+  downsampledVolume = createVolumeNodeBasedOnModel(crop.sourceVolume, volumeName, "vtkMRMLScalarVolumeNode")
+  downsampledVolume.SetIJKToRASMatrix(ijkToRas)
+  slicer.util.updateVolumeFromArray(downsampledVolume, downsampleArray(crop.array, factor))
+  return downsampledVolume
+
+
+def updateItkFilter(itkFilter, progressCallback=None, stepCount=100):
+  """Updates the ITK filter and reports its progress to progressCallback as a number of done steps out of stepCount.
+
+  Exceptions raised by the callback abort the filter and are raised again once the filter update stopped.
+  """
+  if progressCallback is None:
+    itkFilter.Update()
+    return
+
+  import itk
+  callbackErrors = []
+
+  def onProgress():
+    if callbackErrors:
+      return
+    try:
+      progressCallback(int(stepCount * itkFilter.GetProgress()), stepCount)
+    except BaseException as e:
+      callbackErrors.append(e)
+      itkFilter.AbortGenerateDataOn()
+
+  observerTag = itkFilter.AddObserver(itk.ProgressEvent(), onProgress)
+  try:
+    itkFilter.Update()
+  except RuntimeError:
+    # Aborted filters raise a process aborted error which is replaced by the callback exception
+    if not callbackErrors:
+      raise
+  finally:
+    itkFilter.RemoveObserver(observerTag)
+
+  if callbackErrors:
+    raise callbackErrors[0]
+  progressCallback(stepCount, stepCount)
+
+
 def cloneSourceVolume(sourceVolume):
   cloneName = slicer.mrmlScene.GetUniqueNameByString(sourceVolume.GetName() + "Cloned")
   return slicer.vtkSlicerVolumesLogic().CloneVolume(slicer.mrmlScene, sourceVolume, cloneName, True)
@@ -0,0 +1,120 @@
+from collections import OrderedDict
+import threading
+
+
+class LRUCache(object):
+  """Least recently used cache bounded by a memory budget expressed in bytes.
+
+  Each stored value is associated with its size in bytes. When adding a value would exceed the memory budget, the least
+  recently used values are evicted until the new value fits. Values bigger than the whole budget are not stored.
+
+  Hits and misses are counted on each get call to help monitoring the cache efficiency.
+  Cache accesses are protected by a lock and can be done from worker threads.
+  """
+
+  def __init__(self, maxBytes):
+    """
+    Parameters
+    ----------
+    maxBytes: int
+      Memory budget of the cache in bytes
+    """
+    self._entries = OrderedDict()
+    self._maxBytes = maxBytes
+    self._currentBytes = 0
+    self._lock = threading.RLock()
+    self.hits = 0
+    self.misses = 0
+
+  @property
+  def maxBytes(self):
+    return self._maxBytes
+
+  @maxBytes.setter
+  def maxBytes(self, value):
+    with self._lock:
+      self._maxBytes = value
+      self._evictUntilFits(0)
+
+  @property
+  def currentBytes(self):
+    return self._currentBytes
+
+  def get(self, key, default=None):
+    """Returns value associated with key and marks it as most recently used. Returns default if key is not cached.
+    """
+    with self._lock:
+      if key not in self._entries:
+        self.misses += 1
+        return default
+
+      self.hits += 1
+      self._entries.move_to_end(key)
+      return self._entries[key][0]
+
+  def put(self, key, value, nBytes=None):
+    """Stores value in the cache and evicts the least recently used values if the memory budget is exceeded.
+
+    Parameters
+    ----------
+    key: hashable
+    value: object
+    nBytes: int or None
+      Size of the value in bytes. If None, value nbytes attribute will be used (0 if value has no nbytes attribute).
+
+    Returns
+    -------
+    bool
+      True if the value was stored, False if it is too big for the cache memory budget.
+    """
+    if nBytes is None:
+      nBytes = getattr(value, "nbytes", 0)
+
+    with self._lock:
+      self.pop(key)
+      if nBytes > self._maxBytes:
+        return False
+
+      self._evictUntilFits(nBytes)
+      self._entries[key] = (value, nBytes)
+      self._currentBytes += nBytes
+      return True
+
+  def pop(self, key, default=None):
+    """Removes key from the cache without modifying the hit / miss counters and returns its value.
+    """
+    with self._lock:
+      if key not in self._entries:
+        return default
+
+      value, nBytes = self._entries.pop(key)
+      self._currentBytes -= nBytes
+      return value
+
+  def clear(self):
+    with self._lock:
+      self._entries.clear()
+      self._currentBytes = 0
+
+  def resetStatistics(self):
+    self.hits = 0
+    self.misses = 0
+
+  def keys(self):
+    with self._lock:
+      return list(self._entries.keys())
+
+  def _evictUntilFits(self, nBytes):
+    while self._entries and self._currentBytes + nBytes > self._maxBytes:
+      _, (_, evictedBytes) = self._entries.popitem(last=False)
+      self._currentBytes -= evictedBytes
+
+  def __contains__(self, key):
+    return key in self._entries
+
+  def __len__(self):
+    return len(self._entries)
+
+  def __repr__(self):
+    return "LRUCache(entries=%d, bytes=%d/%d, hits=%d, misses=%d)" % (
+      len(self), self._currentBytes, self._maxBytes, self.hits, self.misses)
@@ -1,5 +1,6 @@
 import qt
 import slicer
+import vtk
 
 from .RVXLiverSegmentationLogic import RVXLiverSegmentationLogic
 from .RVXLiverSegmentationUtils import WidgetUtils, GeometryExporter, removeNodeFromMRMLScene
@@ -132,6 +133,32 @@ class SegmentWidget(VerticalLayoutWidget):
     geometryExporter[segmentName + "Model"] = model
     return [geometryExporter]
 
+  def exportSegmentToLabelMap(self, segmentName):
+    """Exports the input segment to a new label map volume in the input node geometry.
+
+    Parameters
+    ----------
+    segmentName: str
+      Name of the segment to export
+
+    Returns
+    -------
+    vtkMRMLLabelMapVolumeNode or None
+      Label map added to the scene containing the segment. None if the input node is not set or if the segment doesn't
+      exist.
+    """
+    segmentId = self._segmentNode.GetSegmentation().GetSegmentIdBySegmentName(segmentName)
+    if self._inputNode is None or not segmentId:
+      return None
+
+    segmentIds = vtk.vtkStringArray()
+    segmentIds.InsertNextValue(segmentId)
+    labelMapName = slicer.mrmlScene.GetUniqueNameByString(segmentName.replace(" ", "") + "Label")
+    labelMap = slicer.mrmlScene.AddNewNodeByClass("vtkMRMLLabelMapVolumeNode", labelMapName)
+    slicer.vtkSlicerSegmentationsModuleLogic().ExportSegmentsToLabelmapNode(self._segmentNode, segmentIds, labelMap,
+                                                                           self._inputNode)
+    return labelMap
+
   def _createScalarVolumeNode(self, labelMap):
     removeNodeFromMRMLScene(self._scalarVolume)
     volumeName = self._segmentNode.GetName() + "Volume"
@@ -0,0 +1,249 @@
+import math
+
+import numpy as np
+
+
+def haloFromSigma(sigma, truncate=4.0):
+  """
+  Returns
+  -------
+  int - Number of voxels needed around a tile for a gaussian based filter of given sigma to be seamless
+  """
+  return int(math.ceil(truncate * sigma))
+
+
+class Tile(object):
+  """Block of a volume processed independently by the TiledVolumeFilter.
+
+  The core of the tile is the part of the output written by the tile. The halo region is the core grown by the halo
+  size and clipped to the volume boundaries. It is the part of the input read to compute the core.
+  """
+
+  def __init__(self, coreStart, coreStop, volumeShape, halo):
+    self.coreStart = tuple(coreStart)
+    self.coreStop = tuple(coreStop)
+    self.haloStart = tuple(max(0, start - halo) for start in coreStart)
+    self.haloStop = tuple(min(size, stop + halo) for stop, size in zip(coreStop, volumeShape))
+
+  @property
+  def coreSlices(self):
+    return tuple(slice(start, stop) for start, stop in zip(self.coreStart, self.coreStop))
+
+  @property
+  def haloSlices(self):
+    return tuple(slice(start, stop) for start, stop in zip(self.haloStart, self.haloStop))
+
+  @property
+  def coreInHaloSlices(self):
+    """Slices of the core region relative to the halo region"""
+    return tuple(slice(start - haloStart, stop - haloStart)
+                 for start, stop, haloStart in zip(self.coreStart, self.coreStop, self.haloStart))
+
+  @property
+  def haloShape(self):
+    return tuple(stop - start for start, stop in zip(self.haloStart, self.haloStop))
+
+  def __repr__(self):
+    return "Tile(core={}->{}, halo={}->{})".format(self.coreStart, self.coreStop, self.haloStart, self.haloStop)
+
+
+class TiledVolumeFilter(object):
+  """Applies a filter function on a volume array by processing it in overlapping tiles.
+
+  Each tile is read with a halo around its core so that filters with a limited support (for instance gaussian based
+  filters with a halo sized from their sigma) stitch without seams. The tile size is derived from the peak memory cap,
+  the estimated working memory of the filter per voxel and the number of tiles processed concurrently.
+
+  The input array is only read tile by tile and can be a memory mapped array (or a path to a .npy file which will be
+  memory mapped). The output can also be memory mapped to a .npy file to process volumes bigger than the memory.
+  """
+
+  def __init__(self, filterFunction, halo, maxPeakMemoryBytes=512 * 1024 ** 2, bytesPerVoxel=48, workerCount=1):
+    """
+    Parameters
+    ----------
+    filterFunction: Callable[[np.array], np.array]
+      Function called on each float32 tile array (including its halo). Must return an array of the same shape.
+    halo: int
+      Number of voxels read around each tile core
+    maxPeakMemoryBytes: int
+      Peak working memory for all the tiles processed concurrently
+    bytesPerVoxel: int
+      Estimated working memory of the filter function per voxel of its input
+    workerCount: int
+      Maximum number of tiles processed concurrently
+    """
+    self._filterFunction = filterFunction
+    self._halo = halo
+    self._maxPeakMemoryBytes = maxPeakMemoryBytes
+    self._bytesPerVoxel = bytesPerVoxel
+    self._workerCount = max(1, workerCount)
+
+  def effectiveWorkerCount(self, shape):
+    """
+    Returns
+    -------
+    int - Number of tiles processed concurrently. Reduced if the memory cap doesn't allow tiles of at least one voxel
+    core for the configured worker count.
+    """
+    for workerCount in range(self._workerCount, 0, -1):
+      if self._tileCoreSide(workerCount) > 0:
+        tileCount = len(self._tileStarts(shape, self._tileCoreShape(shape, workerCount)))
+        return min(workerCount, tileCount)
+    return 1
+
+  def tileCoreShape(self, shape):
+    """
+    Returns
+    -------
+    Tuple[int] - Core shape of the tiles for the input volume shape
+
+    Raises
+    ------
+    ValueError if the memory cap is too small to process tiles with a one voxel core
+    """
+    return self._tileCoreShape(shape, self.effectiveWorkerCount(shape))
+
+  def _tileCoreShape(self, shape, workerCount):
+    coreSide = self._tileCoreSide(workerCount)
+    if coreSide < 1:
+      raise ValueError("Peak memory cap of %d bytes is too small for a halo of %d voxels with %d bytes per voxel." % (
+        self._maxPeakMemoryBytes, self._halo, self._bytesPerVoxel))
+
+    coreShape = [min(coreSide, size) for size in shape]
+
+    # Grow the core along the axes which are not clipped when other axes are smaller than the cubic tile
+    tileVoxels = self._maxTileVoxels(workerCount)
+    for axis in range(len(shape)):
+      otherHaloVoxels = np.prod([min(size, side + 2 * self._halo) for i_axis, (size, side) in
+                                 enumerate(zip(shape, coreShape)) if i_axis != axis])
+      maxSide = int(tileVoxels // otherHaloVoxels) - 2 * self._halo
+      coreShape[axis] = max(coreShape[axis], min(shape[axis], maxSide))
+
+    return tuple(coreShape)
+
+  def tiles(self, shape):
+    """
+    Returns
+    -------
+    List[Tile] - Tiles whose cores partition the input volume shape
+    """
+    coreShape = self.tileCoreShape(shape)
+    tiles = []
+    for coreStart in self._tileStarts(shape, coreShape):
+      coreStop = tuple(min(start + side, size) for start, side, size in zip(coreStart, coreShape, shape))
+      tiles.append(Tile(coreStart, coreStop, shape, self._halo))
+    return tiles
+
+  @staticmethod
+  def _tileStarts(shape, coreShape):
+    from itertools import product
+    return list(product(*[range(0, size, side) for size, side in zip(shape, coreShape)]))
+
+  def run(self, inputArray, outputArray=None, outputPath=None, dtype=np.float32, progressCallback=None,
+          maskArray=None):
+    """Applies the filter function on the input array tile by tile.
+
+    Parameters
+    ----------
+    inputArray: np.array or str
+      3D input array or path to a .npy file which will be memory mapped
+    outputArray: np.array or None
+      Preallocated output array with the same shape as input. If None, output is allocated or memory mapped.
+    outputPath: str or None
+      If provided and outputArray is None, output is memory mapped to this .npy file path
+    dtype: np.dtype
+      Output type when the output array is allocated
+    progressCallback: Callable[[int, int], None] or None
+      Called with the number of processed tiles and the total number of tiles after each tile
+    maskArray: np.array or None
+      Boolean array with the same shape as input. If provided, the filter function is called with the tile array and
+      the tile mask, and the output of tiles without any mask voxel in their core is set to 0 without calling the filter.
+
+    Returns
+    -------
+    np.array - Filtered array
+    """
+    from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+    if isinstance(inputArray, str):
+      inputArray = np.load(inputArray, mmap_mode="r")
+
+    if outputArray is None:
+      if outputPath is not None:
+        outputArray = np.lib.format.open_memmap(outputPath, mode="w+", dtype=dtype, shape=inputArray.shape)
+      else:
+        outputArray = np.empty(inputArray.shape, dtype=dtype)
+
+    tiles = self.tiles(inputArray.shape)
+
+    def processTile(tile):
+      if maskArray is not None and not np.any(maskArray[tile.coreSlices]):
+        outputArray[tile.coreSlices] = 0
+        return
+
+      tileArray = np.ascontiguousarray(inputArray[tile.haloSlices], dtype=np.float32)
+      filterArgs = (tileArray,) if maskArray is None else (tileArray, maskArray[tile.haloSlices])
+      outputArray[tile.coreSlices] = self._filterFunction(*filterArgs)[tile.coreInHaloSlices]
+
+    # Keep at most workerCount tiles in flight to respect the peak memory cap
+    workerCount = self.effectiveWorkerCount(inputArray.shape)
+    doneCount = 0
+
+    def collect(doneFutures):
+      nonlocal doneCount
+      for future in doneFutures:
+        future.result()
+        doneCount += 1
+        if progressCallback is not None:
+          progressCallback(doneCount, len(tiles))
+
+    with ThreadPoolExecutor(max_workers=workerCount) as executor:
+      pending = set()
+      for tile in tiles:
+        if len(pending) >= workerCount:
+          done, pending = wait(pending, return_when=FIRST_COMPLETED)
+          collect(done)
+        pending.add(executor.submit(processTile, tile))
+      collect(wait(pending)[0])
+
+    return outputArray
+
+  def _maxTileVoxels(self, workerCount):
+    return self._maxPeakMemoryBytes // (workerCount * self._bytesPerVoxel)
+
+  def _tileCoreSide(self, workerCount):
+    return int(math.floor(self._maxTileVoxels(workerCount) ** (1. / 3.))) - 2 * self._halo
+
+
+def tilesOutsideRegion(shape, regionStart, regionStop, halo):
+  """Splits the part of a volume outside of a box region into at most 6 disjoint slab tiles.
+
+  Parameters
+  ----------
+  shape: Tuple[int]
+    Volume shape
+  regionStart: Tuple[int]
+    Start index of the excluded region (included)
+  regionStop: Tuple[int]
+    Stop index of the excluded region (excluded)
+  halo: int
+    Halo of the created tiles
+
+  Returns
+  -------
+  List[Tile] - Tiles whose cores partition the volume minus the region
+  """
+  tiles = []
+  start, stop = [0] * len(shape), list(shape)
+  for axis in range(len(shape)):
+    for sliceStart, sliceStop in [(0, regionStart[axis]), (regionStop[axis], shape[axis])]:
+      if sliceStop <= sliceStart:
+        continue
+      coreStart, coreStop = list(start), list(stop)
+      coreStart[axis], coreStop[axis] = sliceStart, sliceStop
+      tiles.append(Tile(coreStart, coreStop, shape, halo))
+
+    # Following axes only cover the region extent along the already split axes
+    start[axis], stop[axis] = regionStart[axis], regionStop[axis]
+  return tiles
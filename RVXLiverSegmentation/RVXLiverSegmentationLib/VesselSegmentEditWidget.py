@@ -1,8 +1,10 @@
+import numpy as np
 import qt
 import slicer
 import vtk
 
-from RVXLiverSegmentationLib import SegmentWidget, createButton, GeometryExporter, NodeBranches, removeNodeFromMRMLScene
+from RVXLiverSegmentationLib import SegmentWidget, createButton, GeometryExporter, NodeBranches, \
+  removeNodeFromMRMLScene, createLabelMapVolumeNodeBasedOnModel, LabelMapMerger
 
 
 class VesselSegmentEditWidget(SegmentWidget):
@@ -42,7 +44,11 @@ class VesselSegmentEditWidget(SegmentWidget):
 
     self._removePreviousCenterLineVolume()
     self._extractCenterLine()
-    self._addSegmentationNodes(self._vesselBranches.names())
+
+    # Branch segments imported from a labeled vessel tree are kept
+    segmentation = self._segmentationObj()
+    self._addSegmentationNodes(
+      [name for name in self._vesselBranches.names() if not segmentation.GetSegmentIdBySegmentName(name)])
     self._proceedButton.setEnabled(False)
     self._segmentNode.GetDisplayNode().SetOpacity3D(self._segmentOpacity)
     self._prepareSplittingTools()
@@ -97,7 +103,7 @@ class VesselSegmentEditWidget(SegmentWidget):
     removeNodeFromMRMLScene(modelName)
 
     polyData = vtk.vtkPolyData()
-    segmentId = self._segmentationObj().GetNthSegmentID(0)
+    segmentId = self._segmentationObj().GetSegmentIdBySegmentName(segmentName)
     self._segmentationLogic.GetSegmentClosedSurfaceRepresentation(self._segmentNode, segmentId, polyData)
 
     model = slicer.mrmlScene.AddNewNodeByClass("vtkMRMLModelNode")
@@ -120,6 +126,12 @@ class VesselSegmentEditWidget(SegmentWidget):
     self.setVisibleInScene(self.visible)
 
   def _importLabelMap(self, vesselLabelMap):
+    """Imports the vessel tree label map in the segmentation. The tree segment used by the center line extraction and
+    the splitting tools is named after the segmentation node.
+
+    Labeled vessel trees (see LabelMapMerger) are imported as one segment per branch label, named after the label
+    color table, and the tree segment is the union of the branches.
+    """
     self._segmentationLogic.ImportLabelmapToSegmentationNode(vesselLabelMap, self._segmentNode)
     self._segmentNode.GetDisplayNode().SetOpacity3D(1)
 
@@ -127,8 +139,23 @@ class VesselSegmentEditWidget(SegmentWidget):
     if self._segmentationObj().GetNumberOfSegments() < 1:
       raise ValueError("Failed to extract vessel tree from vesselness volume.")
 
-    # Rename imported segment
-    self._segmentationObj().GetNthSegment(0).SetName(self._segmentNodeName)
+    if LabelMapMerger.isLabeledVolume(vesselLabelMap):
+      self._importTreeSegment(vesselLabelMap)
+    else:
+      # Rename imported segment
+      self._segmentationObj().GetNthSegment(0).SetName(self._segmentNodeName)
+
+  def _importTreeSegment(self, labeledVesselLabelMap):
+    """Imports the union of the labeled vessel tree branches as the tree segment"""
+    treeLabelMap = createLabelMapVolumeNodeBasedOnModel(labeledVesselLabelMap, self._segmentNodeName)
+    try:
+      slicer.util.updateVolumeFromArray(treeLabelMap,
+                                        (slicer.util.arrayFromVolume(labeledVesselLabelMap) > 0).astype(np.uint8))
+      segmentCount = self._segmentationObj().GetNumberOfSegments()
+      self._segmentationLogic.ImportLabelmapToSegmentationNode(treeLabelMap, self._segmentNode)
+      self._segmentationObj().GetNthSegment(segmentCount).SetName(self._segmentNodeName)
+    finally:
+      removeNodeFromMRMLScene(treeLabelMap)
 
   def getGeometryExporters(self):
     exporters = super(VesselSegmentEditWidget, self).getGeometryExporters()
@@ -1,4 +1,5 @@
 from collections import OrderedDict
+import logging
 import os
 
 import ctk
@@ -6,8 +7,9 @@ import qt
 import slicer
 
 from RVXLiverSegmentationLib import setup_portal_vein_default_branch, setup_inferior_cava_vein_default_branch
+from .BackgroundTask import BackgroundTask
 from .ExtractVesselStrategies import ExtractOneVesselPerBranch, ExtractOneVesselPerParentAndSubChildNode, \
-  ExtractOneVesselPerParentChildNode, ExtractAllVesselsInOneGoStrategy
+  ExtractOneVesselPerParentChildNode, ExtractAllVesselsInOneGoStrategy, ExtractVesselFromVesselSeedPointsStrategy
 from .RVXLiverSegmentationLogic import VesselnessFilterParameters, LevelSetParameters
 from .RVXLiverSegmentationUtils import GeometryExporter, removeNodesFromMRMLScene, createDisplayNodeIfNecessary, Signal, \
   getMarkupIdPositionDictionary
@@ -128,6 +130,7 @@ class VesselWidget(VerticalLayoutWidget):
     self._vesselModelNode = None
     self._inputVolume = None
     self._vesselnessDisplay = None
+    self._liverMaskProvider = None
     self._logic = logic
     self._segmentationOpacity = 0.7  # Initial segmentation opacity set to 70% to still view the vessel tree
     self._vesselBranchWidget = VesselBranchWidget(setupBranchF)
@@ -147,6 +150,33 @@ class VesselWidget(VerticalLayoutWidget):
     self._levelSetInitializations["Colliding Fronts"] = "collidingfronts"
     self._levelSetInitializations["Fast Marching"] = "fastmarching"
 
+    # Sato vesselness backends
+    self._satoBackends = OrderedDict()
+    self._satoBackends["ITK"] = "itk"
+    self._satoBackends["NumPy / SciPy"] = "numpy"
+
+    # Sato vesselness volume storage types
+    self._vesselnessStorageTypes = OrderedDict()
+    self._vesselnessStorageTypes["Float (32 bits)"] = "float32"
+    self._vesselnessStorageTypes["Quantized (16 bits)"] = "uint16"
+    self._vesselnessStorageTypes["Quantized (8 bits)"] = "uint8"
+
+    # Vesselness preview downsampling factors
+    self._previewDownsamplingFactors = OrderedDict()
+    self._previewDownsamplingFactors["2x"] = 2
+    self._previewDownsamplingFactors["4x"] = 4
+
+    # Debounce preview updates while the vesselness parameters are being edited
+    self._previewTimer = qt.QTimer()
+    self._previewTimer.setSingleShot(True)
+    self._previewTimer.setInterval(150)
+    self._previewTimer.connect("timeout()", self._updatePreviewVesselnessVolume)
+
+    # Vesselness computation running in the background during the vessel extraction and its progress dialog cancel
+    # handler
+    self._vesselnessTask = None
+    self._vesselnessCancelHandler = None
+
     # LevelSet method
     self._levelSetSegmentations = OrderedDict()
     self._levelSetSegmentations["Geodesic"] = "geodesic"
@@ -162,6 +192,10 @@ class VesselWidget(VerticalLayoutWidget):
     self._updateButtonStatusAndFilterParameters()
 
   def clear(self):
+    if self._vesselnessTask is not None:
+      self._vesselnessTask.cancel()
+    self._previewTimer.stop()
+    self._logic.removePreviewVesselnessVolume()
     self._removePreviouslyExtractedVessels()
     self._vesselBranchWidget.clear()
 
@@ -247,6 +281,20 @@ class VesselWidget(VerticalLayoutWidget):
     filterOptionCollapsibleButton.collapsed = True
     self._vesselnessFormLayout = qt.QFormLayout(filterOptionCollapsibleButton)
 
+    # Live preview
+    self._previewCheckBox = qt.QCheckBox()
+    self._previewCheckBox.toolTip = "If true, vesselness is computed on a downsampled volume and displayed while the " \
+                                    "filter parameters are modified.\nThe full resolution vesselness is computed when " \
+                                    "extracting vessels."
+    self._previewCheckBox.connect("stateChanged(int)", self._previewStateChanged)
+    self._vesselnessFormLayout.addRow("Live preview:", self._previewCheckBox)
+
+    self._previewDownsamplingChoice = qt.QComboBox()
+    self._previewDownsamplingChoice.addItems(list(self._previewDownsamplingFactors.keys()))
+    self._previewDownsamplingChoice.toolTip = "Downsampling factor of the volume used for the preview"
+    self._previewDownsamplingChoice.connect("currentIndexChanged(int)", lambda *_: self._schedulePreviewUpdate())
+    self._vesselnessFormLayout.addRow("Preview downsampling:", self._previewDownsamplingChoice)
+
     # Vesselness filter selection
     self._useVmtkCheckBox = qt.QCheckBox()
     self._useVmtkCheckBox.connect("stateChanged(int)", lambda *_: self._updateVesselnessFilterParameterVisibility())
@@ -273,6 +321,22 @@ class VesselWidget(VerticalLayoutWidget):
     self._minRoiSlider.toolTip = "Minimum thickness of the bounding box in pixels."
     self._vesselnessFormLayout.addRow("Min Bounding Box extent:", self._minRoiSlider)
 
+    # Liver mask parameters
+    self._useLiverMaskCheckBox = qt.QCheckBox()
+    self._useLiverMaskCheckBox.toolTip = "If true, vesselness is only computed inside the liver segment of the Liver " \
+                                         "tab dilated by the liver mask margin."
+    self._useLiverMaskCheckBox.connect("stateChanged(int)", lambda *_: self._updateVesselnessFilterParameterVisibility())
+    self._useLiverMaskCheckBox.connect("stateChanged(int)", lambda *_: self._updateLiverMask())
+    self._vesselnessFormLayout.addRow("Restrict to liver:", self._useLiverMaskCheckBox)
+
+    self._liverMaskMarginSpinBox = qt.QDoubleSpinBox()
+    self._liverMaskMarginSpinBox.minimum = 0
+    self._liverMaskMarginSpinBox.maximum = 100
+    self._liverMaskMarginSpinBox.singleStep = 1
+    self._liverMaskMarginSpinBox.suffix = " mm"
+    self._liverMaskMarginSpinBox.toolTip = "Dilation of the liver segment used to keep the vessels at the liver border."
+    self._vesselnessFormLayout.addRow("Liver margin:", self._liverMaskMarginSpinBox)
+
     # VMTK parameters
     self._minimumDiameterSpinBox = qt.QSpinBox()
     self._minimumDiameterSpinBox.minimum = 1
@@ -317,11 +381,65 @@ class VesselWidget(VerticalLayoutWidget):
     self._vesselnessFormLayout.addRow("Suppress blobs:", self._suppressBlobsSlider)
 
     # SATO parameters
+    self._satoBackendChoice = qt.QComboBox()
+    self._satoBackendChoice.addItems(list(self._satoBackends.keys()))
+    self._satoBackendChoice.toolTip = "Choose the library used to compute the Sato vesselness"
+    self._vesselnessFormLayout.addRow("Sato backend:", self._satoBackendChoice)
+
     self._satoSigmaSpinBox = qt.QDoubleSpinBox()
     self._satoSigmaSpinBox.singleStep = 0.1
     self._satoSigmaSpinBox.toolTip = "Scale of the hessian gaussian filter kernel."
     self._vesselnessFormLayout.addRow("Sato Hessian Sigma:", self._satoSigmaSpinBox)
 
+    self._satoScaleCountSpinBox = qt.QSpinBox()
+    self._satoScaleCountSpinBox.minimum = 1
+    self._satoScaleCountSpinBox.maximum = 20
+    self._satoScaleCountSpinBox.singleStep = 1
+    self._satoScaleCountSpinBox.toolTip = "Number of hessian sigmas between Sato Hessian and Maximum Sigmas.\n" \
+                                          "With more than one scale, the maximum vesselness of all scales is kept."
+    self._satoScaleCountSpinBox.connect("valueChanged(int)",
+                                        lambda *_: self._updateVesselnessFilterParameterVisibility())
+    self._vesselnessFormLayout.addRow("Sato scale count:", self._satoScaleCountSpinBox)
+
+    self._satoMaxSigmaSpinBox = qt.QDoubleSpinBox()
+    self._satoMaxSigmaSpinBox.singleStep = 0.1
+    self._satoMaxSigmaSpinBox.toolTip = "Largest hessian gaussian filter kernel scale when using multiple scales."
+    self._vesselnessFormLayout.addRow("Sato Maximum Sigma:", self._satoMaxSigmaSpinBox)
+
+    self._useTilingCheckBox = qt.QCheckBox()
+    self._useTilingCheckBox.toolTip = "If true, vesselness is computed in overlapping tiles to limit the peak memory."
+    self._useTilingCheckBox.connect("stateChanged(int)", lambda *_: self._updateVesselnessFilterParameterVisibility())
+    self._vesselnessFormLayout.addRow("Use tiled processing:", self._useTilingCheckBox)
+
+    self._tileMemorySpinBox = qt.QSpinBox()
+    self._tileMemorySpinBox.minimum = 16
+    self._tileMemorySpinBox.maximum = 64 * 1024
+    self._tileMemorySpinBox.singleStep = 64
+    self._tileMemorySpinBox.suffix = " MB"
+    self._tileMemorySpinBox.toolTip = "Peak working memory of the tiles processed concurrently."
+    self._vesselnessFormLayout.addRow("Tile memory cap:", self._tileMemorySpinBox)
+
+    self._useIsotropicResamplingCheckBox = qt.QCheckBox()
+    self._useIsotropicResamplingCheckBox.toolTip = "If true, vesselness is computed on a grid resampled to the " \
+                                                   "isotropic working spacing and Sato sigmas are expressed in mm."
+    self._useIsotropicResamplingCheckBox.connect("stateChanged(int)",
+                                                 lambda *_: self._updateVesselnessFilterParameterVisibility())
+    self._vesselnessFormLayout.addRow("Use isotropic resampling:", self._useIsotropicResamplingCheckBox)
+
+    self._isotropicSpacingSpinBox = qt.QDoubleSpinBox()
+    self._isotropicSpacingSpinBox.minimum = 0.1
+    self._isotropicSpacingSpinBox.maximum = 10
+    self._isotropicSpacingSpinBox.singleStep = 0.1
+    self._isotropicSpacingSpinBox.suffix = " mm"
+    self._isotropicSpacingSpinBox.toolTip = "Spacing of the isotropic grid on which the vesselness is computed."
+    self._vesselnessFormLayout.addRow("Isotropic working spacing:", self._isotropicSpacingSpinBox)
+
+    self._vesselnessStorageChoice = qt.QComboBox()
+    self._vesselnessStorageChoice.addItems(list(self._vesselnessStorageTypes.keys()))
+    self._vesselnessStorageChoice.toolTip = "Type of the vesselness volume. Quantized volumes use 2 to 4 times less " \
+                                            "memory and are faster to render."
+    self._vesselnessFormLayout.addRow("Vesselness storage:", self._vesselnessStorageChoice)
+
     alpha_tooltip = "Alpha 1 needs to be strictly inferior to Alpha2.\n" \
                     "See http://www.image.med.osaka-u.ac.jp/member/yoshi/paper/linefilter.pdf for further information."
     self._satoAlpha1SpinBox = qt.QDoubleSpinBox()
@@ -351,8 +469,87 @@ class VesselWidget(VerticalLayoutWidget):
     self._vesselnessFormLayout.addRow("Show vesselness volume:", showVesselnessCheckbox)
     self._showVesselness = False
 
+    # Update preview when filter parameters are modified
+    for checkBox in [self._useVmtkCheckBox, self._useROI, self._useLiverMaskCheckBox,
+                     self._useIsotropicResamplingCheckBox]:
+      checkBox.connect("stateChanged(int)", lambda *_: self._schedulePreviewUpdate())
+
+    self._satoBackendChoice.connect("currentIndexChanged(int)", lambda *_: self._schedulePreviewUpdate())
+
+    for spinBox in [self._minimumDiameterSpinBox, self._maximumDiameterSpinBox, self._satoScaleCountSpinBox]:
+      spinBox.connect("valueChanged(int)", lambda *_: self._schedulePreviewUpdate())
+
+    for widget in [self._roiSlider, self._minRoiSlider, self._contrastSlider, self._suppressPlatesSlider,
+                   self._suppressBlobsSlider, self._liverMaskMarginSpinBox, self._satoSigmaSpinBox,
+                   self._satoMaxSigmaSpinBox, self._satoAlpha1SpinBox, self._satoAlpha2SpinBox,
+                   self._isotropicSpacingSpinBox]:
+      widget.connect("valueChanged(double)", lambda *_: self._schedulePreviewUpdate())
+
     return filterOptionCollapsibleButton
 
+  def _previewStateChanged(self, state):
+    if state == qt.Qt.Checked:
+      self._schedulePreviewUpdate()
+    else:
+      self._previewTimer.stop()
+      self._logic.removePreviewVesselnessVolume()
+      self._updateVisibility()
+    self._updateVesselnessFilterParameterVisibility()
+
+  def setLiverMaskProvider(self, liverMaskProvider):
+    """
+    Parameters
+    ----------
+    liverMaskProvider: Callable[[], vtkMRMLLabelMapVolumeNode or None]
+      Function returning a new label map of the liver in the input volume geometry used to restrict the vesselness.
+      The returned label map is removed from the scene once transferred to the logic.
+    """
+    self._liverMaskProvider = liverMaskProvider
+
+  def _updateLiverMask(self):
+    """Transfers the current liver mask to the logic if the vesselness is restricted to the liver.
+    """
+    if self._liverMaskProvider is None or self._inputVolume is None or not self._useLiverMaskCheckBox.checked:
+      return
+
+    liverMask = self._liverMaskProvider()
+    try:
+      self._logic.setLiverMask(liverMask)
+    finally:
+      removeNodesFromMRMLScene([liverMask])
+
+  def _isPreviewEnabled(self):
+    return self._previewCheckBox.checked and self._inputVolume is not None and self.visible
+
+  def _schedulePreviewUpdate(self):
+    """Restarts the preview timer to update the preview once the parameters are stable for the timer interval.
+    """
+    if self._isPreviewEnabled():
+      self._previewTimer.start()
+
+  def _updatePreviewVesselnessVolume(self):
+    """Update preview vesselness volume with current vesselness filter parameters and display it as foreground.
+    """
+    if not self._isPreviewEnabled():
+      return
+
+    nodePositions = list(getMarkupIdPositionDictionary(self._vesselBranchWidget.getBranchMarkupNode()).values())
+    if self._useROI.checked and not nodePositions:
+      return
+
+    self._updateLogicVesselnessFilterParameters()
+    factor = self._previewDownsamplingFactors[self._previewDownsamplingChoice.currentText]
+    try:
+      self._logic.updatePreviewVesselnessVolume(nodePositions, factor)
+    except Exception as e:
+      logging.warning("Failed to update vesselness preview : {}".format(e))
+      return
+
+    preview = self._logic.getCurrentPreviewVesselnessVolume()
+    preview.CreateDefaultDisplayNodes()
+    self._setNormalizedVesselnessWindowLevel(preview)
+    slicer.util.setSliceViewerLayers(background=self._inputVolume, foreground=preview, foregroundOpacity=0.5)
+
   def _ensureSatoAlpha2GreaterThanAlpha1(self, source):
     min_delta = 0.01
     if self._satoAlpha2SpinBox.value >= self._satoAlpha1SpinBox.value + min_delta:
@@ -422,6 +619,13 @@ class VesselWidget(VerticalLayoutWidget):
     self._strategyChoice.toolTip = "Choose the strategy for vessel tree segmentation"
     segmentationAdvancedFormLayout.addRow("Segmentation strategy:", self._strategyChoice)
 
+    # labeled branches merge mode
+    self._labelBranchesCheckBox = qt.QCheckBox()
+    self._labelBranchesCheckBox.toolTip = "If true, each vessel segmented by the per branch strategies is written " \
+                                          "with its own label in the vessel volume instead of merging the vessels " \
+                                          "in a single label. Has no effect on the whole tree strategy."
+    segmentationAdvancedFormLayout.addRow("Label branches:", self._labelBranchesCheckBox)
+
     # initialization combo box
     self._levelSetInitializationChoice = qt.QComboBox()
     self._levelSetInitializationChoice.addItems(list(self._levelSetInitializations.keys()))
@@ -434,6 +638,35 @@ class VesselWidget(VerticalLayoutWidget):
     self._levelSetSegmentationChoice.toolTip = "Choose the level set method"
     segmentationAdvancedFormLayout.addRow("Segmentation method:", self._levelSetSegmentationChoice)
 
+    # branch ROI parameters
+    self._useBranchROICheckBox = qt.QCheckBox()
+    self._useBranchROICheckBox.toolTip = "If true, each level set run is restricted to the bounding box of its seeds " \
+                                         "and stoppers grown by the branch margin."
+    segmentationAdvancedFormLayout.addRow("Use branch ROI:", self._useBranchROICheckBox)
+
+    self._branchROIMarginSpinBox = qt.QDoubleSpinBox()
+    self._branchROIMarginSpinBox.minimum = 0.5
+    self._branchROIMarginSpinBox.maximum = 10
+    self._branchROIMarginSpinBox.singleStep = 0.5
+    self._branchROIMarginSpinBox.suffix = " x max diameter"
+    self._branchROIMarginSpinBox.toolTip = "Margin around the branch seeds and stoppers in multiples of the vesselness " \
+                                           "maximum diameter."
+    segmentationAdvancedFormLayout.addRow("Branch ROI margin:", self._branchROIMarginSpinBox)
+
+    # cropped evolution
+    self._useCroppedEvolutionCheckBox = qt.QCheckBox()
+    self._useCroppedEvolutionCheckBox.toolTip = "If true, the level set evolution only runs on the source voxels of " \
+                                                "the vesselness (or branch ROI) region instead of the whole volume."
+    segmentationAdvancedFormLayout.addRow("Crop evolution:", self._useCroppedEvolutionCheckBox)
+
+    # parallel level set runs
+    self._levelSetWorkerCountSpinBox = qt.QSpinBox()
+    self._levelSetWorkerCountSpinBox.minimum = 1
+    self._levelSetWorkerCountSpinBox.maximum = 64
+    self._levelSetWorkerCountSpinBox.toolTip = "Number of vessel branches segmented in parallel by the segmentation " \
+                                               "strategies. The workers share the input and vesselness volumes."
+    segmentationAdvancedFormLayout.addRow("Segmentation workers:", self._levelSetWorkerCountSpinBox)
+
     # Reset default button
     restoreDefaultButton = qt.QPushButton("Restore")
     restoreDefaultButton.toolTip = "Click to reset all input elements to default."
@@ -458,8 +691,7 @@ class VesselWidget(VerticalLayoutWidget):
     vesselnessDisplayNode = self._getVesselnessDisplayNode(vesselness)
     vesselnessDisplayNode.SetVisibility(isVisible)
 
-    # Reset slice window level between 0 and 1
-    vesselness.GetVolumeDisplayNode().SetWindowLevel(1, 0.5)
+    self._setNormalizedVesselnessWindowLevel(vesselness)
 
     if self._vesselVolumeNode:
       foregroundOpacity = 0.1 if isVisible else 0
@@ -468,15 +700,25 @@ class VesselWidget(VerticalLayoutWidget):
     else:
       slicer.util.setSliceViewerLayers(background=self._inputVolume)
 
+  def _setNormalizedVesselnessWindowLevel(self, vesselness):
+    """Reset slice window level between 0 and 1 in normalized vesselness units"""
+    maxValue = 1. / self._logic.getVesselnessScaleFactor(vesselness)
+    vesselness.GetVolumeDisplayNode().SetWindowLevel(maxValue, maxValue / 2.)
+
   def _getVesselnessDisplayNode(self, vesselness):
     if self._vesselnessDisplay is not None:
       self._vesselnessDisplay.SetVisibility(False)
 
-    self._vesselnessDisplay = createDisplayNodeIfNecessary(vesselness, "Vesselness")
+    # The preset is expressed in normalized vesselness units. Scale it to the quantized vesselness values if necessary.
+    self._vesselnessDisplay = createDisplayNodeIfNecessary(
+      vesselness, "Vesselness", presetScalarScale=1. / self._logic.getVesselnessScaleFactor(vesselness))
     return self._vesselnessDisplay
 
   def _extractVessel(self):
     """Extract vessels from vessel branch tree. Disable tree interaction and inform user of algorithm processing.
+
+    The vesselness volume is computed in a background thread while a progress dialog reports the computation progress
+    and allows to cancel it. The vessels are segmented on the main thread once the vesselness volume is available.
     """
     # Stop branch vessel widget interaction when extracting vessels
     self._vesselBranchWidget.stopInteraction()
@@ -484,14 +726,12 @@ class VesselWidget(VerticalLayoutWidget):
     # Remove previous vessels
     self._removePreviouslyExtractedVessels()
 
-    # Call vessel extraction strategy and inform user of vessel extraction
-    branchTree = self._vesselBranchWidget.getBranchTree()
-    branchMarkupNode = self._vesselBranchWidget.getBranchMarkupNode()
-
-    progressText = "Extracting vessels volume from branch nodes.\nThis may take a minute..."
     progressDialog = slicer.util.createProgressDialog(parent=self, windowTitle="Extracting vessels",
-                                                      labelText=progressText)
-    progressDialog.setRange(0, 0)
+                                                      labelText=self._extractionProgressText(
+                                                        "Extracting Vesselness Volume..."))
+    progressDialog.setRange(0, 100)
+    progressDialog.setAutoClose(False)
+    progressDialog.setAutoReset(False)
     progressDialog.setModal(True)
     progressDialog.show()
 
@@ -499,28 +739,87 @@ class VesselWidget(VerticalLayoutWidget):
     slicer.app.processEvents()
     try:
       self._updateLevelSetParameters()
-      progressDialog.setLabelText(progressText + "\n\nExtracting Vesselness Volume...")
-      progressDialog.repaint()
-      self._updateVesselnessVolume()
+      self._previewTimer.stop()
+      self._logic.removePreviewVesselnessVolume()
+      self._updateLiverMask()
+      self._updateLogicVesselnessFilterParameters()
+      idPositionDict = getMarkupIdPositionDictionary(self._vesselBranchWidget.getBranchMarkupNode())
+      computeVesselness = self._logic.prepareVesselnessUpdate(idPositionDict.values())
+    except Exception as e:
+      self._endVesselExtraction(progressDialog, e)
+      return
+
+    if computeVesselness is None:
+      self._segmentVessels(progressDialog)
+      return
+
+    def onVesselnessComputed(vesselness_array):
+      try:
+        self._logic.finishVesselnessUpdate(vesselness_array)
+      except Exception as e:
+        self._endVesselExtraction(progressDialog, e)
+        return
+      self._segmentVessels(progressDialog)
+
+    self._vesselnessTask = BackgroundTask(computeVesselness, onFinished=onVesselnessComputed,
+                                          onError=lambda e: self._endVesselExtraction(progressDialog, e),
+                                          onCancelled=lambda: self._endVesselExtraction(progressDialog),
+                                          onProgress=lambda fraction: progressDialog.setValue(int(100 * fraction)))
+    self._vesselnessCancelHandler = self._vesselnessTask.cancel
+    progressDialog.connect("canceled()", self._vesselnessCancelHandler)
+    self._vesselnessTask.start(pollIntervalMs=50)
+
+  @staticmethod
+  def _extractionProgressText(stepText):
+    return "Extracting vessels volume from branch nodes.\nThis may take a minute...\n\n" + stepText
+
+  def _segmentVessels(self, progressDialog):
+    """Segments the vessels from the updated vesselness volume using the current extraction strategy.
+    """
+    self._endVesselnessTask(progressDialog)
+    progressDialog.setLabelText(self._extractionProgressText("Segmenting Vessels..."))
+    progressDialog.setRange(0, 0)
+    progressDialog.repaint()
+    slicer.app.processEvents()
+
+    try:
+      branchTree = self._vesselBranchWidget.getBranchTree()
+      branchMarkupNode = self._vesselBranchWidget.getBranchMarkupNode()
       strategy = self._strategies[self._strategyChoice.currentText]
-      progressDialog.setLabelText(progressText + "\n\nSegmenting Vessels...")
-      progressDialog.repaint()
       self._vesselVolumeNode, self._vesselModelNode = strategy.extractVesselVolumeFromVesselBranchTree(branchTree,
                                                                                                        branchMarkupNode,
                                                                                                        self._logic)
       self.vesselSegmentationChanged.emit(self._vesselVolumeNode, self._vesselBranchWidget.getBranchNames())
       self._setSegmentationOpacity(self._segmentationOpacity)
-
     except Exception as e:
+      self._endVesselExtraction(progressDialog, e)
+      return
+
+    self._endVesselExtraction(progressDialog)
+
+  def _endVesselExtraction(self, progressDialog, error=None):
+    """Closes the extraction progress dialog and informs the user of the extraction error if any.
+    """
+    self._endVesselnessTask(progressDialog)
+    progressDialog.hide()
+    if error is not None:
       import traceback
-      info = traceback.format_exc()
+      info = "".join(traceback.format_exception(type(error), error, error.__traceback__))
       warning_message = "An error happened while extracting vessels."
-      warning_message += "Please try to adjust vesselness or levelset parameters.\n{}\n\n{}".format(str(e), info)
+      warning_message += "Please try to adjust vesselness or levelset parameters.\n{}\n\n{}".format(str(error), info)
       qt.QMessageBox.warning(self, "Failed to extract vessels", warning_message)
 
-    progressDialog.hide()
     self._updateVisibility()
 
+  def _endVesselnessTask(self, progressDialog):
+    """Releases the vesselness task and disconnects its cancel handler from the progress dialog to make sure cancelling
+    the remaining extraction steps doesn't act on the finished task.
+    """
+    self._vesselnessTask = None
+    if self._vesselnessCancelHandler is not None:
+      progressDialog.disconnect("canceled()", self._vesselnessCancelHandler)
+      self._vesselnessCancelHandler = None
+
   def _removePreviouslyExtractedVessels(self):
     """Remove previous nodes from mrmlScene if necessary.
     """
@@ -537,11 +836,18 @@ class VesselWidget(VerticalLayoutWidget):
     parameters.curvature = self._curvatureSlider.value
     parameters.levelSetMethod = self._levelSetSegmentations[self._levelSetSegmentationChoice.currentText]
     parameters.initializationMethod = self._levelSetInitializations[self._levelSetInitializationChoice.currentText]
+    parameters.useBranchROI = self._useBranchROICheckBox.checked
+    parameters.branchROIMarginFactor = self._branchROIMarginSpinBox.value
+    parameters.useCroppedEvolution = self._useCroppedEvolutionCheckBox.checked
+    parameters.workerCount = self._levelSetWorkerCountSpinBox.value
 
     self._logic.levelSetParameters = parameters
+    for strategy in self._strategies.values():
+      if isinstance(strategy, ExtractVesselFromVesselSeedPointsStrategy):
+        strategy.labelBranches = self._labelBranchesCheckBox.checked
 
-  def _updateVesselnessVolume(self):
-    """Update vesselness volume with current vesselness filter parameters present in the UI
+  def _updateLogicVesselnessFilterParameters(self):
+    """Update logic vesselness filter parameters with UI values
     """
     # Get parameters from current advanced option parameters
     parameters = VesselnessFilterParameters()
@@ -555,13 +861,22 @@ class VesselWidget(VerticalLayoutWidget):
     parameters.useROI = self._useROI.checked
     parameters.useVmtkFilter = self._useVmtkCheckBox.checked
     parameters.satoSigma = self._satoSigmaSpinBox.value
+    parameters.satoBackend = self._satoBackends[self._satoBackendChoice.currentText]
+    parameters.vesselnessStorageType = self._vesselnessStorageTypes[self._vesselnessStorageChoice.currentText]
+    parameters.useIsotropicResampling = self._useIsotropicResamplingCheckBox.checked
+    parameters.isotropicSpacing = self._isotropicSpacingSpinBox.value
+    parameters.useTiling = self._useTilingCheckBox.checked
+    parameters.tileMaxPeakMemoryBytes = self._tileMemorySpinBox.value * 1024 ** 2
+    parameters.useLiverMask = self._useLiverMaskCheckBox.checked
+    parameters.liverMaskMargin = self._liverMaskMarginSpinBox.value
+    if self._satoScaleCountSpinBox.value > 1:
+      parameters.satoSigmas = VesselnessFilterParameters.satoSigmaRange(self._satoSigmaSpinBox.value,
+                                                                        self._satoMaxSigmaSpinBox.value,
+                                                                        self._satoScaleCountSpinBox.value)
     parameters.satoAlpha1 = self._satoAlpha1SpinBox.value
     parameters.satoAlpha2 = self._satoAlpha2SpinBox.value
     self._logic.vesselnessFilterParameters = parameters
 
-    idPositionDict = getMarkupIdPositionDictionary(self._vesselBranchWidget.getBranchMarkupNode())
-    self._logic.updateVesselnessVolume(idPositionDict.values())
-
   def _restoreDefaultVesselnessFilterParameters(self):
     """Apply default vesselness filter parameters to the UI
     """
@@ -574,8 +889,13 @@ class VesselWidget(VerticalLayoutWidget):
     self._inflationSlider.value = p.inflation
     self._iterationSpinBox.value = p.iterationNumber
     self._strategyChoice.setCurrentIndex(self._strategyChoice.findText(self._defaultStrategy))
+    self._labelBranchesCheckBox.checked = False
     self._levelSetInitializationChoice.setCurrentIndex(0)
     self._levelSetSegmentationChoice.setCurrentIndex(0)
+    self._useBranchROICheckBox.checked = p.useBranchROI
+    self._branchROIMarginSpinBox.value = p.branchROIMarginFactor
+    self._useCroppedEvolutionCheckBox.checked = p.useCroppedEvolution
+    self._levelSetWorkerCountSpinBox.value = p.workerCount
 
   def _updateVesselnessFilterParameters(self, params):
     """Updates UI vessel filter parameters with the input VesselnessFilterParameters
@@ -592,9 +912,20 @@ class VesselWidget(VerticalLayoutWidget):
     self._roiSlider.value = params.roiGrowthFactor
     self._minRoiSlider.value = params.minROIExtent
     self._useROI.setChecked(params.useROI)
+    self._useLiverMaskCheckBox.setChecked(params.useLiverMask)
+    self._liverMaskMarginSpinBox.value = params.liverMaskMargin
 
     self._useVmtkCheckBox.setChecked(params.useVmtkFilter)
-    self._satoSigmaSpinBox.value = params.satoSigma
+    self._satoSigmaSpinBox.value = min(params.getSatoSigmas())
+    self._satoScaleCountSpinBox.value = len(params.getSatoSigmas())
+    self._satoMaxSigmaSpinBox.value = max(params.getSatoSigmas())
+    self._satoBackendChoice.setCurrentIndex(list(self._satoBackends.values()).index(params.satoBackend))
+    self._vesselnessStorageChoice.setCurrentIndex(
+      list(self._vesselnessStorageTypes.values()).index(params.vesselnessStorageType))
+    self._useIsotropicResamplingCheckBox.setChecked(params.useIsotropicResampling)
+    self._isotropicSpacingSpinBox.value = params.isotropicSpacing
+    self._useTilingCheckBox.setChecked(params.useTiling)
+    self._tileMemorySpinBox.value = params.tileMaxPeakMemoryBytes // 1024 ** 2
     self._satoAlpha1SpinBox.value = params.satoAlpha1
     self._satoAlpha2SpinBox.value = params.satoAlpha2
 
@@ -607,9 +938,20 @@ class VesselWidget(VerticalLayoutWidget):
     self._setVesselWidgetVisible(self._suppressPlatesSlider, isVmtk)
     self._setVesselWidgetVisible(self._suppressBlobsSlider, isVmtk)
     self._setVesselWidgetVisible(self._contrastSlider, isVmtk)
+    self._setVesselWidgetVisible(self._satoBackendChoice, not isVmtk)
     self._setVesselWidgetVisible(self._satoSigmaSpinBox, not isVmtk)
+    self._setVesselWidgetVisible(self._satoScaleCountSpinBox, not isVmtk)
+    self._setVesselWidgetVisible(self._satoMaxSigmaSpinBox, not isVmtk and self._satoScaleCountSpinBox.value > 1)
+    self._setVesselWidgetVisible(self._useTilingCheckBox, not isVmtk)
+    self._setVesselWidgetVisible(self._vesselnessStorageChoice, not isVmtk)
+    self._setVesselWidgetVisible(self._useIsotropicResamplingCheckBox, not isVmtk)
+    self._setVesselWidgetVisible(self._isotropicSpacingSpinBox,
+                                 not isVmtk and self._useIsotropicResamplingCheckBox.checked)
+    self._setVesselWidgetVisible(self._tileMemorySpinBox, not isVmtk and self._useTilingCheckBox.checked)
     self._setVesselWidgetVisible(self._satoAlpha1SpinBox, not isVmtk)
     self._setVesselWidgetVisible(self._satoAlpha2SpinBox, not isVmtk)
+    self._setVesselWidgetVisible(self._previewDownsamplingChoice, self._previewCheckBox.checked)
+    self._setVesselWidgetVisible(self._liverMaskMarginSpinBox, self._useLiverMaskCheckBox.checked)
 
   def _setVesselWidgetVisible(self, widget, isVisible):
     widget.setVisible(isVisible)
@@ -658,9 +1000,12 @@ class VesselWidget(VerticalLayoutWidget):
   def showEvent(self, event):
     super(VesselWidget, self).showEvent(event)
     self._updateVisibility()
+    self._updateLiverMask()
+    self._schedulePreviewUpdate()
 
   def hideEvent(self, event):
     super(VesselWidget, self).hideEvent(event)
+    self._previewTimer.stop()
     self._updateVisibility()
 
   def _updateVisibility(self):
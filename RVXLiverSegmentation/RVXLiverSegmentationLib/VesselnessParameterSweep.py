@@ -0,0 +1,212 @@
+from collections import OrderedDict
+import copy
+import csv
+import itertools
+import os
+
+import numpy as np
+
+from .ArrayNormalization import normalizeArray
+
+
+def parameterGrid(baseParameters, **parameterValues):
+  """Creates the cartesian product of the input parameter values.
+
+  Example :
+    parameterGrid(VesselnessFilterParameters(), satoSigma=[1, 2, 3], satoAlpha1=[0.3, 0.5])
+
+  Parameters
+  ----------
+  baseParameters: VesselnessFilterParameters
+    Parameters whose values are used for the parameters which are not swept
+  parameterValues: Dict[str, List]
+    Values of each swept parameter name
+
+  Returns
+  -------
+  List[VesselnessFilterParameters] - One copy of the base parameters for each combination of the input values
+  """
+  for name in parameterValues:
+    if not hasattr(baseParameters, name):
+      raise ValueError("Unknown vesselness filter parameter : %s" % name)
+
+  names = list(parameterValues.keys())
+  grid = []
+  for values in itertools.product(*[parameterValues[name] for name in names]):
+    parameters = copy.deepcopy(baseParameters)
+    for name, value in zip(names, values):
+      setattr(parameters, name, value)
+    grid.append(parameters)
+  return grid
+
+
+def groupParametersBySharedInput(parametersList):
+  """Groups the parameters which only differ by their Sato sigma and alpha values. Parameters of a same group share the
+  same cropped input volume and their hessians only depend on their sigmas. Groups keep the order of their first
+  parameters in the input list and each group is sorted by Sato sigmas so that parameters sharing the same hessians
+  are consecutive.
+
+  Returns
+  -------
+  List[List[VesselnessFilterParameters]]
+  """
+  groups = OrderedDict()
+  for parameters in parametersList:
+    groupKey = parameters.cacheKey(
+      excludedNames=parameters.EXECUTION_ONLY_NAMES + ("satoSigma", "satoSigmas", "satoAlpha1", "satoAlpha2"))
+    groups.setdefault(groupKey, []).append(parameters)
+  return [sorted(group, key=lambda parameters: parameters.getSatoSigmas()) for group in groups.values()]
+
+
+def normalizedVesselness(vesselnessArray):
+  """
+  Returns
+  -------
+  np.array - float32 vesselness normalized between 0 and 1 (0 if the vesselness is constant)
+  """
+  return normalizeArray(vesselnessArray)
+
+
+def defaultVesselnessStatistics():
+  """
+  Returns
+  -------
+  OrderedDict[str, Callable[[np.array], float]] - Summary statistics computed on the normalized vesselness
+  """
+  statistics = OrderedDict()
+  statistics["mean"] = lambda array: float(np.mean(array))
+  statistics["std"] = lambda array: float(np.std(array))
+  statistics["p50"] = lambda array: float(np.percentile(array, 50))
+  statistics["p90"] = lambda array: float(np.percentile(array, 90))
+  statistics["p99"] = lambda array: float(np.percentile(array, 99))
+  statistics["fractionAbove0.5"] = lambda array: float(np.count_nonzero(array > 0.5)) / max(1, array.size)
+  return statistics
+
+
+class VesselnessSweepResult(object):
+  """Result of one parameter set of a vesselness parameter sweep.
+  """
+
+  def __init__(self, parameters, statistics, elapsedTime, volume=None):
+    """
+    Parameters
+    ----------
+    parameters: VesselnessFilterParameters
+    statistics: OrderedDict[str, float]
+      Summary statistics of the normalized vesselness
+    elapsedTime: float
+      Vesselness computation wall time in seconds (hessians computed in advance for the parameter group excluded)
+    volume: np.array or None
+      float16 normalized vesselness if volumes are stored
+    """
+    self.parameters = parameters
+    self.statistics = statistics
+    self.elapsedTime = elapsedTime
+    self.volume = volume
+
+  def __repr__(self):
+    return "VesselnessSweepResult(statistics={}, elapsedTime={:.3f})".format(dict(self.statistics), self.elapsedTime)
+
+
+class VesselnessSweepResults(object):
+  """Compact store of the results of a vesselness parameter sweep.
+
+  For each parameter set, the summary statistics of the normalized vesselness are stored as well as, optionally, the
+  normalized vesselness volume as float16 (2 bytes per voxel).
+  """
+
+  def __init__(self, storeVolumes=True, statisticsFunctions=None):
+    """
+    Parameters
+    ----------
+    storeVolumes: bool
+      If True, the normalized vesselness volumes are stored as float16 arrays
+    statisticsFunctions: Dict[str, Callable[[np.array], float]] or None
+      Additional statistics computed on each normalized vesselness array
+    """
+    self._storeVolumes = storeVolumes
+    self._statisticsFunctions = defaultVesselnessStatistics()
+    self._statisticsFunctions.update(statisticsFunctions or {})
+    self._results = []
+
+  def append(self, parameters, vesselnessArray, elapsedTime=0.):
+    """Normalizes the input vesselness and stores its statistics and its float16 volume if volumes are stored.
+
+    Returns
+    -------
+    VesselnessSweepResult - added result
+    """
+    normalized = normalizedVesselness(vesselnessArray)
+    statistics = OrderedDict((name, function(normalized)) for name, function in self._statisticsFunctions.items())
+    volume = normalized.astype(np.float16) if self._storeVolumes else None
+    result = VesselnessSweepResult(copy.deepcopy(parameters), statistics, elapsedTime, volume)
+    self._results.append(result)
+    return result
+
+  def sweptParameterNames(self):
+    """
+    Returns
+    -------
+    List[str] - Sorted names of the parameters whose values differ between the results
+    """
+    if not self._results:
+      return []
+
+    firstValues = vars(self._results[0].parameters)
+    return sorted(name for name, value in firstValues.items()
+                  if any(getattr(result.parameters, name) != value for result in self._results[1:]))
+
+  def rows(self):
+    """
+    Returns
+    -------
+    List[OrderedDict] - One row per result containing the swept parameter values, the elapsed time and the statistics
+    """
+    names = self.sweptParameterNames()
+    rows = []
+    for result in self._results:
+      row = OrderedDict((name, getattr(result.parameters, name)) for name in names)
+      row["elapsedTime"] = result.elapsedTime
+      row.update(result.statistics)
+      rows.append(row)
+    return rows
+
+  def best(self, statisticName, largest=True):
+    """
+    Returns
+    -------
+    VesselnessSweepResult - Result with the largest (or smallest) value of the input statistic
+    """
+    selectFunction = max if largest else min
+    return selectFunction(self._results, key=lambda result: result.statistics[statisticName])
+
+  def saveToDirectory(self, directory):
+    """Saves the results rows as summary.csv and the stored volumes as compressed volumes.npz in the input directory.
+    Volumes are stored under the name volume_<result index>.
+    """
+    if not os.path.exists(directory):
+      os.makedirs(directory)
+
+    rows = self.rows()
+    if rows:
+      with open(os.path.join(directory, "summary.csv"), "w") as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0].keys()))
+        writer.writeheader()
+        writer.writerows(rows)
+
+    volumes = {"volume_%d" % i: result.volume for i, result in enumerate(self._results) if result.volume is not None}
+    if volumes:
+      np.savez_compressed(os.path.join(directory, "volumes.npz"), **volumes)
+
+  @property
+  def nbytes(self):
+    return sum(result.volume.nbytes for result in self._results if result.volume is not None)
+
+  def __getitem__(self, index):
+    return self._results[index]
+
+  def __iter__(self):
+    return iter(self._results)
+
+  def __len__(self):
+    return len(self._results)
@@ -0,0 +1,222 @@
+import math
+
+import numpy as np
+
+
+def maskBoundingBox(mask):
+  """
+  Returns
+  -------
+  Tuple[Tuple[int], Tuple[int]] or None - start (included) and stop (excluded) indices of the mask non zero voxels.
+  None if the mask is empty.
+  """
+  mask = np.asarray(mask)
+  start, stop = [], []
+  for axis in range(mask.ndim):
+    otherAxes = tuple(i for i in range(mask.ndim) if i != axis)
+    nonZero = np.flatnonzero(np.any(mask, axis=otherAxes))
+    if nonZero.size == 0:
+      return None
+    start.append(int(nonZero[0]))
+    stop.append(int(nonZero[-1]) + 1)
+  return tuple(start), tuple(stop)
+
+
+def dilateMask(mask, margin, spacing=(1., 1., 1.)):
+  """Dilates a boolean mask by a physical margin using an euclidean distance transform.
+
+  The mask array is grown by the margin on each side so that the dilated voxels are not clipped by the array
+  boundaries. The distance transform is only computed on the bounding box of the mask grown by the margin.
+
+  Parameters
+  ----------
+  mask: np.array
+    3D boolean array
+  margin: float
+    Dilation distance in the spacing unit
+  spacing: Tuple[float]
+    Voxel size along each array axis
+
+  Returns
+  -------
+  Tuple[np.array, Tuple[int]] - dilated boolean mask and offset of the dilated mask origin in the input mask indices
+  (negative when the mask was grown)
+  """
+  from scipy import ndimage
+
+  mask = np.asarray(mask, dtype=bool)
+  padding = tuple(int(math.ceil(margin / s)) if margin > 0 else 0 for s in spacing)
+  offset = tuple(-pad for pad in padding)
+  dilated = np.zeros(tuple(size + 2 * pad for size, pad in zip(mask.shape, padding)), dtype=bool)
+
+  boundingBox = maskBoundingBox(mask)
+  if boundingBox is None:
+    return dilated, offset
+
+  if margin <= 0:
+    dilated[...] = mask
+    return dilated, offset
+
+  # Restrict the distance transform to the mask bounding box grown by the margin
+  start, stop = boundingBox
+  boxSlices = tuple(slice(s, e + 2 * pad) for s, e, pad in zip(start, stop, padding))
+  paddedMask = np.zeros(dilated.shape, dtype=bool)
+  paddedMask[tuple(slice(pad, pad + size) for pad, size in zip(padding, mask.shape))] = mask
+  distance = ndimage.distance_transform_edt(~paddedMask[boxSlices], sampling=spacing)
+  dilated[boxSlices] = distance <= margin
+  return dilated, offset
+
+
+class SparseBlockMask(object):
+  """Compact boolean mask of a volume grid storing only the bounding box of its non zero voxels as a bit packed block.
+
+  The memory of the mask is proportional to its bounding box volume divided by 8 instead of the grid size, which makes
+  it suited to keep the masks of thin structures such as vessel branches. Union, intersection and conversion back to
+  a dense mask operate on the blocks with vectorized NumPy operations.
+
+  Example :
+    mask = SparseBlockMask.fromDense(label_array != 0)
+    union = mask | otherMask
+    dense = union.toDense()
+  """
+
+  def __init__(self, shape, start=None, block=None):
+    """
+    Parameters
+    ----------
+    shape: Tuple[int]
+      Shape of the mask grid
+    start: Tuple[int] or None
+      Index of the block first voxel in the grid. None for an empty mask.
+    block: np.array or None
+      Boolean block of the mask starting at start index. Expected to be inside the grid. None for an empty mask.
+    """
+    self.shape = tuple(int(size) for size in shape)
+    self.start = tuple(0 for _ in self.shape)
+    self.blockShape = tuple(0 for _ in self.shape)
+    self._packed = np.zeros(0, dtype=np.uint8)
+    if block is None:
+      return
+
+    block = np.asarray(block, dtype=bool)
+    if any(s < 0 or s + size > gridSize for s, size, gridSize in zip(start, block.shape, self.shape)):
+      raise ValueError("Block of shape %s at %s is outside the grid of shape %s" % (block.shape, start, self.shape))
+
+    # Shrink the block to its non zero bounding box
+    boundingBox = maskBoundingBox(block)
+    if boundingBox is None:
+      return
+
+    blockStart, blockStop = boundingBox
+    block = block[tuple(slice(s, e) for s, e in zip(blockStart, blockStop))]
+    self.start = tuple(int(s + offset) for s, offset in zip(start, blockStart))
+    self.blockShape = block.shape
+    self._packed = np.packbits(block, axis=None)
+
+  @classmethod
+  def fromDense(cls, mask):
+    """Creates the sparse mask of the non zero voxels of the input array"""
+    mask = np.asarray(mask)
+    return cls(mask.shape, (0,) * mask.ndim, mask != 0)
+
+  @property
+  def stop(self):
+    return tuple(s + size for s, size in zip(self.start, self.blockShape))
+
+  @property
+  def slices(self):
+    """Slices of the block in the grid"""
+    return tuple(slice(s, e) for s, e in zip(self.start, self.stop))
+
+  @property
+  def isEmpty(self):
+    return self._packed.size == 0
+
+  @property
+  def nbytes(self):
+    return self._packed.nbytes
+
+  @property
+  def block(self):
+    """Unpacked boolean block of the mask"""
+    size = int(np.prod(self.blockShape))
+    return np.unpackbits(self._packed, count=size).reshape(self.blockShape).astype(bool)
+
+  def count(self):
+    """Returns the number of non zero voxels of the mask"""
+    return int(np.count_nonzero(self.block)) if not self.isEmpty else 0
+
+  def toDense(self):
+    """
+    Returns
+    -------
+    np.array - boolean mask of the grid shape
+    """
+    dense = np.zeros(self.shape, dtype=bool)
+    if not self.isEmpty:
+      dense[self.slices] = self.block
+    return dense
+
+  def pasteInto(self, array, value=1):
+    """Writes the input value in the array voxels of the mask. The array is expected to have the grid shape."""
+    if array.shape != self.shape:
+      raise ValueError("Array shape %s differs from the mask grid shape %s" % (array.shape, self.shape))
+    if not self.isEmpty:
+      np.copyto(array[self.slices], value, where=self.block, casting="unsafe")
+    return array
+
+  def union(self, other):
+    """
+    Returns
+    -------
+    SparseBlockMask - mask of the voxels in either mask
+    """
+    self._raiseIfDifferentGrid(other)
+    if other.isEmpty:
+      return self
+    if self.isEmpty:
+      return other
+
+    start = tuple(min(a, b) for a, b in zip(self.start, other.start))
+    stop = tuple(max(a, b) for a, b in zip(self.stop, other.stop))
+    block = np.zeros(tuple(e - s for s, e in zip(start, stop)), dtype=bool)
+    for mask in (self, other):
+      block[mask._slicesIn(start)] |= mask.block
+    return SparseBlockMask(self.shape, start, block)
+
+  def intersection(self, other):
+    """
+    Returns
+    -------
+    SparseBlockMask - mask of the voxels in both masks
+    """
+    self._raiseIfDifferentGrid(other)
+    start = tuple(max(a, b) for a, b in zip(self.start, other.start))
+    stop = tuple(min(a, b) for a, b in zip(self.stop, other.stop))
+    if self.isEmpty or other.isEmpty or any(s >= e for s, e in zip(start, stop)):
+      return SparseBlockMask(self.shape)
+
+    slices = tuple(slice(s, e) for s, e in zip(start, stop))
+    return SparseBlockMask(self.shape, start, self._blockIn(slices) & other._blockIn(slices))
+
+  def __or__(self, other):
+    return self.union(other)
+
+  def __and__(self, other):
+    return self.intersection(other)
+
+  def _slicesIn(self, origin):
+    """Slices of the block in an array whose first voxel is at the origin index of the grid"""
+    return tuple(slice(s - o, e - o) for s, e, o in zip(self.start, self.stop, origin))
+
+  def _blockIn(self, slices):
+    """Block of the mask restricted to the input grid slices, expected to be inside the mask bounding box"""
+    return self.block[tuple(slice(sl.start - s, sl.stop - s) for sl, s in zip(slices, self.start))]
+
+  def _raiseIfDifferentGrid(self, other):
+    if self.shape != other.shape:
+      raise ValueError("Masks have different grid shapes : %s != %s" % (self.shape, other.shape))
+
+  def __repr__(self):
+    return "SparseBlockMask(shape={}, start={}, blockShape={}, nbytes={})".format(self.shape, self.start,
+                                                                                  self.blockShape, self.nbytes)
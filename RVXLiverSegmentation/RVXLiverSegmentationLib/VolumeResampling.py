@@ -0,0 +1,81 @@
+import math
+
+import numpy as np
+
+
+def downsampleArray(array, factor):
+  """Downsamples a 3D array by averaging blocks of factor ** 3 voxels (one level of a mean pyramid).
+
+  Arrays whose shape is not a multiple of the factor are padded by repeating their last voxels. The center of the output
+  voxel i along an axis is located at the input index i * factor + (factor - 1) / 2.
+
+  Parameters
+  ----------
+  array: np.array
+    3D input array
+  factor: int
+    Downsampling factor along each axis
+
+  Returns
+  -------
+  np.array - float32 array of shape ceil(array.shape / factor)
+  """
+  factor = int(factor)
+  if factor < 1:
+    raise ValueError("Downsampling factor must be a positive integer. Got %s." % factor)
+
+  array = np.asarray(array, dtype=np.float32)
+  if factor == 1:
+    return array.copy()
+
+  padding = [(0, -size % factor) for size in array.shape]
+  if any(after for _, after in padding):
+    array = np.pad(array, padding, mode="edge")
+
+  outputShape = tuple(size // factor for size in array.shape)
+  blocks = array.reshape(outputShape[0], factor, outputShape[1], factor, outputShape[2], factor)
+  return blocks.mean(axis=(1, 3, 5), dtype=np.float32)
+
+
+def resampledShape(shape, spacing, outputSpacing):
+  """
+  Returns
+  -------
+  Tuple[int] - Shape of the largest grid of the output spacing contained in the input grid when both grids share their
+  first voxel center
+  """
+  return tuple(int(math.floor((size - 1) * s / outS + 1e-6)) + 1 for size, s, outS in zip(shape, spacing, outputSpacing))
+
+
+def resampleArray(array, spacing, outputSpacing, outputShape=None, order=1):
+  """Resamples a 3D array to another grid spacing using vectorized spline interpolation (linear by default).
+
+  The input and output grids share their first voxel center. Output voxels located past the last input voxel center
+  are extrapolated with the nearest input value.
+
+  Parameters
+  ----------
+  array: np.array
+    3D input array
+  spacing: Tuple[float]
+    Input voxel size along each array axis
+  outputSpacing: Tuple[float]
+    Output voxel size along each array axis
+  outputShape: Tuple[int] or None
+    Output array shape. If None, the shape of the output grid contained in the input grid is used.
+  order: int
+    Spline interpolation order (0 for nearest neighbor interpolation)
+
+  Returns
+  -------
+  np.array - float32 resampled array
+  """
+  from scipy import ndimage
+
+  if outputShape is None:
+    outputShape = resampledShape(array.shape, spacing, outputSpacing)
+
+  # Diagonal transform mapping output indices to input indices
+  scale = np.array([outS / s for s, outS in zip(spacing, outputSpacing)], dtype=np.float64)
+  return ndimage.affine_transform(np.asarray(array, dtype=np.float32), scale, output_shape=tuple(outputShape),
+                                  order=order, mode="nearest", prefilter=False)
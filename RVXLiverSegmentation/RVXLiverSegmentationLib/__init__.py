@@ -3,8 +3,21 @@ from .RVXLiverSegmentationUtils import GeometryExporter, Settings, WidgetUtils,
   jumpSlicesToNthMarkupPosition, getMarkupIdPositionDictionary, hideFromUser, removeNodesFromMRMLScene, createButton, \
   getFiducialPositions, createModelNode, createLabelMapVolumeNodeBasedOnModel, createFiducialNode, addToScene, \
   raiseValueErrorIfInvalidType, removeNoneList, Icons, Signal, createDisplayNodeIfNecessary, \
-  createVolumeNodeBasedOnModel, removeNodeFromMRMLScene, cropSourceVolume, cloneSourceVolume, \
-  getVolumeIJKToRASDirectionMatrixAsNumpyArray, arrayFromVTKMatrix
+  scaleVolumePropertyScalars, createVolumeNodeBasedOnModel, removeNodeFromMRMLScene, cropSourceVolume, \
+  cloneSourceVolume, getVolumeIJKToRASDirectionMatrixAsNumpyArray, arrayFromVTKMatrix, createDownsampledVolume, \
+  ensureVolumeImageDataIsReady, allocateVolumeArray, getRoiIndexBoundsInVolume, getVolumeIndexBoundsInSource, \
+  getAlignedVolumeIndexBoundsInSource, updateItkFilter, VolumeCrop
+from .ArrayNormalization import arrayMinMax, normalizeArray, normalizedMaximumValue
+from .MemoryReport import MemoryReport, vtkDataObjectBytes
+from .NumpyVesselness import hessianFromArray, symmetricEigenvalues3x3, satoFromEigenvalues, \
+  satoVesselnessFromHessian, satoVesselness
+from .ResultCache import LRUCache
+from .BackgroundTask import BackgroundTask, TaskProgress, TaskCancelledError, stageProgressCallback
+from .TiledVolumeFilter import TiledVolumeFilter, Tile, haloFromSigma, tilesOutsideRegion
+from .VesselnessParameterSweep import parameterGrid, groupParametersBySharedInput, VesselnessSweepResults, \
+  VesselnessSweepResult
+from .VolumeMask import maskBoundingBox, dilateMask, SparseBlockMask
+from .VolumeResampling import downsampleArray, resampleArray, resampledShape
 from .VerticalLayoutWidget import VerticalLayoutWidget
 from .DataWidget import DataWidget
 from .SegmentWidget import SegmentWidget
@@ -12,7 +25,7 @@ from .RVXLiverSegmentationLogic import RVXLiverSegmentationLogic, IRVXLiverSegme
   VesselnessFilterParameters, LevelSetParameters
 from .ExtractVesselStrategies import ExtractAllVesselsInOneGoStrategy, ExtractOneVesselPerParentChildNode, \
   ExtractOneVesselPerParentAndSubChildNode, ExtractVesselFromVesselSeedPointsStrategy, ExtractOneVesselPerBranch, \
-  VesselSeedPoints
+  VesselSeedPoints, LabelMapMerger, mergeVolumes
 from .VesselBranchWizard import VesselBranchWizard, PlaceStatus, VeinId, NodeBranches, InteractionStatus, \
   VesselTreeColumnRole, setup_portal_vein_default_branch, setup_inferior_cava_vein_default_branch
 from .VesselBranchTree import VesselBranchTree, VesselBranchWidget, MarkupNode, TreeDrawer, INodePlaceWidget
@@ -0,0 +1,62 @@
+import unittest
+
+import numpy as np
+
+from RVXLiverSegmentationLib import arrayMinMax, normalizeArray, normalizedMaximumValue
+
+
+class ArrayNormalizationTestCase(unittest.TestCase):
+  def setUp(self):
+    self.array = np.random.RandomState(0).normal(size=(17, 9, 5)).astype(np.float32)
+
+  def testMinMaxIsIndependentOfChunkSize(self):
+    for chunkVoxels in [1, 45, 100, 2 ** 20]:
+      self.assertEqual((self.array.min(), self.array.max()), arrayMinMax(self.array, chunkVoxels))
+
+  def testMinMaxRaisesForEmptyArrays(self):
+    with self.assertRaises(ValueError):
+      arrayMinMax(np.zeros((0, 3, 3)))
+
+  def testNormalizedArrayMatchesFullArrayExpression(self):
+    expected = (self.array - np.min(self.array)) / (np.max(self.array) - np.min(self.array))
+    normalized = normalizeArray(self.array, chunkVoxels=100)
+
+    self.assertEqual(np.float32, normalized.dtype)
+    np.testing.assert_array_equal(expected, normalized)
+
+  def testArrayIsNormalizedIntoOutputBuffer(self):
+    out = np.empty(self.array.shape, dtype=np.float32)
+    input_copy = self.array.copy()
+
+    self.assertIs(out, normalizeArray(self.array, out=out))
+    np.testing.assert_array_equal(input_copy, self.array)
+    self.assertAlmostEqual(0, out.min())
+    self.assertAlmostEqual(1, out.max())
+
+  def testArrayCanBeNormalizedInPlace(self):
+    expected = normalizeArray(self.array)
+    normalizeArray(self.array, out=self.array, chunkVoxels=45)
+    np.testing.assert_array_equal(expected, self.array)
+
+  def testIntegerArraysAreNormalizedToFloat32(self):
+    normalized = normalizeArray(np.arange(5, dtype=np.int16))
+    np.testing.assert_array_almost_equal([0, 0.25, 0.5, 0.75, 1], normalized)
+    self.assertEqual(np.float32, normalized.dtype)
+
+  def testConstantArraysAreNormalizedToZero(self):
+    np.testing.assert_array_equal(np.zeros((3, 3)), normalizeArray(np.full((3, 3), 4.)))
+
+  def testIntegerOutputsAreQuantizedToTheirFullRange(self):
+    expected = normalizeArray(self.array)
+    for dtype in [np.uint8, np.uint16]:
+      quantized = normalizeArray(self.array, out=np.empty(self.array.shape, dtype=dtype), chunkVoxels=100)
+      maxValue = normalizedMaximumValue(dtype)
+
+      self.assertEqual(dtype, quantized.dtype)
+      self.assertEqual((0, maxValue), (quantized.min(), quantized.max()))
+      np.testing.assert_allclose(expected, quantized / maxValue, atol=0.5 / maxValue + 1e-6)
+
+  def testNormalizedMaximumValueIsOneForFloatTypes(self):
+    self.assertEqual(1, normalizedMaximumValue(np.float32))
+    self.assertEqual(255, normalizedMaximumValue(np.uint8))
+    self.assertEqual(65535, normalizedMaximumValue(np.uint16))
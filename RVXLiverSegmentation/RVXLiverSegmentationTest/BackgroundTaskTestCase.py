@@ -0,0 +1,122 @@
+import threading
+import unittest
+
+from RVXLiverSegmentationLib import BackgroundTask, TaskProgress, TaskCancelledError, stageProgressCallback
+
+
+class BackgroundTaskTestCase(unittest.TestCase):
+  def setUp(self):
+    self.finished, self.errors, self.cancelled, self.fractions = [], [], [], []
+
+  def createTask(self, function, **kwargs):
+    return BackgroundTask(function, onFinished=self.finished.append, onError=self.errors.append,
+                          onCancelled=lambda: self.cancelled.append(True), onProgress=self.fractions.append, **kwargs)
+
+  def testFinishedCallbackIsCalledWithResultWhenPolledAfterCompletion(self):
+    def function(progress):
+      for i in range(4):
+        progress(i + 1, 4)
+      return 42
+
+    task = self.createTask(function)
+    task.start()
+    task.wait()
+
+    self.assertTrue(task.poll())
+    self.assertEqual([42], self.finished)
+    self.assertEqual([1.], self.fractions)
+    self.assertEqual([], self.errors)
+    self.assertEqual([], self.cancelled)
+
+  def testOutcomeIsOnlyDispatchedOnce(self):
+    task = self.createTask(lambda progress: 1)
+    task.start()
+    task.wait()
+    task.poll()
+    task.poll()
+    self.assertEqual([1], self.finished)
+
+  def testPollReturnsFalseWhileTaskIsRunning(self):
+    release = threading.Event()
+
+    def function(progress):
+      progress(1, 2)
+      release.wait()
+      return 0
+
+    task = self.createTask(function)
+    task.start()
+    self.assertFalse(task.poll())
+    self.assertTrue(task.isRunning)
+
+    release.set()
+    task.wait()
+    self.assertTrue(task.poll())
+    self.assertEqual([0], self.finished)
+
+  def testCancelStopsTaskAtNextProgressReport(self):
+    started, release = threading.Event(), threading.Event()
+    reachedEnd = []
+
+    def function(progress):
+      started.set()
+      release.wait()
+      progress(1, 2)
+      reachedEnd.append(True)
+
+    task = self.createTask(function)
+    task.start()
+    started.wait()
+    task.cancel()
+    release.set()
+    task.wait()
+
+    self.assertTrue(task.poll())
+    self.assertEqual([True], self.cancelled)
+    self.assertEqual([], reachedEnd)
+    self.assertEqual([], self.finished)
+
+  def testErrorCallbackIsCalledWithTaskException(self):
+    def function(progress):
+      raise ValueError("error")
+
+    task = self.createTask(function)
+    task.start()
+    task.wait()
+    task.poll()
+
+    self.assertEqual(1, len(self.errors))
+    self.assertIsInstance(self.errors[0], ValueError)
+
+  def testPollRaisesTaskExceptionWithoutErrorCallback(self):
+    def function(progress):
+      raise ValueError("error")
+
+    task = BackgroundTask(function)
+    task.start()
+    task.wait()
+    with self.assertRaises(ValueError):
+      task.poll()
+
+  def testProgressFractionIsZeroWithoutTotal(self):
+    progress = TaskProgress()
+    self.assertEqual(0, progress.fraction)
+    progress(1, 4)
+    self.assertEqual(0.25, progress.fraction)
+
+  def testProgressRaisesWhenCancelled(self):
+    progress = TaskProgress()
+    progress.cancel()
+    with self.assertRaises(TaskCancelledError):
+      progress(1, 4)
+
+  def testStageProgressIsReportedAsProgressOfTheWholeComputation(self):
+    progress = TaskProgress()
+    self.assertIsNone(stageProgressCallback(None, 0, 2))
+
+    stageProgressCallback(progress, 0, 2)(3, 6)
+    self.assertEqual(0.25, progress.fraction)
+    stageProgressCallback(progress, 1, 2)(0, 4)
+    self.assertEqual(0.5, progress.fraction)
+    stageProgressCallback(progress, 1, 2)(4, 4)
+    self.assertEqual(1., progress.fraction)
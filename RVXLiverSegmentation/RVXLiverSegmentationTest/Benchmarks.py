@@ -0,0 +1,437 @@
+import time
+
+import numpy as np
+import slicer
+
+from RVXLiverSegmentationLib import RVXLiverSegmentationLogic, VesselnessFilterParameters, removeNodesFromMRMLScene, \
+  createVolumeNodeBasedOnModel, allocateVolumeArray, normalizeArray, MemoryReport, vtkDataObjectBytes, VolumeCrop
+from .TestUtils import createTubePhantomVolume, tubePhantomBranchPositions
+
+
+def timeCall(function, repeat=1):
+  """Calls function repeat times and returns the best wall time in seconds and the last function result"""
+  bestTime = None
+  result = None
+  for _ in range(repeat):
+    start = time.perf_counter()
+    result = function()
+    elapsed = time.perf_counter() - start
+    bestTime = elapsed if bestTime is None else min(bestTime, elapsed)
+  return bestTime, result
+
+
+def printBenchmark(title, results):
+  print(title)
+  for name, value in results.items():
+    print("  {}: {}".format(name, value))
+
+
+def benchmarkMultiScaleSato(shape=(128, 128, 128), sigmaCount=4, minSigma=1., maxSigma=4., repeat=1):
+  """Compares the single scale Sato vesselness wall time with the multi scale Sato vesselness computed serially and in
+  parallel. Hessian caching is disabled for the benchmark.
+
+  To run the benchmark, in the Slicer Python console :
+    from RVXLiverSegmentationTest.Benchmarks import benchmarkMultiScaleSato
+    benchmarkMultiScaleSato()
+
+  Returns
+  -------
+  Dict[str, float] - wall times in seconds and parallel speedup
+  """
+  volume = createTubePhantomVolume(shape=shape)
+  logic = RVXLiverSegmentationLogic(hessianCacheMaxBytes=0)
+  createdNodes = [volume]
+
+  def runSato(sigmas, workerCount):
+    params = VesselnessFilterParameters()
+    params.satoSigmas = sigmas
+    params.workerCount = workerCount
+    logic.vesselnessFilterParameters = params
+    vesselness = logic._applySatoVesselnessFilter(volume)
+    createdNodes.append(vesselness)
+    return vesselness
+
+  sigmas = VesselnessFilterParameters.satoSigmaRange(minSigma, maxSigma, sigmaCount)
+  singleTime, _ = timeCall(lambda: runSato([], 1), repeat)
+  serialTime, _ = timeCall(lambda: runSato(sigmas, 1), repeat)
+  parallelTime, _ = timeCall(lambda: runSato(sigmas, 0), repeat)
+  removeNodesFromMRMLScene(createdNodes)
+
+  results = {"shape": shape, "sigmas": sigmas, "singleScaleTime": singleTime, "multiScaleSerialTime": serialTime,
+             "multiScaleParallelTime": parallelTime, "parallelSpeedup": serialTime / parallelTime,
+             "multiScaleOverSingleScale": parallelTime / singleTime}
+  printBenchmark("Multi scale Sato vesselness", results)
+  return results
+
+
+def benchmarkSatoBackends(shapes=((64, 64, 64), (128, 128, 128)), sigma=2., repeat=3):
+  """Compares the NumPy / SciPy Sato backend wall time and output against the ITK backend on synthetic tube phantoms.
+  Hessian caching is disabled for the benchmark.
+
+  To run the benchmark, in the Slicer Python console :
+    from RVXLiverSegmentationTest.Benchmarks import benchmarkSatoBackends
+    benchmarkSatoBackends()
+
+  Returns
+  -------
+  List[Dict[str, float]] - ITK and NumPy wall times in seconds and maximum absolute difference for each shape
+  """
+  allResults = []
+  for shape in shapes:
+    volume = createTubePhantomVolume(shape=shape)
+    logic = RVXLiverSegmentationLogic(hessianCacheMaxBytes=0)
+    createdNodes = [volume]
+
+    def runSato(backend):
+      params = VesselnessFilterParameters()
+      params.satoSigma = sigma
+      params.satoBackend = backend
+      logic.vesselnessFilterParameters = params
+      vesselness = logic._applySatoVesselnessFilter(volume)
+      createdNodes.append(vesselness)
+      return slicer.util.arrayFromVolume(vesselness)
+
+    itkTime, itkArray = timeCall(lambda: runSato("itk"), repeat)
+    numpyTime, numpyArray = timeCall(lambda: runSato("numpy"), repeat)
+    results = {"shape": shape, "itkTime": itkTime, "numpyTime": numpyTime, "numpyOverItk": numpyTime / itkTime,
+               "maxAbsDifference": float(np.max(np.abs(itkArray - numpyArray)))}
+    removeNodesFromMRMLScene(createdNodes)
+    printBenchmark("Sato backends", results)
+    allResults.append(results)
+  return allResults
+
+
+def benchmarkPreviewVesselness(shape=(160, 160, 160), factors=(2, 4), repeat=3):
+  """Compares the preview vesselness latency for each downsampling factor with the full resolution vesselness on a
+  synthetic tube phantom of the size of a standard liver ROI. Preview latency is measured when only the Sato alpha
+  parameters change, which is the case when moving the alpha sliders with live preview enabled.
+
+  To run the benchmark, in the Slicer Python console :
+    from RVXLiverSegmentationTest.Benchmarks import benchmarkPreviewVesselness
+    benchmarkPreviewVesselness()
+
+  Returns
+  -------
+  Dict[str, float] - full resolution and preview wall times in seconds
+  """
+  volume = createTubePhantomVolume(shape=shape)
+  logic = RVXLiverSegmentationLogic(vesselnessCacheMaxBytes=0, hessianCacheMaxBytes=0)
+  logic.setInputVolume(volume)
+  logic.vesselnessFilterParameters.useROI = False
+
+  def updateFullResolution():
+    # Disable the incremental vesselness reuse between repeats
+    logic._previousSatoVesselness = None
+    logic.updateVesselnessVolume([])
+
+  fullTime, _ = timeCall(updateFullResolution, repeat)
+  results = {"shape": shape, "fullResolutionTime": fullTime}
+
+  for factor in factors:
+    previewLogic = RVXLiverSegmentationLogic()
+    previewLogic.setInputVolume(volume)
+    previewLogic.vesselnessFilterParameters.useROI = False
+    firstTime, _ = timeCall(lambda: previewLogic.updatePreviewVesselnessVolume([], factor))
+
+    def updateAlpha():
+      previewLogic.vesselnessFilterParameters.satoAlpha1 += 0.01
+      previewLogic.updatePreviewVesselnessVolume([], factor)
+
+    alphaTime, _ = timeCall(updateAlpha, repeat)
+    results["preview{}xFirstTime".format(factor)] = firstTime
+    results["preview{}xAlphaChangeTime".format(factor)] = alphaTime
+    previewLogic.removePreviewVesselnessVolume()
+    removeNodesFromMRMLScene([previewLogic._croppedInputVolume])
+
+  removeNodesFromMRMLScene([volume, logic.getCurrentVesselnessVolume(), logic._croppedInputVolume])
+  printBenchmark("Preview vesselness", results)
+  return results
+
+
+def benchmarkVesselnessUpdateOverhead(shape=(64, 64, 64), repeat=3):
+  """Measures the wall time of updateVesselnessVolume which is not spent in the vesselness filter (cropping, node
+  creation, normalization and caching). Before the update was made event driven, the overhead contained a fixed one
+  second sleep. Vesselness caches are disabled for the benchmark.
+
+  To run the benchmark, in the Slicer Python console :
+    from RVXLiverSegmentationTest.Benchmarks import benchmarkVesselnessUpdateOverhead
+    benchmarkVesselnessUpdateOverhead()
+
+  Returns
+  -------
+  Dict[str, float] - update and filter wall times in seconds and their difference
+  """
+  volume = createTubePhantomVolume(shape=shape)
+  logic = RVXLiverSegmentationLogic(vesselnessCacheMaxBytes=0, hessianCacheMaxBytes=0)
+  logic.setInputVolume(volume)
+  logic.vesselnessFilterParameters.useROI = False
+
+  # Accumulate the time spent in the vesselness filter during the update
+  filterTimes = []
+  satoVesselnessRawArray = logic._satoVesselnessRawArray
+
+  def timedSatoVesselnessRawArray(*args, **kwargs):
+    filterTime, result = timeCall(lambda: satoVesselnessRawArray(*args, **kwargs))
+    filterTimes.append(filterTime)
+    return result
+
+  logic._satoVesselnessRawArray = timedSatoVesselnessRawArray
+
+  def update():
+    # Disable the incremental vesselness reuse between repeats
+    logic._previousSatoVesselness = None
+    del filterTimes[:]
+    logic.updateVesselnessVolume([])
+    return sum(filterTimes)
+
+  overheads = []
+  for _ in range(repeat):
+    updateTime, filterTime = timeCall(update)
+    overheads.append((updateTime - filterTime, updateTime, filterTime))
+
+  overhead, updateTime, filterTime = min(overheads)
+  removeNodesFromMRMLScene([volume, logic.getCurrentVesselnessVolume(), logic._croppedInputVolume])
+
+  results = {"shape": shape, "updateTime": updateTime, "filterTime": filterTime, "overheadTime": overhead}
+  printBenchmark("Vesselness update overhead", results)
+  return results
+
+
+def benchmarkVesselnessNormalizationMemory(shape=(256, 256, 256)):
+  """Compares the peak memory allocated by the normalization of the unnormalized Sato output into the vesselness volume
+  node with the previous full array expression followed by updateVolumeFromArray. Peak allocations are expressed as a
+  multiple of the float32 volume size.
+
+  NumPy allocations are measured with tracemalloc. VTK allocations are not traced and the output volume buffer size is
+  added to the traced peak.
+
+  To run the benchmark, in the Slicer Python console :
+    from RVXLiverSegmentationTest.Benchmarks import benchmarkVesselnessNormalizationMemory
+    benchmarkVesselnessNormalizationMemory()
+
+  Returns
+  -------
+  Dict[str, float] - peak allocations relative to the volume size and wall times in seconds
+  """
+  import tracemalloc
+
+  modelVolume = createTubePhantomVolume(shape=(8, 8, 8))
+  output_array = np.random.RandomState(0).rand(*shape).astype(np.float32)
+  volumeBytes = output_array.nbytes
+  createdNodes = [modelVolume]
+
+  def expressionNormalization():
+    vesselness = createVolumeNodeBasedOnModel(modelVolume, "VesselnessFiltered", "vtkMRMLScalarVolumeNode")
+    normalized = (output_array - np.min(output_array)) / (np.max(output_array) - np.min(output_array))
+    slicer.util.updateVolumeFromArray(vesselness, normalized)
+    return vesselness
+
+  def bufferNormalization():
+    vesselness = createVolumeNodeBasedOnModel(modelVolume, "VesselnessFiltered", "vtkMRMLScalarVolumeNode")
+    normalizeArray(output_array, out=allocateVolumeArray(vesselness, output_array.shape))
+    slicer.util.arrayFromVolumeModified(vesselness)
+    return vesselness
+
+  def peakAllocation(function):
+    tracemalloc.start()
+    try:
+      elapsed, vesselness = timeCall(function)
+      _, tracedPeak = tracemalloc.get_traced_memory()
+    finally:
+      tracemalloc.stop()
+    createdNodes.append(vesselness)
+    return float(tracedPeak + slicer.util.arrayFromVolume(vesselness).nbytes) / volumeBytes, elapsed
+
+  expressionPeak, expressionTime = peakAllocation(expressionNormalization)
+  bufferPeak, bufferTime = peakAllocation(bufferNormalization)
+  np.testing.assert_array_almost_equal(slicer.util.arrayFromVolume(createdNodes[-2]),
+                                       slicer.util.arrayFromVolume(createdNodes[-1]))
+  removeNodesFromMRMLScene(createdNodes)
+
+  results = {"shape": shape, "expressionPeakOverVolumeSize": expressionPeak, "expressionTime": expressionTime,
+             "bufferPeakOverVolumeSize": bufferPeak, "bufferTime": bufferTime}
+  printBenchmark("Vesselness normalization memory", results)
+  return results
+
+
+def copyLevelSetImages(logic, memoryReport):
+  """Makes the level set runs of logic deep copy their input and output images, as the level set pipeline did before
+  sharing them. The copies are allocated for real and their bytes are added to memoryReport in the run of the copied
+  images. Used as the baseline of benchmarkLevelSetMemory. Deleting the _createLevelSetRun and
+  _finishLevelSetSegmentation attributes of logic restores the shared images.
+  """
+  createLevelSetRun = logic._createLevelSetRun
+  finishLevelSetSegmentation = logic._finishLevelSetSegmentation
+
+  def deepCopy(dataObject):
+    dataObjectCopy = dataObject.NewInstance()
+    dataObjectCopy.DeepCopy(dataObject)
+    return dataObjectCopy
+
+  def createCopyingLevelSetRun(seedsPositions, endPositions):
+    levelSetRun = createLevelSetRun(seedsPositions, endPositions)
+    levelSetRun.inputImage = deepCopy(levelSetRun.inputImage)
+    return levelSetRun
+
+  def finishCopyingLevelSetSegmentation(levelSetRun, report=None):
+    # Keep the VMTK outputs alive next to their copies until the end of the run, as the copying pipeline did
+    vmtkOutputs = [levelSetRun.initImageData, levelSetRun.evolImageData, levelSetRun.labelMap]
+    levelSetRun.initImageData, levelSetRun.evolImageData, levelSetRun.labelMap = map(deepCopy, vmtkOutputs)
+    result = finishLevelSetSegmentation(levelSetRun, report)
+    outVolume, outModel = result[2], result[3]
+    copies = {"inputCopy": levelSetRun.inputImage, "initializationCopy": levelSetRun.initImageData,
+              "evolutionCopy": levelSetRun.evolImageData, "labelMapCopy": levelSetRun.labelMap,
+              "outputLabelMapCopy": deepCopy(outVolume.GetImageData()),
+              "outputModelCopy": deepCopy(outModel.GetPolyData())}
+    for stageName, dataObject in copies.items():
+      memoryReport.add(stageName, vtkDataObjectBytes(dataObject))
+    return result
+
+  logic._createLevelSetRun = createCopyingLevelSetRun
+  logic._finishLevelSetSegmentation = finishCopyingLevelSetSegmentation
+
+
+def benchmarkLevelSetMemory(shape=(128, 128, 128), branchCount=20):
+  """Compares the bytes allocated by each stage of the level set segmentation for a tree of branchCount branches, run
+  one branch at a time as done by the one vessel per branch extraction strategies, with and without copies of the level
+  set images.
+
+  The baseline runs the full volume level set with per run deep copies of the vesselness input image and of the
+  initialization, evolution, label map, output label map and output model images, as the pipeline did before sharing
+  them. The shared run uses the images without copy. The level set caches are cleared before each configuration and
+  the peak and mean run bytes of both configurations are reported, along with the process peak resident memory.
+
+  To run the benchmark, in the Slicer Python console :
+    from RVXLiverSegmentationTest.Benchmarks import benchmarkLevelSetMemory
+    benchmarkLevelSetMemory()
+
+  Returns
+  -------
+  Dict[str, float] - allocated bytes per run and per stage of both configurations, and wall times in seconds
+  """
+  import resource
+
+  radii = (1.5, 3, 5)
+  volume = createTubePhantomVolume(shape=shape, radii=radii)
+  logic = RVXLiverSegmentationLogic()
+  logic.setInputVolume(volume)
+  logic.vesselnessFilterParameters.useROI = False
+  logic.updateVesselnessVolume([])
+  logic.levelSetParameters.useBranchROI = False
+  logic.levelSetParameters.useCroppedEvolution = False
+
+  def extractBranches():
+    for startPosition, endPosition in tubePhantomBranchPositions(shape, radii, branchCount):
+      removeNodesFromMRMLScene(logic.extractVesselVolumeFromPosition([startPosition], [endPosition]))
+
+  results = {"shape": shape, "branchCount": branchCount}
+  for prefix, copyImages in [("baseline", True), ("shared", False)]:
+    logic.levelSetCache.clear()
+    logic.levelSetInitializationCache.clear()
+    report = MemoryReport()
+    logic.levelSetMemoryReport = report
+    if copyImages:
+      copyLevelSetImages(logic, report)
+
+    elapsed, _ = timeCall(extractBranches)
+
+    if copyImages:
+      # Restore the class methods
+      del logic._createLevelSetRun
+      del logic._finishLevelSetSegmentation
+
+    results[prefix + "Time"] = elapsed
+    results[prefix + "PeakRunBytes"] = report.peakRunBytes
+    results[prefix + "MeanRunBytes"] = report.totalBytes // report.runCount
+    for row in report.rows():
+      results[prefix + row["stage"][0].upper() + row["stage"][1:] + "MeanBytes"] = row["meanBytes"]
+
+  removeNodesFromMRMLScene([volume, logic.getCurrentVesselnessVolume()])
+  results["peakRunBytesRatio"] = results["sharedPeakRunBytes"] / results["baselinePeakRunBytes"]
+  results["processPeakRssBytes"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+  printBenchmark("Level set memory", results)
+  return results
+
+
+def benchmarkParallelLevelSet(shape=(128, 128, 128), branchCount=20, workerCounts=(1, 2, 4, 8, 16)):
+  """Measures the wall time and the allocated bytes of the level set segmentation of branchCount tube phantom branches
+  depending on the level set worker count, as done by the one vessel per branch extraction strategies. The parallel
+  runs share the input and vesselness voxels and are expected to allocate as much as the serial runs.
+
+  To run the benchmark, in the Slicer Python console :
+    from RVXLiverSegmentationTest.Benchmarks import benchmarkParallelLevelSet
+    benchmarkParallelLevelSet()
+
+  Returns
+  -------
+  Dict[str, float] - wall times in seconds, speedups relative to the first worker count and allocated bytes
+  """
+  radii = (1.5, 3, 5)
+  volume = createTubePhantomVolume(shape=shape, radii=radii)
+  logic = RVXLiverSegmentationLogic()
+  logic.setInputVolume(volume)
+  logic.vesselnessFilterParameters.useROI = False
+  logic.updateVesselnessVolume([])
+  positionsList = [([startPosition], [endPosition]) for startPosition, endPosition in
+                   tubePhantomBranchPositions(shape, radii, branchCount)]
+
+  def extractBranches():
+    # The cached results would skip the level set runs
+    logic.levelSetCache.clear()
+    logic.levelSetInitializationCache.clear()
+    for _, outputs in logic.extractVesselVolumesFromPositions(positionsList):
+      removeNodesFromMRMLScene(outputs)
+
+  results = {"shape": shape, "branchCount": branchCount}
+  for workerCount in workerCounts:
+    logic.levelSetParameters.workerCount = workerCount
+    logic.levelSetMemoryReport = MemoryReport()
+    results["workers{}Time".format(workerCount)], _ = timeCall(extractBranches)
+    results["workers{}TotalBytes".format(workerCount)] = logic.levelSetMemoryReport.totalBytes
+
+  referenceTime = results["workers{}Time".format(workerCounts[0])]
+  for workerCount in workerCounts[1:]:
+    results["workers{}Speedup".format(workerCount)] = referenceTime / results["workers{}Time".format(workerCount)]
+
+  removeNodesFromMRMLScene([volume, logic.getCurrentVesselnessVolume()])
+  printBenchmark("Parallel level set", results)
+  return results
+
+
+def benchmarkLabelMapResampling(shape=(512, 512, 512), cropShape=(128, 128, 128), repeat=3):
+  """Compares the wall time of the SimpleITK nearest neighbor resampling of a cropped label map on the source grid with
+  the offset paste used when the cropped grid is aligned with the source grid.
+
+  To run the benchmark, in the Slicer Python console :
+    from RVXLiverSegmentationTest.Benchmarks import benchmarkLabelMapResampling
+    benchmarkLabelMapResampling()
+
+  Returns
+  -------
+  Dict[str, float] - wall times in seconds and speedup of the offset paste
+  """
+  sourceVolume = slicer.mrmlScene.AddNewNodeByClass("vtkMRMLScalarVolumeNode")
+  allocateVolumeArray(sourceVolume, shape, np.uint8).fill(0)
+  slicer.util.arrayFromVolumeModified(sourceVolume)
+
+  start = tuple((size - cropSize) // 2 for size, cropSize in zip(shape, cropShape))
+  stop = tuple(s + cropSize for s, cropSize in zip(start, cropShape))
+  labelMap = VolumeCrop(sourceVolume, start, stop).createVolumeNode("CroppedLabelMap", "vtkMRMLLabelMapVolumeNode")
+  label_array = allocateVolumeArray(labelMap, cropShape, np.uint8)
+  label_array[:] = (np.random.RandomState(0).random_sample(cropShape) > 0.5) * 5
+  slicer.util.arrayFromVolumeModified(labelMap)
+
+  def resampleWithSimpleITK():
+    removeNodesFromMRMLScene([RVXLiverSegmentationLogic.resampleLabelMapWithSimpleITK(sourceVolume, labelMap, "Out")])
+
+  def resample():
+    removeNodesFromMRMLScene([RVXLiverSegmentationLogic.resampleLabelMap(sourceVolume, labelMap, "Out")])
+
+  results = {"shape": shape, "cropShape": cropShape}
+  results["simpleITKTime"], _ = timeCall(resampleWithSimpleITK, repeat)
+  results["offsetPasteTime"], _ = timeCall(resample, repeat)
+  results["speedup"] = results["simpleITKTime"] / results["offsetPasteTime"]
+
+  removeNodesFromMRMLScene([sourceVolume, labelMap])
+  printBenchmark("Label map resampling", results)
+  return results
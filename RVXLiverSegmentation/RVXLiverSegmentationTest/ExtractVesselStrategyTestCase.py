@@ -1,7 +1,16 @@
 import unittest
 
+import numpy as np
+import slicer
+
 from RVXLiverSegmentationLib import ExtractOneVesselPerParentAndSubChildNode, ExtractOneVesselPerParentChildNode, \
-  VesselBranchTree, VesselSeedPoints, ExtractOneVesselPerBranch, PlaceStatus
+  VesselBranchTree, VesselSeedPoints, ExtractOneVesselPerBranch, PlaceStatus, LabelMapMerger, removeNodesFromMRMLScene
+
+
+def createLabelMapVolume(array):
+  volume = slicer.mrmlScene.AddNewNodeByClass("vtkMRMLLabelMapVolumeNode")
+  slicer.util.updateVolumeFromArray(volume, array)
+  return volume
 
 
 class ExtractVesselStrategyTestCase(unittest.TestCase):
@@ -168,3 +177,76 @@ class ExtractVesselStrategyTestCase(unittest.TestCase):
       VesselSeedPoints(posDict, ("n20", "n32"))]
 
     self.assertEqual(sorted(expBranchPairs), sorted(actPairs))
+
+  def testLabelMapMergerOrsTheLabelValuesInAUint8Volume(self):
+    shape = (16, 20, 24)
+    arrays = [np.zeros(shape, dtype=np.int16) for _ in range(3)]
+    arrays[0][2:6, 3:8, 4:10] = 5
+    arrays[1][4:12, 10:15, 8:20] = 5
+    arrays[1][0, 0, 0] = 1
+    volumes = [createLabelMapVolume(array) for array in arrays]
+
+    merger = LabelMapMerger("merged")
+    for volume in volumes:
+      merger.add(volume)
+    outVolume, outModel = merger.finish()
+
+    outArray = slicer.util.arrayFromVolume(outVolume)
+    self.assertEqual(np.uint8, outArray.dtype)
+    np.testing.assert_array_equal(arrays[0] | arrays[1] | arrays[2], outArray)
+    self.assertGreater(outModel.GetPolyData().GetNumberOfPoints(), 0)
+    self.assertFalse(LabelMapMerger.isLabeledVolume(outVolume))
+    removeNodesFromMRMLScene(volumes + [outVolume, outModel])
+
+  def testLabelMapMergerRaisesErrorWhenVolumesHaveDifferentShapesOrNoVolumeIsAdded(self):
+    volumes = [createLabelMapVolume(np.ones(shape, dtype=np.uint8)) for shape in [(4, 4, 4), (4, 4, 5)]]
+    merger = LabelMapMerger("merged")
+    merger.add(volumes[0])
+    with self.assertRaises(ValueError):
+      merger.add(volumes[1])
+
+    with self.assertRaises(ValueError):
+      LabelMapMerger("empty").finish()
+    removeNodesFromMRMLScene(volumes + list(slicer.util.getNodes("merged*").values()))
+
+  def testLabeledLabelMapMergerKeepsTheLowestLabelIdOnOverlapsWhateverTheOrder(self):
+    shape = (16, 20, 24)
+    arrays = [np.zeros(shape, dtype=np.uint8) for _ in range(3)]
+    arrays[0][2:8, 3:8, 4:10] = 5
+    arrays[1][4:12, 5:15, 8:20] = 5
+    arrays[2][10:14, 2:6, 2:6] = 5
+    volumes = [createLabelMapVolume(array) for array in arrays]
+
+    mergedArrays = []
+    for order in [(0, 1, 2), (2, 1, 0)]:
+      merger = LabelMapMerger("merged", labelNames=["n10", "n20", "n30"])
+      for i in order:
+        merger.add(volumes[i], labelId=i + 1)
+      outVolume, outModel = merger.finish()
+      mergedArrays.append(slicer.util.arrayFromVolume(outVolume).copy())
+      self.assertTrue(LabelMapMerger.isLabeledVolume(outVolume))
+
+      colorTable = outVolume.GetDisplayNode().GetColorNode()
+      self.assertEqual(["n10", "n20", "n30"], [colorTable.GetColorName(labelId) for labelId in range(1, 4)])
+      removeNodesFromMRMLScene([outVolume, outModel, colorTable])
+
+    self.assertEqual(np.uint8, mergedArrays[0].dtype)
+    np.testing.assert_array_equal(mergedArrays[0], mergedArrays[1])
+    expected = np.zeros(shape, dtype=np.uint8)
+    for labelId in [3, 2, 1]:
+      expected[arrays[labelId - 1] != 0] = labelId
+    np.testing.assert_array_equal(expected, mergedArrays[0])
+    removeNodesFromMRMLScene(volumes)
+
+  def testLabeledLabelMapMergerUsesUint16WhenLabelsDontFitInUint8(self):
+    volume = createLabelMapVolume(np.ones((4, 4, 4), dtype=np.uint8))
+    merger = LabelMapMerger("merged", labelNames=["n%d" % i for i in range(300)])
+    with self.assertRaises(ValueError):
+      merger.add(volume)
+
+    merger.add(volume, labelId=300)
+    outVolume, outModel = merger.finish()
+    outArray = slicer.util.arrayFromVolume(outVolume)
+    self.assertEqual(np.uint16, outArray.dtype)
+    self.assertTrue(np.all(outArray == 300))
+    removeNodesFromMRMLScene([volume, outVolume, outModel, outVolume.GetDisplayNode().GetColorNode()])
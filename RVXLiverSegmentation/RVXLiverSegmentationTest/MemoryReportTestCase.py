@@ -0,0 +1,41 @@
+import unittest
+
+from RVXLiverSegmentationLib import MemoryReport
+
+
+class MemoryReportTestCase(unittest.TestCase):
+  def testStageBytesAreAccumulatedOverRuns(self):
+    report = MemoryReport()
+    for _ in range(3):
+      report.startRun()
+      report.add("initialization", 100)
+      report.add("evolution", 200)
+
+    self.assertEqual(3, report.runCount)
+    self.assertEqual(300, report.stageBytes("initialization"))
+    self.assertEqual(600, report.stageBytes("evolution"))
+    self.assertEqual(0, report.stageBytes("labelMap"))
+    self.assertEqual(900, report.totalBytes)
+
+  def testPeakIsTheLargestRunTotal(self):
+    report = MemoryReport()
+    for runBytes in [[10, 20], [50, 5], [1]]:
+      report.startRun()
+      for nbytes in runBytes:
+        report.add("stage", nbytes)
+
+    self.assertEqual(55, report.peakRunBytes)
+
+  def testRowsContainStageCountsAndMeanBytes(self):
+    report = MemoryReport()
+    report.startRun()
+    report.add("initialization", 100)
+    report.add("evolution", 300)
+    report.startRun()
+    report.add("evolution", 100)
+
+    rows = report.rows()
+    self.assertEqual(["initialization", "evolution"], [row["stage"] for row in rows])
+    self.assertEqual(2, rows[1]["count"])
+    self.assertEqual(400, rows[1]["totalBytes"])
+    self.assertEqual(200, rows[1]["meanBytes"])
@@ -3,9 +3,14 @@ import unittest
 
 import numpy as np
 import slicer
+from vtk.util.numpy_support import vtk_to_numpy
 
-from RVXLiverSegmentationLib import RVXLiverSegmentationLogic, GeometryExporter, getVolumeIJKToRASDirectionMatrixAsNumpyArray
-from .TestUtils import TemporaryDir, createNonEmptyVolume, createNonEmptyModel
+from RVXLiverSegmentationLib import RVXLiverSegmentationLogic, GeometryExporter, getVolumeIJKToRASDirectionMatrixAsNumpyArray, \
+  VesselnessFilterParameters, parameterGrid, BackgroundTask, TaskProgress, TaskCancelledError, \
+  getVolumeIndexBoundsInSource, getAlignedVolumeIndexBoundsInSource, MemoryReport, removeNodesFromMRMLScene, \
+  VolumeCrop, createDisplayNodeIfNecessary
+from .TestUtils import TemporaryDir, createNonEmptyVolume, createNonEmptyModel, createTubePhantomVolume, \
+  tubePhantomBranchPositions
 
 
 def prepareEndToEndTest():
@@ -71,6 +76,593 @@ class RVXLiverSegmentationTestCase(unittest.TestCase):
     np.testing.assert_array_almost_equal(sourceVolume.GetImageData().GetDimensions(),
                                          outVolume.GetImageData().GetDimensions())
 
+  def testBranchROILevelSetSegmentationIsRestrictedToTheBranchRegion(self):
+    sourceVolume, startPosition, endPosition = prepareEndToEndTest()
+    logic = RVXLiverSegmentationLogic()
+    logic.setInputVolume(sourceVolume)
+    logic.vesselnessFilterParameters.minROIExtent = 100
+    logic.updateVesselnessVolume([startPosition, endPosition])
+    logic.levelSetParameters.useBranchROI = True
+
+    # The branch region is a view on the vesselness volume smaller than the vesselness ROI
+    branchCrop = logic._branchVesselnessCrop([startPosition, endPosition])
+    vesselnessArray = slicer.util.arrayFromVolume(logic.getCurrentVesselnessVolume())
+    self.assertTrue(np.shares_memory(branchCrop.array, vesselnessArray))
+    self.assertLess(branchCrop.array.size, vesselnessArray.size)
+
+    _, _, outVolume, _ = logic.extractVesselVolumeFromPosition([startPosition], [endPosition])
+    self.assertEqual(sourceVolume.GetImageData().GetDimensions(), outVolume.GetImageData().GetDimensions())
+    self.assertEqual(0, len(slicer.util.getNodes("BranchVesselness*")))
+
+    # Segmented voxels are inside the branch region
+    outArray = slicer.util.arrayFromVolume(outVolume)
+    self.assertGreater(np.count_nonzero(outArray), 0)
+    vesselnessStart, _ = getVolumeIndexBoundsInSource(sourceVolume, logic.getCurrentVesselnessVolume())
+    start = [s + offset for s, offset in zip(branchCrop.start, vesselnessStart)]
+    stop = [s + offset for s, offset in zip(branchCrop.stop, vesselnessStart)]
+    self.assertEqual(np.count_nonzero(outArray),
+                     np.count_nonzero(outArray[tuple(slice(s, e) for s, e in zip(start, stop))]))
+
+  def testBranchROIMarginIsScaledWithTheVesselnessVolumeSpacing(self):
+    sourceVolume = createTubePhantomVolume(shape=(64, 64, 64))
+    sourceVolume.SetSpacing(0.5, 0.5, 0.5)
+    logic = RVXLiverSegmentationLogic()
+    logic.setInputVolume(sourceVolume)
+    logic.vesselnessFilterParameters.useROI = False
+    logic.updateVesselnessVolume([])
+
+    # The margin is expressed in voxels and covers the same number of voxels around the nodes for any spacing
+    logic.vesselnessFilterParameters.maximumDiameter = 7
+    logic.levelSetParameters.branchROIMarginFactor = 2
+    branchCrop = logic._branchVesselnessCrop([[16, 16, 12], [16, 16, 20]])
+    self.assertEqual((32 - 14, 32 + 14 + 1), (branchCrop.start[2], branchCrop.stop[2]))
+    self.assertEqual((24 - 14, 40 + 14 + 1), (branchCrop.start[0], branchCrop.stop[0]))
+
+  def testCroppedEvolutionSegmentationIsPastedInTheSourceVolumeGrid(self):
+    sourceVolume, startPosition, endPosition = prepareEndToEndTest()
+    logic = RVXLiverSegmentationLogic()
+    logic.setInputVolume(sourceVolume)
+    logic.updateVesselnessVolume([startPosition, endPosition])
+    logic.levelSetParameters.useCroppedEvolution = True
+
+    _, _, outVolume, outModel = logic.extractVesselVolumeFromPosition([startPosition], [endPosition])
+    self.assertNotEqual(0, outModel.GetPolyData().GetNumberOfCells())
+    self.assertEqual(0, len(slicer.util.getNodes("LevelSetEvolutionSource*")))
+
+    # Same geometry as the source volume
+    np.testing.assert_array_almost_equal(sourceVolume.GetOrigin(), outVolume.GetOrigin())
+    np.testing.assert_array_almost_equal(sourceVolume.GetSpacing(), outVolume.GetSpacing())
+    self.assertEqual(sourceVolume.GetImageData().GetDimensions(), outVolume.GetImageData().GetDimensions())
+
+    # Segmented voxels are inside the vesselness region
+    outArray = slicer.util.arrayFromVolume(outVolume)
+    start, stop = getVolumeIndexBoundsInSource(sourceVolume, logic.getCurrentVesselnessVolume())
+    self.assertGreater(np.count_nonzero(outArray), 0)
+    self.assertEqual(np.count_nonzero(outArray),
+                     np.count_nonzero(outArray[tuple(slice(s, e) for s, e in zip(start, stop))]))
+
+  def testResampledLabelMapOfAlignedCropIsPastedAndMatchesSimpleITKResampling(self):
+    sourceVolume = createTubePhantomVolume(shape=(48, 40, 32))
+    start, stop = (4, 6, 8), (20, 30, 24)
+    labelMap = VolumeCrop(sourceVolume, start, stop).createVolumeNode("CroppedLabelMap", "vtkMRMLLabelMapVolumeNode",
+                                                                      copyVoxels=True)
+    slicer.util.updateVolumeFromArray(labelMap, (slicer.util.arrayFromVolume(labelMap) > 0).astype(np.uint8) * 5)
+    self.assertEqual((start, stop), getAlignedVolumeIndexBoundsInSource(sourceVolume, labelMap))
+
+    pasted = RVXLiverSegmentationLogic.resampleLabelMap(sourceVolume, labelMap, "Pasted")
+    resampled = RVXLiverSegmentationLogic.resampleLabelMapWithSimpleITK(sourceVolume, labelMap, "Resampled")
+    self.assertGreater(np.count_nonzero(slicer.util.arrayFromVolume(pasted)), 0)
+    np.testing.assert_array_equal(slicer.util.arrayFromVolume(resampled), slicer.util.arrayFromVolume(pasted))
+
+    # Grids shifted by half a voxel or with a different spacing are not aligned
+    labelMap.SetOrigin([x + 0.5 for x in labelMap.GetOrigin()])
+    self.assertIsNone(getAlignedVolumeIndexBoundsInSource(sourceVolume, labelMap))
+    labelMap.SetOrigin(sourceVolume.GetOrigin())
+    labelMap.SetSpacing(2, 2, 2)
+    self.assertIsNone(getAlignedVolumeIndexBoundsInSource(sourceVolume, labelMap))
+
+  def testLevelSetMemoryReportContainsTheSegmentationStages(self):
+    sourceVolume, startPosition, endPosition = prepareEndToEndTest()
+    logic = RVXLiverSegmentationLogic()
+    logic.setInputVolume(sourceVolume)
+    logic.updateVesselnessVolume([startPosition, endPosition])
+    logic.levelSetMemoryReport = MemoryReport()
+
+    logic.extractVesselVolumeFromPosition([startPosition], [endPosition])
+    report = logic.levelSetMemoryReport
+    self.assertEqual(1, report.runCount)
+    for stage in ["initialization", "evolution", "labelMap", "outputLabelMap", "outputModel"]:
+      self.assertGreater(report.stageBytes(stage), 0)
+    self.assertEqual(report.totalBytes, report.peakRunBytes)
+
+  def testParallelLevelSetRunsMatchSerialRunsOnThePhantomTree(self):
+    shape, radii = (64, 64, 64), (1.5, 3, 5)
+    sourceVolume = createTubePhantomVolume(shape=shape, radii=radii)
+    logic = RVXLiverSegmentationLogic()
+    logic.setInputVolume(sourceVolume)
+    logic.vesselnessFilterParameters.useROI = False
+    logic.updateVesselnessVolume([])
+
+    # Consecutive branches along each tube of the phantom
+    positionsList = [([startPosition], [endPosition]) for startPosition, endPosition in
+                     tubePhantomBranchPositions(shape, radii, branchCount=20)]
+
+    segmentations, runBytes = [], []
+    for workerCount in [1, 4, 8]:
+      logic.levelSetParameters.workerCount = workerCount
+      logic.levelSetCache.clear()
+      logic.levelSetInitializationCache.clear()
+      logic.levelSetMemoryReport = MemoryReport()
+      arrays = {}
+      for i, (seedsNodes, stoppersNodes, outVolume, outModel) in logic.extractVesselVolumesFromPositions(positionsList):
+        arrays[i] = slicer.util.arrayFromVolume(outVolume).copy()
+        removeNodesFromMRMLScene([seedsNodes, stoppersNodes, outVolume, outModel])
+      segmentations.append(arrays)
+
+      # Parallel runs don't allocate more than serial runs
+      self.assertEqual(len(positionsList), logic.levelSetMemoryReport.runCount)
+      runBytes.append(logic.levelSetMemoryReport.totalBytes)
+    self.assertEqual(1, len(set(runBytes)))
+
+    # The runs share the vesselness and input voxels
+    levelSetRun = logic._createLevelSetRun(*positionsList[0])
+    try:
+      self.assertTrue(np.shares_memory(vtk_to_numpy(levelSetRun.inputImage.GetPointData().GetScalars()),
+                                       slicer.util.arrayFromVolume(logic.getCurrentVesselnessVolume())))
+      self.assertTrue(np.shares_memory(vtk_to_numpy(levelSetRun.evolutionSourceImage.GetPointData().GetScalars()),
+                                       slicer.util.arrayFromVolume(sourceVolume)))
+    finally:
+      levelSetRun.removeNodes()
+
+    self.assertEqual(sorted(segmentations[0].keys()), list(range(len(positionsList))))
+    for i in range(len(positionsList)):
+      self.assertGreater(np.count_nonzero(segmentations[0][i]), 0)
+      for parallelSegmentations in segmentations[1:]:
+        np.testing.assert_array_equal(segmentations[0][i], parallelSegmentations[i])
+
+  def testLevelSetReExtractionOnlyComputesRunsWithMovedPositions(self):
+    sourceVolume = createTubePhantomVolume(shape=(64, 64, 64))
+    logic = RVXLiverSegmentationLogic()
+    logic.setInputVolume(sourceVolume)
+    logic.vesselnessFilterParameters.useROI = False
+    logic.updateVesselnessVolume([])
+    logic.levelSetMemoryReport = MemoryReport()
+
+    positionsList = [([[32, 16, 8]], [[32, 16, 32]]), ([[32, 16, 32]], [[32, 16, 56]]),
+                     ([[32, 8, 32]], [[32, 32, 32]]), ([[8, 32, 48]], [[32, 32, 48]])]
+
+    def extractArrays(positions):
+      arrays = {}
+      for i, (seedsNodes, stoppersNodes, outVolume, outModel) in logic.extractVesselVolumesFromPositions(positions):
+        arrays[i] = slicer.util.arrayFromVolume(outVolume).copy()
+        self.assertGreater(outModel.GetPolyData().GetNumberOfPoints(), 0)
+        removeNodesFromMRMLScene([seedsNodes, stoppersNodes, outVolume, outModel])
+      return arrays
+
+    firstArrays = extractArrays(positionsList)
+    self.assertEqual(len(positionsList), logic.levelSetMemoryReport.runCount)
+
+    # Moving the end of the last branch only computes the last branch again
+    movedPositionsList = positionsList[:-1] + [([[8, 32, 48]], [[36, 32, 48]])]
+    movedArrays = extractArrays(movedPositionsList)
+    self.assertEqual(len(positionsList) + 1, logic.levelSetMemoryReport.runCount)
+    self.assertEqual(len(positionsList) - 1, logic.levelSetCache.hits)
+    for i in range(len(positionsList) - 1):
+      np.testing.assert_array_equal(firstArrays[i], movedArrays[i])
+
+    # Changing the level set parameters invalidates the cached results
+    logic.levelSetParameters.iterationNumber += 1
+    extractArrays(positionsList[:1])
+    self.assertEqual(len(positionsList) + 2, logic.levelSetMemoryReport.runCount)
+
+  def testLevelSetInitializationIsReusedWhenOnlyEvolutionParametersChange(self):
+    sourceVolume = createTubePhantomVolume(shape=(64, 64, 64))
+    logic = RVXLiverSegmentationLogic()
+    logic.setInputVolume(sourceVolume)
+    logic.vesselnessFilterParameters.useROI = False
+    logic.updateVesselnessVolume([])
+    seedsPositions, endPositions = [[32, 16, 8]], [[32, 16, 56]]
+
+    def extractArray():
+      seedsNodes, stoppersNodes, outVolume, outModel = logic.extractVesselVolumeFromPosition(seedsPositions,
+                                                                                             endPositions)
+      array = slicer.util.arrayFromVolume(outVolume).copy()
+      removeNodesFromMRMLScene([seedsNodes, stoppersNodes, outVolume, outModel])
+      return array
+
+    extractArray()
+    logic.levelSetParameters.iterationNumber += 5
+    logic.levelSetParameters.curvature -= 20
+    reusedInitializationArray = extractArray()
+    self.assertEqual(1, logic.levelSetInitializationCache.misses)
+    self.assertEqual(1, logic.levelSetInitializationCache.hits)
+
+    # The evolution from the cached initialization matches the evolution from a new initialization
+    logic.levelSetCache.clear()
+    logic.levelSetInitializationCache.clear()
+    np.testing.assert_array_equal(reusedInitializationArray, extractArray())
+
+    # Changing the initialization method invalidates the cached initialization
+    logic.levelSetParameters.initializationMethod = "fastmarching"
+    extractArray()
+    self.assertEqual(3, logic.levelSetInitializationCache.misses)
+
+  def testVesselnessIsReadFromCacheWhenInputAndParametersAreUnchanged(self):
+    sourceVolume = createNonEmptyVolume()
+    logic = RVXLiverSegmentationLogic()
+    logic.setInputVolume(sourceVolume)
+    logic.vesselnessFilterParameters.useROI = False
+
+    logic.updateVesselnessVolume([])
+    firstArray = slicer.util.arrayFromVolume(logic.getCurrentVesselnessVolume()).copy()
+    logic.updateVesselnessVolume([])
+
+    self.assertEqual(1, logic.vesselnessCache.misses)
+    self.assertEqual(1, logic.vesselnessCache.hits)
+    np.testing.assert_array_almost_equal(firstArray, slicer.util.arrayFromVolume(logic.getCurrentVesselnessVolume()))
+
+    # Changing the filter parameters invalidates the cached vesselness
+    logic.vesselnessFilterParameters.satoSigma = 1
+    logic.updateVesselnessVolume([])
+    self.assertEqual(2, logic.vesselnessCache.misses)
+
+    # Execution only parameters don't invalidate the cached vesselness
+    logic.vesselnessFilterParameters.workerCount = 3
+    logic.vesselnessFilterParameters.useTiling = True
+    logic.vesselnessFilterParameters.tileMaxPeakMemoryBytes = 1024 ** 2
+    logic.updateVesselnessVolume([])
+    self.assertEqual(2, logic.vesselnessCache.misses)
+    self.assertEqual(2, logic.vesselnessCache.hits)
+
+  def testVesselnessComputedInBackgroundTaskMatchesSynchronousUpdate(self):
+    sourceVolume = createTubePhantomVolume(shape=(32, 32, 32))
+    logic = RVXLiverSegmentationLogic(vesselnessCacheMaxBytes=0)
+    logic.setInputVolume(sourceVolume)
+    logic.vesselnessFilterParameters.useROI = False
+    logic.vesselnessFilterParameters.satoSigmas = [1., 2., 3.]
+
+    logic.updateVesselnessVolume([])
+    expected = slicer.util.arrayFromVolume(logic.getCurrentVesselnessVolume()).copy()
+
+    logic._previousSatoVesselness = None
+    task = BackgroundTask(logic.prepareVesselnessUpdate([]), onFinished=logic.finishVesselnessUpdate)
+    task.start()
+    task.wait()
+    task.poll()
+
+    self.assertEqual(1., task.progress.fraction)
+    np.testing.assert_array_almost_equal(expected, slicer.util.arrayFromVolume(logic.getCurrentVesselnessVolume()))
+
+  def testCancelledVesselnessUpdateDoesNotCreateVesselnessVolume(self):
+    sourceVolume = createTubePhantomVolume(shape=(32, 32, 32))
+    logic = RVXLiverSegmentationLogic()
+    logic.setInputVolume(sourceVolume)
+    logic.vesselnessFilterParameters.useROI = False
+
+    progress = TaskProgress()
+    progress.cancel()
+    with self.assertRaises(TaskCancelledError):
+      logic.updateVesselnessVolume([], progressCallback=progress)
+
+    self.assertIsNone(logic.getCurrentVesselnessVolume())
+    self.assertEqual(0, len(logic.vesselnessCache))
+
+    # Next update is not affected by the cancelled update
+    self.assertTrue(logic.updateVesselnessVolume([]))
+    self.assertIsNotNone(logic.getCurrentVesselnessVolume())
+
+  def testSingleSigmaVesselnessReportsIntermediateProgressAndCanBeCancelled(self):
+    sourceVolume = createTubePhantomVolume(shape=(32, 32, 32))
+    logic = RVXLiverSegmentationLogic(vesselnessCacheMaxBytes=0, hessianCacheMaxBytes=0)
+    logic.setInputVolume(sourceVolume)
+    logic.vesselnessFilterParameters.useROI = False
+
+    for backend in ["itk", "numpy"]:
+      logic.vesselnessFilterParameters.satoBackend = backend
+      logic._previousSatoVesselness = None
+      fractions = []
+      logic.updateVesselnessVolume([], progressCallback=lambda done, total: fractions.append(float(done) / total))
+      self.assertGreater(len(fractions), 2)
+      self.assertEqual(sorted(fractions), fractions)
+      self.assertEqual(1., fractions[-1])
+
+      # Cancel the computation after the first intermediate progress report
+      def cancelAfterFirstReport(done, total):
+        if done > 0:
+          raise TaskCancelledError()
+
+      logic._previousSatoVesselness = None
+      with self.assertRaises(TaskCancelledError):
+        logic.updateVesselnessVolume([], progressCallback=cancelAfterFirstReport)
+
+  def testQuantizedVesselnessMatchesFloatVesselnessWithinQuantizationStep(self):
+    sourceVolume = createTubePhantomVolume(shape=(32, 32, 32))
+    logic = RVXLiverSegmentationLogic()
+    logic.setInputVolume(sourceVolume)
+    logic.vesselnessFilterParameters.useROI = False
+
+    logic.updateVesselnessVolume([])
+    expected = slicer.util.arrayFromVolume(logic.getCurrentVesselnessVolume()).copy()
+    self.assertEqual(1., logic.getVesselnessScaleFactor(logic.getCurrentVesselnessVolume()))
+
+    for storageType, maxValue in [("uint16", 65535), ("uint8", 255)]:
+      logic.vesselnessFilterParameters.vesselnessStorageType = storageType
+      for _ in range(2):  # Computed then read from the vesselness cache
+        logic.updateVesselnessVolume([])
+        vesselness = logic.getCurrentVesselnessVolume()
+        quantized = slicer.util.arrayFromVolume(vesselness)
+        scaleFactor = logic.getVesselnessScaleFactor(vesselness)
+
+        self.assertEqual(np.dtype(storageType), quantized.dtype)
+        self.assertAlmostEqual(1. / maxValue, scaleFactor)
+        np.testing.assert_allclose(expected, quantized * scaleFactor, atol=0.5 / maxValue + 1e-6)
+
+  def testQuantizedVesselnessVolumeRenderingPresetIsScaledToTheStoredValues(self):
+    sourceVolume = createTubePhantomVolume(shape=(32, 32, 32))
+    logic = RVXLiverSegmentationLogic()
+    logic.setInputVolume(sourceVolume)
+    logic.vesselnessFilterParameters.useROI = False
+    logic.vesselnessFilterParameters.vesselnessStorageType = "uint8"
+    logic.updateVesselnessVolume([])
+    vesselness = logic.getCurrentVesselnessVolume()
+    scale = 1. / logic.getVesselnessScaleFactor(vesselness)
+
+    preset = slicer.modules.volumerendering.logic().GetPresetByName("Vesselness").GetVolumeProperty()
+    displayNode = createDisplayNodeIfNecessary(vesselness, "Vesselness", presetScalarScale=scale)
+    volumeProperty = displayNode.GetVolumePropertyNode().GetVolumeProperty()
+
+    # The rendered range covers the uint8 values instead of the normalized vesselness values
+    self.assertAlmostEqual(255., scale)
+    for presetFunction, function in [(preset.GetRGBTransferFunction(), volumeProperty.GetRGBTransferFunction()),
+                                     (preset.GetScalarOpacity(), volumeProperty.GetScalarOpacity())]:
+      self.assertEqual(presetFunction.GetSize(), function.GetSize())
+      np.testing.assert_array_almost_equal(np.array(presetFunction.GetRange()) * scale, function.GetRange())
+    self.assertGreater(volumeProperty.GetScalarOpacity().GetRange()[1], 1.)
+
+  def testQuantizedVesselnessSegmentationIsEquivalentToFloatVesselnessSegmentation(self):
+    sourceVolume, startPosition, endPosition = prepareEndToEndTest()
+    logic = RVXLiverSegmentationLogic()
+    logic.setInputVolume(sourceVolume)
+
+    segmentations = []
+    for storageType in ["float32", "uint8"]:
+      logic.vesselnessFilterParameters.vesselnessStorageType = storageType
+      logic.updateVesselnessVolume([startPosition, endPosition])
+      _, _, outVolume, _ = logic.extractVesselVolumeFromPosition([startPosition], [endPosition])
+      segmentations.append(slicer.util.arrayFromVolume(outVolume) > 0)
+
+    intersection = np.count_nonzero(segmentations[0] & segmentations[1])
+    dice = 2. * intersection / (np.count_nonzero(segmentations[0]) + np.count_nonzero(segmentations[1]))
+    self.assertGreater(dice, 0.95)
+
+  def testIsotropicResamplingVesselnessIsIndependentOfSliceThickness(self):
+    # Tube aligned with the slice axis sampled with 1 mm and 2 mm slices
+    thinVolume = createTubePhantomVolume(shape=(32, 32, 32), radii=(3,))
+    thickVolume = createTubePhantomVolume(shape=(32, 32, 32), radii=(3,))
+    slicer.util.updateVolumeFromArray(thickVolume, slicer.util.arrayFromVolume(thinVolume)[::2].copy())
+    thickVolume.SetSpacing(1, 1, 2)
+
+    vesselness = []
+    for volume in [thinVolume, thickVolume]:
+      logic = RVXLiverSegmentationLogic()
+      logic.setInputVolume(volume)
+      logic.vesselnessFilterParameters.useROI = False
+      logic.vesselnessFilterParameters.useIsotropicResampling = True
+      logic.vesselnessFilterParameters.isotropicSpacing = 1.
+      logic.vesselnessFilterParameters.satoSigma = 2.
+      logic.updateVesselnessVolume([])
+      vesselness.append(slicer.util.arrayFromVolume(logic.getCurrentVesselnessVolume()).copy())
+
+    self.assertEqual((16, 32, 32), vesselness[1].shape)
+    np.testing.assert_allclose(vesselness[0][::2][2:-2], vesselness[1][2:-2], atol=0.05)
+
+  def testSatoHessianIsReusedWhenOnlyAlphaParametersChange(self):
+    sourceVolume = createNonEmptyVolume()
+    logic = RVXLiverSegmentationLogic()
+    logic.setInputVolume(sourceVolume)
+    logic.vesselnessFilterParameters.useROI = False
+
+    logic.updateVesselnessVolume([])
+    logic.vesselnessFilterParameters.satoAlpha1 = 0.4
+    logic.updateVesselnessVolume([])
+
+    self.assertEqual(1, logic.hessianCache.misses)
+    self.assertEqual(1, logic.hessianCache.hits)
+    self.assertEqual(2, logic.vesselnessCache.misses)
+
+  def testHessianCacheEntriesAreSizedFromTheSatoBackendHessianType(self):
+    sourceVolume = createNonEmptyVolume()
+    voxelCount = slicer.util.arrayFromVolume(sourceVolume).size
+    for backend, bytesPerVoxel in [("itk", 48), ("numpy", 24)]:
+      logic = RVXLiverSegmentationLogic()
+      logic.setInputVolume(sourceVolume)
+      logic.vesselnessFilterParameters.useROI = False
+      logic.vesselnessFilterParameters.satoBackend = backend
+      logic.updateVesselnessVolume([])
+
+      self.assertEqual(bytesPerVoxel, logic.vesselnessFilterParameters.getHessianBytesPerVoxel())
+      self.assertEqual(voxelCount * bytesPerVoxel, logic.hessianCache.currentBytes)
+
+  def testMultiScaleSatoVesselnessIsNormalizedAndIndependentOfWorkerCount(self):
+    sourceVolume = createTubePhantomVolume(shape=(32, 32, 32))
+    logic = RVXLiverSegmentationLogic()
+    logic.vesselnessFilterParameters.satoSigmas = [1., 2., 4.]
+
+    logic.vesselnessFilterParameters.workerCount = 1
+    serialArray = slicer.util.arrayFromVolume(logic._applySatoVesselnessFilter(sourceVolume))
+
+    logic.vesselnessFilterParameters.workerCount = 3
+    parallelArray = slicer.util.arrayFromVolume(logic._applySatoVesselnessFilter(sourceVolume))
+
+    np.testing.assert_array_almost_equal(serialArray, parallelArray)
+    self.assertAlmostEqual(0, np.min(parallelArray))
+    self.assertAlmostEqual(1, np.max(parallelArray))
+
+  def testTiledSatoVesselnessMatchesFullVolumeVesselness(self):
+    sourceVolume = createTubePhantomVolume(shape=(48, 40, 32))
+    logic = RVXLiverSegmentationLogic()
+    fullArray = slicer.util.arrayFromVolume(logic._applySatoVesselnessFilter(sourceVolume))
+
+    # Force multiple tiles processed concurrently
+    logic.vesselnessFilterParameters.useTiling = True
+    logic.vesselnessFilterParameters.tileMaxPeakMemoryBytes = \
+      logic.vesselnessFilterParameters.getSatoTileBytesPerVoxel() * 24 ** 3 * 2
+    logic.vesselnessFilterParameters.workerCount = 2
+    tiledArray = slicer.util.arrayFromVolume(logic._applySatoVesselnessFilter(sourceVolume))
+
+    np.testing.assert_allclose(fullArray, tiledArray, atol=1e-2)
+
+  def testNumpyTiledSatoVesselnessWorkingMemoryStaysBelowTheTilePeakMemoryCap(self):
+    import tracemalloc
+
+    np_array = slicer.util.arrayFromVolume(createTubePhantomVolume(shape=(64, 64, 64))).astype(np.float32)
+    mask = np.ones(np_array.shape, dtype=bool)
+    mask[:10] = False
+    logic = RVXLiverSegmentationLogic()
+    logic.vesselnessFilterParameters.satoBackend = "numpy"
+    logic.vesselnessFilterParameters.tileMaxPeakMemoryBytes = 8 * 1024 ** 2
+
+    for workerCount in [1, 2]:
+      logic.vesselnessFilterParameters.workerCount = workerCount
+      tracemalloc.start()
+      try:
+        output_array = logic._tiledSatoVesselnessArray(np_array, [2.], mask)
+        _, peakBytes = tracemalloc.get_traced_memory()
+      finally:
+        tracemalloc.stop()
+
+      # The output array is allocated once for the whole volume and is not part of the tiles working memory
+      self.assertLessEqual(peakBytes - output_array.nbytes, logic.vesselnessFilterParameters.tileMaxPeakMemoryBytes)
+
+  def testNumpySatoBackendMatchesItkBackend(self):
+    sourceVolume = createTubePhantomVolume(shape=(48, 48, 48))
+    logic = RVXLiverSegmentationLogic()
+    itkArray = slicer.util.arrayFromVolume(logic._applySatoVesselnessFilter(sourceVolume))
+
+    logic.vesselnessFilterParameters.satoBackend = "numpy"
+    numpyArray = slicer.util.arrayFromVolume(logic._applySatoVesselnessFilter(sourceVolume))
+
+    np.testing.assert_allclose(itkArray, numpyArray, atol=5e-2)
+    self.assertGreater(np.corrcoef(itkArray.ravel(), numpyArray.ravel())[0, 1], 0.99)
+
+  def testVesselnessIsOnlyComputedOnNewRegionWhenROIGrows(self):
+    sourceVolume = createTubePhantomVolume(shape=(64, 64, 64))
+    logic = RVXLiverSegmentationLogic()
+    logic.setInputVolume(sourceVolume)
+    logic.vesselnessFilterParameters.roiGrowthFactor = 1
+
+    logic.updateVesselnessVolume([[24, 24, 24], [36, 36, 36]])
+    logic.updateVesselnessVolume([[16, 20, 24], [44, 40, 36]])
+    incrementalArray = slicer.util.arrayFromVolume(logic.getCurrentVesselnessVolume())
+
+    # Only the first update computes the hessian of the whole ROI
+    self.assertEqual(1, logic.hessianCache.misses)
+
+    fullArray = slicer.util.arrayFromVolume(logic._applySatoVesselnessFilter(logic._inputCrop))
+    self.assertEqual(fullArray.shape, incrementalArray.shape)
+    np.testing.assert_allclose(fullArray, incrementalArray, atol=1e-2)
+
+  def testVesselnessInputIsCroppedAsAViewOnTheInputVolumeWithoutAddingNodesToTheScene(self):
+    sourceVolume = createTubePhantomVolume(shape=(32, 48, 64))
+    sourceVolume.SetSpacing(1, 1, 2)
+    sourceVolume.SetOrigin(10, 20, 30)
+    logic = RVXLiverSegmentationLogic()
+    logic.setInputVolume(sourceVolume)
+    logic.vesselnessFilterParameters.roiGrowthFactor = 1
+    logic.vesselnessFilterParameters.minROIExtent = 0
+
+    logic.updateVesselnessVolume([[20.2, 30, 40], [30.7, 40, 60.5]])
+    vesselnessVolume = logic.getCurrentVesselnessVolume()
+
+    # Only the voxels whose centers are inside the ROI are kept
+    self.assertEqual(((5, 10, 11), (16, 21, 21)), (logic._inputCrop.start, logic._inputCrop.stop))
+    self.assertEqual((10, 11, 11), vesselnessVolume.GetImageData().GetDimensions())
+    np.testing.assert_array_almost_equal([21, 30, 40], vesselnessVolume.GetOrigin())
+    np.testing.assert_array_almost_equal([1, 1, 2], vesselnessVolume.GetSpacing())
+
+    # The crop doesn't copy the input voxels and doesn't create ROI, crop parameters or cropped volume nodes
+    self.assertTrue(np.shares_memory(logic._inputCrop.array, slicer.util.arrayFromVolume(sourceVolume)))
+    self.assertIsNone(logic._croppedInputVolume)
+    self.assertEqual(0, slicer.mrmlScene.GetNodesByClass("vtkMRMLAnnotationROINode").GetNumberOfItems())
+    self.assertEqual(0, slicer.mrmlScene.GetNodesByClass("vtkMRMLCropVolumeParametersNode").GetNumberOfItems())
+
+    croppedVolume = logic._inputCrop.createVolumeNode("Cropped", copyVoxels=True)
+    expected = slicer.util.arrayFromVolume(logic._applySatoVesselnessFilter(croppedVolume))
+    np.testing.assert_allclose(expected, slicer.util.arrayFromVolume(vesselnessVolume), atol=1e-6)
+
+  def testPreviewVesselnessIsComputedOnDownsampledVolumeCoveringTheSameRegion(self):
+    sourceVolume = createTubePhantomVolume(shape=(64, 64, 64))
+    logic = RVXLiverSegmentationLogic()
+    logic.setInputVolume(sourceVolume)
+    logic.vesselnessFilterParameters.useROI = False
+
+    self.assertTrue(logic.updatePreviewVesselnessVolume([], downsamplingFactor=4))
+    preview = logic.getCurrentPreviewVesselnessVolume()
+    self.assertIsNone(logic.getCurrentVesselnessVolume())
+    self.assertEqual((16, 16, 16), preview.GetImageData().GetDimensions())
+    np.testing.assert_array_almost_equal([4, 4, 4], preview.GetSpacing())
+
+    sourceBounds, previewBounds = [0] * 6, [0] * 6
+    sourceVolume.GetRASBounds(sourceBounds)
+    preview.GetRASBounds(previewBounds)
+    np.testing.assert_array_almost_equal(sourceBounds, previewBounds)
+    self.assertAlmostEqual(1, np.max(slicer.util.arrayFromVolume(preview)))
+
+    # Changing the alpha parameters reuses the downsampled hessian
+    logic.vesselnessFilterParameters.satoAlpha1 = 0.4
+    logic.updatePreviewVesselnessVolume([], downsamplingFactor=4)
+    self.assertEqual(1, logic.hessianCache.hits)
+
+    logic.removePreviewVesselnessVolume()
+    self.assertIsNone(logic.getCurrentPreviewVesselnessVolume())
+
+  def testVesselnessIsRestrictedToTheDilatedLiverMask(self):
+    sourceVolume = createTubePhantomVolume(shape=(64, 64, 64))
+    maskArray = np.zeros((64, 64, 64), dtype=np.uint8)
+    maskArray[20:40, 24:44, 16:48] = 1
+    liverMask = slicer.mrmlScene.AddNewNodeByClass("vtkMRMLLabelMapVolumeNode")
+    liverMask.CopyOrientation(sourceVolume)
+    slicer.util.updateVolumeFromArray(liverMask, maskArray)
+
+    logic = RVXLiverSegmentationLogic()
+    logic.setInputVolume(sourceVolume)
+    logic.setLiverMask(liverMask)
+    logic.vesselnessFilterParameters.useROI = False
+    logic.vesselnessFilterParameters.useLiverMask = True
+    logic.vesselnessFilterParameters.liverMaskMargin = 2
+    logic.vesselnessFilterParameters.satoBackend = "numpy"
+    logic.updateVesselnessVolume([])
+
+    # Vesselness is cropped to the dilated mask bounding box and is 0 outside of the dilated mask
+    vesselness = slicer.util.arrayFromVolume(logic.getCurrentVesselnessVolume())
+    np.testing.assert_allclose((24, 24, 36), vesselness.shape, atol=1)
+    self.assertEqual(0, vesselness[0, 0, 0])
+    self.assertEqual(0, vesselness[-1, -1, -1])
+    self.assertAlmostEqual(1, np.max(vesselness))
+
+    # Changing the mask invalidates the cached vesselness
+    maskArray[20:40, 24:44, 16:32] = 0
+    slicer.util.updateVolumeFromArray(liverMask, maskArray)
+    logic.setLiverMask(liverMask)
+    logic.updateVesselnessVolume([])
+    self.assertEqual(2, logic.vesselnessCache.misses)
+
+  def testParameterSweepSharesHessiansAcrossAlphaValues(self):
+    sourceVolume = createTubePhantomVolume(shape=(32, 32, 32))
+    logic = RVXLiverSegmentationLogic()
+    logic.setInputVolume(sourceVolume)
+    grid = parameterGrid(VesselnessFilterParameters(), satoSigma=[1., 2.], satoAlpha1=[0.3, 0.5, 0.7], useROI=[False])
+
+    results = logic.runVesselnessParameterSweep([], grid)
+    self.assertEqual(6, len(results))
+    self.assertEqual(2, logic.hessianCache.misses)
+    self.assertIsNone(logic.getCurrentVesselnessVolume())
+
+    # Sweep volumes match the vesselness filter output
+    logic.vesselnessFilterParameters = results[-1].parameters
+    expected = slicer.util.arrayFromVolume(logic._applySatoVesselnessFilter(sourceVolume))
+    np.testing.assert_allclose(expected, results[-1].volume.astype(np.float32), atol=1e-3)
+
   def testLogicRaisesErrorWhenCalledWithNoneInputs(self):
     logic = RVXLiverSegmentationLogic()
 
@@ -0,0 +1,61 @@
+import unittest
+
+import numpy as np
+
+from RVXLiverSegmentationLib import symmetricEigenvalues3x3, satoFromEigenvalues, satoVesselness, hessianFromArray, \
+  satoVesselnessFromHessian, TaskProgress, TaskCancelledError
+from .TestUtils import createTubePhantomArray
+
+
+class NumpyVesselnessTestCase(unittest.TestCase):
+  def testClosedFormEigenvaluesMatchNumpyEigenvalues(self):
+    matrices = np.random.RandomState(0).randn(1000, 3, 3)
+    matrices = (matrices + matrices.transpose(0, 2, 1)) / 2
+    matrices[:10] = np.diag([1, 1, 1])
+    matrices[10:20] = np.diag([2, 2, -1])
+
+    components = [matrices[:, i, j].astype(np.float32) for i, j in [(0, 0), (0, 1), (0, 2), (1, 1), (1, 2), (2, 2)]]
+    eigenvalues = np.stack(symmetricEigenvalues3x3(*components), axis=1)
+    np.testing.assert_allclose(np.linalg.eigvalsh(matrices), eigenvalues, atol=1e-4)
+
+  def testSatoMeasureIsZeroForNonTubularEigenvalues(self):
+    lambdas = [np.array([-1., 1.], dtype=np.float32), np.array([1., 1.], dtype=np.float32),
+               np.array([0., 2.], dtype=np.float32)]
+    np.testing.assert_array_equal([0, 0], satoFromEigenvalues(*lambdas, alpha1=0.5, alpha2=2))
+
+  def testSatoMeasureOfIdealTubeIsItsCrossSectionCurvature(self):
+    lambdas = [np.array([-3.], dtype=np.float32), np.array([-2.], dtype=np.float32), np.array([0.], dtype=np.float32)]
+    np.testing.assert_array_almost_equal([2], satoFromEigenvalues(*lambdas, alpha1=0.5, alpha2=2))
+
+  def testSatoVesselnessIsMaximalOnTubeCenterLine(self):
+    phantom = createTubePhantomArray(shape=(32, 32, 32), radii=(2,))
+    vesselness = satoVesselness(phantom, sigma=2, alpha1=0.5, alpha2=2, chunkSize=1000)
+
+    # The single tube is aligned with the first axis at the center of the two other axes
+    self.assertEqual(np.float32, vesselness.dtype)
+    self.assertEqual(np.argmax(vesselness[16]), np.ravel_multi_index((16, 16), (32, 32)))
+
+  def testMaskedSatoVesselnessMatchesUnmaskedVesselnessInsideMask(self):
+    phantom = createTubePhantomArray(shape=(24, 24, 24), radii=(2,))
+    mask = np.zeros(phantom.shape, dtype=bool)
+    mask[4:20, 8:16, 6:18] = True
+
+    vesselness = satoVesselness(phantom, sigma=2, alpha1=0.5, alpha2=2)
+    maskedVesselness = satoVesselness(phantom, sigma=2, alpha1=0.5, alpha2=2, chunkSize=1000, mask=mask)
+    np.testing.assert_array_equal(np.where(mask, vesselness, 0), maskedVesselness)
+
+  def testHessianAndMeasureReportTheirProgressAndStopWhenCancelled(self):
+    phantom = createTubePhantomArray(shape=(16, 16, 16), radii=(2,))
+    hessianSteps, measureSteps = [], []
+    hessian = hessianFromArray(phantom, sigma=1,
+                               progressCallback=lambda done, total: hessianSteps.append((done, total)))
+    satoVesselnessFromHessian(hessian, 0.5, 2, chunkSize=1000,
+                              progressCallback=lambda done, total: measureSteps.append((done, total)))
+
+    self.assertEqual([(i + 1, 6) for i in range(6)], hessianSteps)
+    self.assertEqual([(i + 1, 5) for i in range(5)], measureSteps)
+
+    progress = TaskProgress()
+    progress.cancel()
+    with self.assertRaises(TaskCancelledError):
+      satoVesselnessFromHessian(hessian, 0.5, 2, chunkSize=1000, progressCallback=progress)
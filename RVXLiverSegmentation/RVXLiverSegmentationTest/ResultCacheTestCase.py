@@ -0,0 +1,49 @@
+import unittest
+
+import numpy as np
+
+from RVXLiverSegmentationLib import LRUCache
+
+
+class ResultCacheTestCase(unittest.TestCase):
+  def testLRUCacheReturnsStoredValuesAndCountsHitsAndMisses(self):
+    cache = LRUCache(maxBytes=100)
+    cache.put("a", 1, nBytes=10)
+
+    self.assertEqual(1, cache.get("a"))
+    self.assertIsNone(cache.get("b"))
+    self.assertEqual(1, cache.hits)
+    self.assertEqual(1, cache.misses)
+
+  def testLRUCacheEvictsLeastRecentlyUsedValuesWhenMemoryBudgetIsExceeded(self):
+    cache = LRUCache(maxBytes=30)
+    cache.put("a", "a", nBytes=10)
+    cache.put("b", "b", nBytes=10)
+    cache.put("c", "c", nBytes=10)
+
+    # Access a to make b the least recently used value
+    cache.get("a")
+    cache.put("d", "d", nBytes=10)
+
+    self.assertEqual(["c", "a", "d"], cache.keys())
+    self.assertEqual(30, cache.currentBytes)
+
+  def testLRUCacheUsesArrayNBytesAsDefaultSize(self):
+    array = np.zeros((10, 10), dtype=np.float32)
+    cache = LRUCache(maxBytes=1000)
+    cache.put("array", array)
+    self.assertEqual(array.nbytes, cache.currentBytes)
+
+  def testLRUCacheDoesntStoreValuesBiggerThanBudget(self):
+    cache = LRUCache(maxBytes=10)
+    cache.put("a", "a", nBytes=5)
+    self.assertFalse(cache.put("b", "b", nBytes=11))
+    self.assertNotIn("b", cache)
+    self.assertIn("a", cache)
+
+  def testReducingLRUCacheBudgetEvictsValues(self):
+    cache = LRUCache(maxBytes=30)
+    cache.put("a", "a", nBytes=10)
+    cache.put("b", "b", nBytes=10)
+    cache.maxBytes = 15
+    self.assertEqual(["b"], cache.keys())
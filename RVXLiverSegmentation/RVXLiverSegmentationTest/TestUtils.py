@@ -99,3 +99,56 @@ class FakeMarkupNode(object):
     node_pos = list(self._nodes.values())[i_fiducial]
     for i in range(len(out_position)):
       out_position[i] = node_pos[i]
+
+
+def createTubePhantomArray(shape=(64, 64, 64), radii=(1.5, 3, 5), intensity=100.):
+  """Creates float32 array with bright tubes of gaussian profile on a dark background. Tube i is aligned with the
+  array axis i % 3 and the tubes are evenly spread along the other axes.
+  """
+  import numpy as np
+
+  coordinates = np.ogrid[tuple(slice(0, size) for size in shape)]
+  phantom = np.zeros(shape, dtype=np.float32)
+  for iTube, radius in enumerate(radii):
+    tubeAxis = iTube % 3
+    otherAxes = [axis for axis in range(3) if axis != tubeAxis]
+    tubeCenter = [shape[otherAxes[0]] * (iTube + 1) / (len(radii) + 1), shape[otherAxes[1]] / 2.]
+    squaredDistance = sum((coordinates[axis] - center) ** 2 for axis, center in zip(otherAxes, tubeCenter))
+    np.maximum(phantom, intensity * np.exp(-squaredDistance / (2. * radius ** 2)), out=phantom)
+  return phantom
+
+
+def createTubePhantomVolume(volumeName="TubePhantom", shape=(64, 64, 64), radii=(1.5, 3, 5)):
+  volumeNode = slicer.mrmlScene.AddNewNodeByClass('vtkMRMLScalarVolumeNode')
+  volumeNode.CreateDefaultDisplayNodes()
+  volumeNode.SetName(volumeName)
+  slicer.util.updateVolumeFromArray(volumeNode, createTubePhantomArray(shape, radii))
+  return volumeNode
+
+
+def tubePhantomBranchPositions(shape, radii, branchCount):
+  """Splits the tubes of the tube phantom in consecutive branches. The phantom volume is expected to have the default
+  identity IJK to RAS matrix.
+
+  Returns
+  -------
+  List[Tuple[List[float], List[float]]] - Start and end RAS positions of each branch
+  """
+  import numpy as np
+
+  branches = []
+  for iTube, radius in enumerate(radii):
+    tubeAxis = iTube % 3
+    otherAxes = [axis for axis in range(3) if axis != tubeAxis]
+    tubeBranchCount = branchCount // len(radii) + (1 if iTube < branchCount % len(radii) else 0)
+    steps = np.linspace(4, shape[tubeAxis] - 5, tubeBranchCount + 1)
+
+    kji = [0., 0., 0.]
+    kji[otherAxes[0]] = shape[otherAxes[0]] * (iTube + 1) / (len(radii) + 1)
+    kji[otherAxes[1]] = shape[otherAxes[1]] / 2.
+    positions = []
+    for step in steps:
+      kji[tubeAxis] = step
+      positions.append(list(reversed(kji)))
+    branches += list(zip(positions[:-1], positions[1:]))
+  return branches
@@ -0,0 +1,95 @@
+import os
+import unittest
+
+import numpy as np
+
+from RVXLiverSegmentationLib import TiledVolumeFilter, tilesOutsideRegion
+from .TestUtils import TemporaryDir
+
+
+def boxMean(array):
+  """3x3x3 mean filter with nearest border extension requiring a one voxel halo"""
+  padded = np.pad(array, 1, mode="edge")
+  output = np.zeros_like(array)
+  for k in range(3):
+    for j in range(3):
+      for i in range(3):
+        output += padded[k:k + array.shape[0], j:j + array.shape[1], i:i + array.shape[2]]
+  return output / 27.
+
+
+class TiledVolumeFilterTestCase(unittest.TestCase):
+  def setUp(self):
+    self.array = np.random.RandomState(0).rand(37, 50, 23).astype(np.float32)
+
+  def testTileCoresPartitionTheVolume(self):
+    tiledFilter = TiledVolumeFilter(boxMean, halo=1, maxPeakMemoryBytes=48 * 10 ** 3, workerCount=3)
+    coverage = np.zeros(self.array.shape, dtype=int)
+    for tile in tiledFilter.tiles(self.array.shape):
+      coverage[tile.coreSlices] += 1
+
+    self.assertGreater(len(tiledFilter.tiles(self.array.shape)), 1)
+    np.testing.assert_array_equal(np.ones_like(coverage), coverage)
+
+  def testTiledFilterHasNoSeams(self):
+    for workerCount in [1, 3]:
+      tiledFilter = TiledVolumeFilter(boxMean, halo=1, maxPeakMemoryBytes=48 * 10 ** 3, workerCount=workerCount)
+      np.testing.assert_array_almost_equal(boxMean(self.array), tiledFilter.run(self.array))
+
+  def testTiledFilterReportsProgressForEachTile(self):
+    tiledFilter = TiledVolumeFilter(boxMean, halo=1, maxPeakMemoryBytes=48 * 10 ** 3, workerCount=2)
+    progress = []
+    tiledFilter.run(self.array, progressCallback=lambda done, total: progress.append((done, total)))
+
+    tileCount = len(tiledFilter.tiles(self.array.shape))
+    self.assertEqual([(i + 1, tileCount) for i in range(tileCount)], progress)
+
+  def testTiledFilterStreamsFromAndToMemoryMappedFiles(self):
+    with TemporaryDir() as tmpDir:
+      inputPath = os.path.join(tmpDir, "input.npy")
+      outputPath = os.path.join(tmpDir, "output.npy")
+      np.save(inputPath, self.array)
+
+      tiledFilter = TiledVolumeFilter(boxMean, halo=1, maxPeakMemoryBytes=48 * 10 ** 3, workerCount=2)
+      output = tiledFilter.run(inputPath, outputPath=outputPath)
+      self.assertIsInstance(output, np.memmap)
+      del output
+
+      np.testing.assert_array_almost_equal(boxMean(self.array), np.load(outputPath))
+
+  def testTooSmallMemoryCapRaises(self):
+    with self.assertRaises(ValueError):
+      TiledVolumeFilter(boxMean, halo=5, maxPeakMemoryBytes=48 * 9 ** 3).tiles(self.array.shape)
+
+  def testTilesOutsideRegionPartitionTheVolumeWithTheRegion(self):
+    for regionStart, regionStop in [((3, 10, 0), (30, 40, 23)), ((0, 0, 0), (37, 50, 23)), ((5, 5, 5), (6, 6, 6))]:
+      coverage = np.zeros(self.array.shape, dtype=int)
+      coverage[tuple(slice(start, stop) for start, stop in zip(regionStart, regionStop))] += 1
+      for tile in tilesOutsideRegion(self.array.shape, regionStart, regionStop, halo=2):
+        coverage[tile.coreSlices] += 1
+
+      np.testing.assert_array_equal(np.ones_like(coverage), coverage)
+
+  def testFilteringTilesOutsideRegionHasNoSeams(self):
+    expected = boxMean(self.array)
+    output = np.zeros_like(self.array)
+    output[3:30, 10:40, 4:20] = expected[3:30, 10:40, 4:20]
+    for tile in tilesOutsideRegion(self.array.shape, (3, 10, 4), (30, 40, 20), halo=1):
+      output[tile.coreSlices] = boxMean(self.array[tile.haloSlices])[tile.coreInHaloSlices]
+
+    np.testing.assert_array_almost_equal(expected, output)
+
+  def testTilesOutsideMaskAreSkipped(self):
+    mask = np.zeros(self.array.shape, dtype=bool)
+    mask[:10, :10, :10] = True
+    calledTiles = []
+
+    def maskedBoxMean(tileArray, tileMask):
+      calledTiles.append(tileArray.shape)
+      return boxMean(tileArray) * tileMask
+
+    tiledFilter = TiledVolumeFilter(maskedBoxMean, halo=1, maxPeakMemoryBytes=48 * 10 ** 3, workerCount=2)
+    output = tiledFilter.run(self.array, maskArray=mask)
+
+    self.assertLess(len(calledTiles), len(tiledFilter.tiles(self.array.shape)))
+    np.testing.assert_array_almost_equal(np.where(mask, boxMean(self.array), 0), output)
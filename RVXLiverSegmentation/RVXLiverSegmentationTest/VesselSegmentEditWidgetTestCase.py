@@ -1,9 +1,11 @@
 import unittest
 
+import numpy as np
 import qt
 import slicer
 
-from RVXLiverSegmentationLib import RVXLiverSegmentationLogic, VesselSegmentEditWidget, NodeBranches
+from RVXLiverSegmentationLib import RVXLiverSegmentationLogic, VesselSegmentEditWidget, NodeBranches, \
+  PortalVesselWidget, ExtractVesselFromVesselSeedPointsStrategy, LabelMapMerger
 from .ModuleLogicTestCase import prepareEndToEndTest
 
 
@@ -53,3 +55,49 @@ class VesselSegmentEditWidgetTestCase(unittest.TestCase):
 
     # Verify centerline volume was extracted
     self.assertIsNotNone(self.vesselEdit.getCenterLineVolume())
+
+  def testLabeledVesselTreeIsImportedAsBranchSegmentsAndTreeSegment(self):
+    merger = LabelMapMerger("labeledTree", labelNames=["branchA", "branchB"])
+    for labelId, rows in [(1, slice(4, 8)), (2, slice(8, 12))]:
+      branchArray = np.zeros((16, 16, 16), dtype=np.uint8)
+      branchArray[rows, 4:12, 6:10] = 5
+      branchVolume = slicer.mrmlScene.AddNewNodeByClass("vtkMRMLLabelMapVolumeNode")
+      slicer.util.updateVolumeFromArray(branchVolume, branchArray)
+      merger.add(branchVolume, labelId=labelId)
+    labeledTree, _ = merger.finish()
+    self.assertTrue(LabelMapMerger.isLabeledVolume(labeledTree))
+    labelMapCount = slicer.mrmlScene.GetNumberOfNodesByClass("vtkMRMLLabelMapVolumeNode")
+
+    self.vesselEdit.onVesselSegmentationChanged(labeledTree, NodeBranches())
+
+    segmentation = self.vesselEdit._segmentationObj()
+    segmentNames = [segmentation.GetNthSegment(i).GetName() for i in range(segmentation.GetNumberOfSegments())]
+    self.assertEqual(sorted(["branchA", "branchB", self.vesselEdit._segmentNodeName]), sorted(segmentNames))
+    self.assertEqual(labelMapCount, slicer.mrmlScene.GetNumberOfNodesByClass("vtkMRMLLabelMapVolumeNode"))
+
+  def testBinaryVesselTreeIsImportedAsASingleTreeSegment(self):
+    treeArray = np.zeros((16, 16, 16), dtype=np.uint8)
+    treeArray[4:12, 4:12, 6:10] = 5
+    binaryTree = slicer.mrmlScene.AddNewNodeByClass("vtkMRMLLabelMapVolumeNode")
+    slicer.util.updateVolumeFromArray(binaryTree, treeArray)
+    self.assertFalse(LabelMapMerger.isLabeledVolume(binaryTree))
+
+    self.vesselEdit.onVesselSegmentationChanged(binaryTree, NodeBranches())
+
+    segmentation = self.vesselEdit._segmentationObj()
+    self.assertEqual(1, segmentation.GetNumberOfSegments())
+    self.assertEqual(self.vesselEdit._segmentNodeName, segmentation.GetNthSegment(0).GetName())
+
+  def testLabelBranchesOptionIsPassedToTheBranchStrategies(self):
+    vesselWidget = PortalVesselWidget(self.logic)
+    vesselWidget._labelBranchesCheckBox.checked = True
+    vesselWidget._updateLevelSetParameters()
+
+    branchStrategies = [strategy for strategy in vesselWidget._strategies.values() if
+                        isinstance(strategy, ExtractVesselFromVesselSeedPointsStrategy)]
+    self.assertGreater(len(branchStrategies), 0)
+    self.assertTrue(all(strategy.labelBranches for strategy in branchStrategies))
+
+    vesselWidget._restoreDefaultLevelSetParameters()
+    vesselWidget._updateLevelSetParameters()
+    self.assertFalse(any(strategy.labelBranches for strategy in branchStrategies))
@@ -0,0 +1,64 @@
+import os
+import unittest
+
+import numpy as np
+
+from RVXLiverSegmentationLib import VesselnessFilterParameters, parameterGrid, groupParametersBySharedInput, \
+  VesselnessSweepResults
+from .TestUtils import TemporaryDir
+
+
+class VesselnessParameterSweepTestCase(unittest.TestCase):
+  def testParameterGridIsTheCartesianProductOfTheParameterValues(self):
+    grid = parameterGrid(VesselnessFilterParameters(), satoSigma=[1, 2, 3], satoAlpha1=[0.3, 0.5])
+
+    self.assertEqual(6, len(grid))
+    self.assertEqual({(1, 0.3), (1, 0.5), (2, 0.3), (2, 0.5), (3, 0.3), (3, 0.5)},
+                     {(p.satoSigma, p.satoAlpha1) for p in grid})
+    self.assertTrue(all(p.satoAlpha2 == VesselnessFilterParameters().satoAlpha2 for p in grid))
+
+  def testParameterGridRaisesForUnknownParameters(self):
+    with self.assertRaises(ValueError):
+      parameterGrid(VesselnessFilterParameters(), unknownParameter=[1, 2])
+
+  def testParametersAreGroupedByInputAndSortedBySigma(self):
+    grid = parameterGrid(VesselnessFilterParameters(), satoSigma=[3, 1, 2], satoAlpha1=[0.3, 0.5], useROI=[True, False])
+    groups = groupParametersBySharedInput(grid)
+
+    self.assertEqual(2, len(groups))
+    for group in groups:
+      self.assertEqual(6, len(group))
+      self.assertEqual(1, len({p.useROI for p in group}))
+      self.assertEqual([1, 1, 2, 2, 3, 3], [p.satoSigma for p in group])
+
+  def testExecutionOnlyParametersDontSplitGroups(self):
+    grid = parameterGrid(VesselnessFilterParameters(), satoSigma=[1, 2], workerCount=[1, 4], useTiling=[True, False])
+    self.assertEqual(1, len(groupParametersBySharedInput(grid)))
+
+  def testResultsStoreNormalizedFloat16VolumesAndStatistics(self):
+    grid = parameterGrid(VesselnessFilterParameters(), satoAlpha1=[0.3, 0.5])
+    results = VesselnessSweepResults(statisticsFunctions={"max": lambda array: float(np.max(array))})
+    results.append(grid[0], np.arange(8, dtype=np.float32).reshape(2, 2, 2), elapsedTime=1.)
+    results.append(grid[1], np.ones((2, 2, 2), dtype=np.float32), elapsedTime=2.)
+
+    self.assertEqual(np.float16, results[0].volume.dtype)
+    self.assertEqual(2 * 8 * 2, results.nbytes)
+    self.assertAlmostEqual(1, results[0].statistics["max"])
+    self.assertAlmostEqual(0.5, results[0].statistics["mean"])
+    self.assertEqual(0, results[1].statistics["max"])
+    self.assertIs(results[0], results.best("max"))
+
+    self.assertEqual(["satoAlpha1"], results.sweptParameterNames())
+    self.assertEqual(["satoAlpha1", "elapsedTime"], list(results.rows()[0].keys())[:2])
+
+    with TemporaryDir() as tmpDir:
+      results.saveToDirectory(tmpDir)
+      self.assertTrue(os.path.exists(os.path.join(tmpDir, "summary.csv")))
+      np.testing.assert_array_equal(results[1].volume, np.load(os.path.join(tmpDir, "volumes.npz"))["volume_1"])
+
+  def testResultsWithoutVolumesOnlyStoreStatistics(self):
+    results = VesselnessSweepResults(storeVolumes=False)
+    results.append(VesselnessFilterParameters(), np.ones((2, 2, 2), dtype=np.float32))
+
+    self.assertIsNone(results[0].volume)
+    self.assertEqual(0, results.nbytes)
@@ -0,0 +1,84 @@
+import unittest
+
+import numpy as np
+
+from RVXLiverSegmentationLib import maskBoundingBox, dilateMask, SparseBlockMask
+
+
+class VolumeMaskTestCase(unittest.TestCase):
+  def testBoundingBoxContainsAllMaskVoxels(self):
+    mask = np.zeros((10, 12, 14), dtype=bool)
+    mask[2, 3, 4] = mask[5, 8, 6] = True
+
+    self.assertEqual(((2, 3, 4), (6, 9, 7)), maskBoundingBox(mask))
+    self.assertIsNone(maskBoundingBox(np.zeros((3, 3, 3), dtype=bool)))
+
+  def testDilatedMaskContainsVoxelsCloserThanTheMargin(self):
+    mask = np.zeros((5, 5, 5), dtype=bool)
+    mask[2, 2, 2] = True
+    dilated, offset = dilateMask(mask, margin=4, spacing=(2., 1., 1.))
+
+    self.assertEqual((-2, -4, -4), offset)
+    self.assertEqual((9, 13, 13), dilated.shape)
+
+    indices = np.indices(dilated.shape)
+    center = [2 - o for o in offset]
+    distance = np.sqrt(sum(((index - c) * s) ** 2 for index, c, s in zip(indices, center, (2., 1., 1.))))
+    np.testing.assert_array_equal(distance <= 4, dilated)
+
+  def testZeroMarginKeepsTheMask(self):
+    mask = np.random.RandomState(0).rand(6, 6, 6) > 0.5
+    dilated, offset = dilateMask(mask, margin=0)
+
+    self.assertEqual((0, 0, 0), offset)
+    np.testing.assert_array_equal(mask, dilated)
+
+  def testSparseBlockMaskStoresTheBitPackedBoundingBoxOfTheMask(self):
+    mask = np.zeros((40, 50, 60), dtype=bool)
+    mask[10:14, 20:30, 5:7] = True
+    mask[12, 32, 8] = True
+    sparse = SparseBlockMask.fromDense(mask)
+
+    self.assertEqual((10, 20, 5), sparse.start)
+    self.assertEqual((14, 33, 9), sparse.stop)
+    self.assertEqual(int(np.ceil(4 * 13 * 4 / 8.)), sparse.nbytes)
+    self.assertEqual(np.count_nonzero(mask), sparse.count())
+    np.testing.assert_array_equal(mask, sparse.toDense())
+
+  def testSparseBlockMaskUnionAndIntersectionMatchDenseOperations(self):
+    random = np.random.RandomState(0)
+    shape = (20, 24, 28)
+    first, second = np.zeros(shape, dtype=bool), np.zeros(shape, dtype=bool)
+    first[2:12, 4:16, 6:20] = random.rand(10, 12, 14) > 0.5
+    second[8:18, 10:22, 1:10] = random.rand(10, 12, 9) > 0.5
+    firstSparse, secondSparse = SparseBlockMask.fromDense(first), SparseBlockMask.fromDense(second)
+
+    np.testing.assert_array_equal(first | second, (firstSparse | secondSparse).toDense())
+    np.testing.assert_array_equal(first & second, (firstSparse & secondSparse).toDense())
+    self.assertEqual(maskBoundingBox(first & second), ((firstSparse & secondSparse).start,
+                                                       (firstSparse & secondSparse).stop))
+
+  def testSparseBlockMaskOperationsWithEmptyOrDisjointMasks(self):
+    shape = (8, 8, 8)
+    empty = SparseBlockMask(shape)
+    first, second = np.zeros(shape, dtype=bool), np.zeros(shape, dtype=bool)
+    first[0:2, 0:2, 0:2] = True
+    second[5:8, 5:8, 5:8] = True
+    firstSparse, secondSparse = SparseBlockMask.fromDense(first), SparseBlockMask.fromDense(second)
+
+    self.assertTrue(empty.isEmpty)
+    self.assertTrue((firstSparse & secondSparse).isEmpty)
+    self.assertTrue((firstSparse & empty).isEmpty)
+    np.testing.assert_array_equal(first, (firstSparse | empty).toDense())
+    np.testing.assert_array_equal(np.zeros(shape, dtype=bool), empty.toDense())
+
+    with self.assertRaises(ValueError):
+      firstSparse | SparseBlockMask((8, 8, 9))
+
+  def testSparseBlockMaskIsPastedWithTheInputValue(self):
+    mask = np.zeros((6, 7, 8), dtype=bool)
+    mask[1:3, 2:5, 3:4] = True
+    array = np.full(mask.shape, 2, dtype=np.uint8)
+    SparseBlockMask.fromDense(mask).pasteInto(array, 5)
+
+    np.testing.assert_array_equal(np.where(mask, 5, 2), array)
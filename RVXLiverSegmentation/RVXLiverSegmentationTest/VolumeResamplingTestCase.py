@@ -0,0 +1,67 @@
+import unittest
+
+import numpy as np
+
+from RVXLiverSegmentationLib import downsampleArray, resampleArray, resampledShape
+
+
+class VolumeResamplingTestCase(unittest.TestCase):
+  def testDownsampledVoxelsAreTheMeanOfTheirBlock(self):
+    array = np.random.RandomState(0).rand(8, 6, 4).astype(np.float32)
+    downsampled = downsampleArray(array, 2)
+
+    self.assertEqual((4, 3, 2), downsampled.shape)
+    self.assertEqual(np.float32, downsampled.dtype)
+    self.assertAlmostEqual(np.mean(array[2:4, 4:6, 0:2]), downsampled[1, 2, 0], places=6)
+
+  def testShapesWhichAreNotMultipleOfTheFactorArePaddedWithTheLastVoxels(self):
+    array = np.arange(5 * 4 * 3, dtype=np.float32).reshape(5, 4, 3)
+    downsampled = downsampleArray(array, 4)
+
+    self.assertEqual((2, 1, 1), downsampled.shape)
+    self.assertAlmostEqual(np.mean(np.pad(array, [(0, 3), (0, 0), (0, 1)], mode="edge")[4:, :, :]),
+                           downsampled[1, 0, 0], places=4)
+
+  def testFactorOneReturnsACopy(self):
+    array = np.ones((3, 3, 3), dtype=np.float32)
+    downsampled = downsampleArray(array, 1)
+    downsampled[0, 0, 0] = 2
+
+    np.testing.assert_array_equal(np.ones((3, 3, 3)), array)
+
+  def testInvalidFactorRaises(self):
+    with self.assertRaises(ValueError):
+      downsampleArray(np.ones((2, 2, 2)), 0)
+
+  def testResampledShapeIsContainedInInputGrid(self):
+    self.assertEqual((9, 5, 21), resampledShape((5, 5, 11), (2., 1., 1.), (1., 1., 0.5)))
+    self.assertEqual((6, 2, 1), resampledShape((5, 4, 1), (2.5, 0.6, 1.), (2., 1., 1.)))
+
+  def testLinearFunctionsAreExactlyResampled(self):
+    k, j, i = np.meshgrid(np.arange(6), np.arange(7), np.arange(8), indexing="ij")
+    spacing, outputSpacing = (2.5, 1., 0.6), (1., 1., 1.)
+    array = (k * spacing[0] + 2 * j * spacing[1] - i * spacing[2]).astype(np.float32)
+
+    resampled = resampleArray(array, spacing, outputSpacing)
+    k, j, i = np.meshgrid(*[np.arange(size) for size in resampled.shape], indexing="ij")
+
+    self.assertEqual((13, 7, 5), resampled.shape)
+    np.testing.assert_allclose(k + 2 * j - i, resampled, atol=1e-4)
+
+  def testResamplingBackToInputGridRecoversSmoothArrays(self):
+    k = np.arange(20, dtype=np.float32)[:, None, None] * np.ones((20, 10, 10), dtype=np.float32)
+    spacing = (2., 0.7, 0.7)
+    working = resampleArray(k, spacing, (1., 1., 1.))
+    resampled = resampleArray(working, (1., 1., 1.), spacing, outputShape=k.shape)
+
+    self.assertEqual(np.float32, resampled.dtype)
+    np.testing.assert_allclose(k, resampled, atol=1e-4)
+
+  def testNearestNeighborResamplingKeepsValues(self):
+    mask = np.zeros((4, 4, 4), dtype=bool)
+    mask[1:3, 1:3, 1:3] = True
+    resampled = resampleArray(mask, (1., 1., 1.), (0.5, 0.5, 0.5), order=0)
+
+    self.assertEqual({0., 1.}, set(np.unique(resampled)))
+    self.assertTrue(np.all(resampled[2:5, 2:5, 2:5] == 1))
+    self.assertTrue(np.all(resampled[0] == 0))
@@ -1,5 +1,14 @@
+from .ArrayNormalizationTestCase import ArrayNormalizationTestCase
+from .BackgroundTaskTestCase import BackgroundTaskTestCase
 from .ExtractVesselStrategyTestCase import ExtractVesselStrategyTestCase
+from .MemoryReportTestCase import MemoryReportTestCase
 from .ModuleLogicTestCase import RVXLiverSegmentationTestCase
+from .NumpyVesselnessTestCase import NumpyVesselnessTestCase
+from .ResultCacheTestCase import ResultCacheTestCase
+from .TiledVolumeFilterTestCase import TiledVolumeFilterTestCase
 from .VesselBranchTreeTestCase import VesselBranchTreeTestCase
 from .VesselBranchWizardTestCase import VesselBranchWizardTestCase
 from .VesselSegmentEditWidgetTestCase import VesselSegmentEditWidgetTestCase
+from .VesselnessParameterSweepTestCase import VesselnessParameterSweepTestCase
+from .VolumeMaskTestCase import VolumeMaskTestCase
+from .VolumeResamplingTestCase import VolumeResamplingTestCase